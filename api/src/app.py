@@ -15,7 +15,7 @@ from rate_limiting import limiter
 from routers import alerts as alerts_router
 from routers import auth as auth_router
 from routers import prices as prices_router
-from services import alerting
+from services import alerting, price_cache
 
 ALERT_CHECK_INTERVAL_SECONDS = 600
 logger = logging.getLogger(__name__)
@@ -40,6 +40,22 @@ def _alert_check_worker(stop_event: threading.Event) -> None:
             break
 
 
+def _price_cache_worker(stop_event: threading.Event) -> None:
+    logger.info("Price cache worker started")
+    while not stop_event.is_set():
+        try:
+            db = SessionLocal()
+            try:
+                price_cache.refresh_price_cache(db)
+            finally:
+                db.close()
+        except Exception:  # pragma: no cover - defensive logging
+            logger.exception("Failed to refresh the price cache")
+
+        if stop_event.wait(price_cache.PRICE_CACHE_POLL_INTERVAL_SECONDS):
+            break
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     stop_event = threading.Event()
@@ -53,15 +69,25 @@ async def lifespan(app: FastAPI):
     app.state.alert_check_stop_event = stop_event
     app.state.alert_check_thread = thread
 
+    # Invalidates the cached price responses when new prices are saved
+    cache_thread = threading.Thread(
+        target=_price_cache_worker,
+        args=(stop_event,),
+        name="price-cache-worker",
+        daemon=True,
+    )
+    cache_thread.start()
+    app.state.price_cache_thread = cache_thread
+
     yield
 
     stop_event = getattr(app.state, "alert_check_stop_event", None)
-    thread = getattr(app.state, "alert_check_thread", None)
     if stop_event is not None:
         stop_event.set()
-    if thread is not None:
-        with suppress(RuntimeError):
-            thread.join()
+    for thread in (getattr(app.state, "alert_check_thread", None), getattr(app.state, "price_cache_thread", None)):
+        if thread is not None:
+            with suppress(RuntimeError):
+                thread.join()
 
 
 def create_app() -> FastAPI:
@@ -9,17 +9,17 @@ import schemas.price
 
 
 def get_last_prices(db: Session):
+    # latest_prices holds the last row of each pair, maintained on insert into prices
     sql = text("""
-        SELECT DISTINCT ON (token_name, network, is_primary_market)
-               timestamp,
+        SELECT timestamp,
                token_name,
                network,
                is_primary_market,
                price_eth,
                premium * 100 AS premium_percentage
-        FROM prices
+        FROM latest_prices
         WHERE timestamp > now() - interval '7 days'
-        ORDER BY token_name, network, is_primary_market, timestamp DESC
+        ORDER BY token_name, network, is_primary_market
     """)
     result = db.execute(sql)
     record_cls = namedtuple("Record", list(result.keys()))
@@ -30,13 +30,11 @@ def get_last_prices(db: Session):
 def get_last_price(db: Session, token_name: str, network: str, is_primary_market: bool):
     sql = text("""
         SELECT
-            last(timestamp, timestamp) as timestamp,
-            last(price_eth, timestamp) as price_eth,
-            last(premium, timestamp)*100 as premium_percentage
-        FROM prices
+            timestamp,
+            price_eth,
+            premium*100 as premium_percentage
+        FROM latest_prices
         WHERE token_name = :token_name AND network = :network AND is_primary_market = :is_primary_market
-        GROUP BY token_name, network, is_primary_market
-        ORDER BY token_name, is_primary_market DESC, network
     """)
     result = db.execute(
         sql,
@@ -53,6 +51,31 @@ def get_last_price(db: Session, token_name: str, network: str, is_primary_market
     return records[0]
 
 
+def get_prices_version(db: Session):
+    # Number of rows written to the chunks of the prices hypertable, from the table statistics: it changes on any insert
+    # (including rows older than the latest prices), update or delete, and when chunks are dropped, without taking any
+    # lock on the write path. Statistics are reported shortly after the writing transactions commit
+    sql = text("""
+        SELECT coalesce(sum(stats.n_tup_ins + stats.n_tup_upd + stats.n_tup_del), 0)
+        FROM timescaledb_information.chunks chunk
+        JOIN pg_stat_user_tables stats
+          ON stats.schemaname = chunk.chunk_schema AND stats.relname = chunk.chunk_name
+        WHERE chunk.hypertable_name = 'prices'
+    """)
+    return db.execute(sql).scalar()
+
+
+# Continuous aggregates of the prices table per time bucket, created by
+# database/migrations/004_create_price_history_aggregates.sql
+price_history_views = {
+    schemas.price.QueryableTimeBucket.FIVE_MINUTES: "prices_5_minutes",
+    schemas.price.QueryableTimeBucket.ONE_HOUR: "prices_1_hour",
+    schemas.price.QueryableTimeBucket.ONE_DAY: "prices_1_day",
+    schemas.price.QueryableTimeBucket.ONE_WEEK: "prices_1_week",
+    schemas.price.QueryableTimeBucket.ONE_MONTH: "prices_1_month",
+}
+
+
 def get_price_history(
     db: Session,
     token_name: str,
@@ -61,43 +84,44 @@ def get_price_history(
     advanced: bool,
     time_bucket: schemas.price.QueryableTimeBucket,
 ):
+    # Buckets are read from the continuous aggregate of the time bucket, which also aggregates the rows not
+    # materialized yet, so the query does not scan raw prices over the whole time window
+    view = price_history_views[time_bucket]
     if advanced:
-        sql = text("""
+        sql = text(f"""
            SELECT
-               time_bucket(:time_bucket, timestamp) as time_bucket,
-
-               min(price_eth) as min_price_eth,
-               max(price_eth) as max_price_eth,
-               avg(price_eth) as avg_price_eth,
-               first(price_eth, timestamp) as first_price_eth,
-               last(price_eth, timestamp) as last_price_eth,
-
-               round(min(premium)*100, 3) as min_premium_percentage,
-               round(max(premium)*100, 3) as max_premium_percentage,
-               round(avg(premium)*100, 3) as avg_premium_percentage,
-               round(first(premium, timestamp)*100, 3) as first_premium_percentage,
-               round(last(premium, timestamp)*100, 3) as last_premium_percentage
-
-           FROM prices
-           WHERE timestamp
-               > now() - INTERVAL :time_window
+               bucket as time_bucket,
+
+               min_price_eth,
+               max_price_eth,
+               avg_price_eth,
+               first_price_eth,
+               last_price_eth,
+
+               round(min_premium*100, 3) as min_premium_percentage,
+               round(max_premium*100, 3) as max_premium_percentage,
+               round(avg_premium*100, 3) as avg_premium_percentage,
+               round(first_premium*100, 3) as first_premium_percentage,
+               round(last_premium*100, 3) as last_premium_percentage
+
+           FROM {view}
+           WHERE bucket
+               > now() - INTERVAL :time_window - INTERVAL :time_bucket
              AND token_name = :token_name
              AND network = :network
              AND is_primary_market = :is_primary_market
-           GROUP BY time_bucket, token_name, network, is_primary_market
-           ORDER BY time_bucket DESC;
+           ORDER BY bucket DESC;
            """)
     else:
-        sql = text("""
+        sql = text(f"""
             SELECT
-                time_bucket(:time_bucket, timestamp) as time_bucket,
-                avg(price_eth) as price_eth,
-                round(avg(premium)*100, 3) as premium_percentage
-            FROM prices
-            WHERE timestamp > now() - INTERVAL :time_window
+                bucket as time_bucket,
+                avg_price_eth as price_eth,
+                round(avg_premium*100, 3) as premium_percentage
+            FROM {view}
+            WHERE bucket > now() - INTERVAL :time_window - INTERVAL :time_bucket
             AND token_name = :token_name AND network = :network AND is_primary_market = :is_primary_market
-            GROUP BY time_bucket, token_name, network, is_primary_market
-            ORDER BY time_bucket DESC;
+            ORDER BY bucket DESC;
         """)
     result = db.execute(
         sql,
@@ -4,7 +4,8 @@ from database import Base
 
 from .alert import Alert
 from .auth import AuthChallenge
+from .latest_price import LatestPrice
 from .prices import LstPrice
 from .token_listing import TokenListing
 
-__all__ = ["Alert", "AuthChallenge", "Base", "LstPrice", "TokenListing"]
+__all__ = ["Alert", "AuthChallenge", "Base", "LatestPrice", "LstPrice", "TokenListing"]
@@ -0,0 +1,18 @@
+from sqlalchemy import Boolean, Column, DateTime, Numeric, String
+
+from database import Base
+
+
+class LatestPrice(Base):
+    """Represents the last price snapshot of a token/network pairing."""
+
+    __tablename__ = "latest_prices"
+
+    token_name = Column(String(10), primary_key=True)
+    network = Column(String(20), primary_key=True)
+    is_primary_market = Column(Boolean, primary_key=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    price_eth = Column(Numeric(20, 18))
+    price_usd = Column(Numeric(16, 2))
+    premium = Column(Numeric(6, 5))
+    source = Column(String(20))
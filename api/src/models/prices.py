@@ -15,3 +15,4 @@ class LstPrice(Base):
     price_eth = Column(Numeric(20, 18))
     price_usd = Column(Numeric(16, 2))
     premium = Column(Numeric(6, 5))
+    source = Column(String(20))
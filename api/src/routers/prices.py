@@ -1,12 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
 
-from data_access import prices as price_data
-from database import get_db
 from schemas.price import (
     AdvancedPriceHistoryResponse,
     AdvancedPriceResponse,
     FullPriceResponse,
+    PriceCacheStatsResponse,
     PriceHistoryResolutionRequest,
     PriceHistoryResponse,
     PriceHistoryStats,
@@ -14,13 +12,15 @@ from schemas.price import (
     TokenNetworkResponse,
     resolution_request_to_time_bucket,
 )
+from security import get_current_user
+from services import price_cache
 
 router = APIRouter(tags=["prices"])
 
 
 @router.get("/prices")
-def get_last_prices(db: Session = Depends(get_db)) -> list[FullPriceResponse]:
-    last_prices = price_data.get_last_prices(db)
+def get_last_prices() -> list[FullPriceResponse]:
+    last_prices = price_cache.get_last_prices()
     return [FullPriceResponse(**r) for r in last_prices]
 
 
@@ -30,13 +30,11 @@ def get_price_history(
     network: str = "ethereum",
     primary_market: bool = False,
     resolution: PriceHistoryResolutionRequest = PriceHistoryResolutionRequest.ONE_DAY,
-    db: Session = Depends(get_db),
 ) -> PriceResponse:
     if primary_market and network != "ethereum":
         raise HTTPException(status_code=400, detail="Primary market is only available on Ethereum")
 
-    result = price_data.get_price_history(
-        db,
+    result = price_cache.get_price_history(
         token_name,
         network,
         primary_market,
@@ -67,13 +65,11 @@ def get_advanced_price_history(
     network: str = "ethereum",
     primary_market: bool = False,
     resolution: PriceHistoryResolutionRequest = PriceHistoryResolutionRequest.ONE_DAY,
-    db: Session = Depends(get_db),
 ) -> AdvancedPriceResponse:
     if primary_market and network != "ethereum":
         raise HTTPException(status_code=400, detail="Primary market is only available on Ethereum")
 
-    result = price_data.get_price_history(
-        db,
+    result = price_cache.get_price_history(
         token_name,
         network,
         primary_market,
@@ -115,12 +111,11 @@ def get_last_price(
     token_name: str,
     network: str = "ethereum",
     primary_market: bool = False,
-    db: Session = Depends(get_db),
 ) -> FullPriceResponse:
     if primary_market and network != "ethereum":
         raise HTTPException(status_code=400, detail="Primary market is only available on Ethereum")
 
-    last_price = price_data.get_last_price(db, token_name, network, primary_market)
+    last_price = price_cache.get_last_price(token_name, network, primary_market)
     if not last_price:
         raise HTTPException(status_code=404, detail="Item not found")
 
@@ -133,6 +128,11 @@ def get_last_price(
 
 
 @router.get("/tokens")
-def get_available_tokens(db: Session = Depends(get_db)) -> list[TokenNetworkResponse]:
-    result = price_data.get_available_tokens_and_networks(db)
+def get_available_tokens() -> list[TokenNetworkResponse]:
+    result = price_cache.get_available_tokens_and_networks()
     return result
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_current_user)])
+def get_price_cache_stats() -> PriceCacheStatsResponse:
+    return PriceCacheStatsResponse(**price_cache.get_stats())
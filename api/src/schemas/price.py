@@ -105,3 +105,14 @@ class TokenNetworkResponse(BaseModel):
     token_name: str
     network: str
     is_primary_market: bool
+
+
+class PriceCacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
@@ -1,5 +1,5 @@
 """Application service layer."""
 
-from . import alerting, auth
+from . import alerting, auth, price_cache
 
-__all__ = ["alerting", "auth"]
+__all__ = ["alerting", "auth", "price_cache"]
@@ -0,0 +1,81 @@
+"""Cached reads of the price endpoints, invalidated when prices are saved."""
+
+import logging
+import os
+from collections.abc import Callable
+from typing import Any, Optional
+
+from sqlalchemy.orm import Session
+
+import schemas.price
+from data_access import prices as price_data
+from database import SessionLocal
+from utils.response_cache import ResponseCache
+
+PRICE_CACHE_MAX_BYTES = int(os.getenv("PRICE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Results older than this are loaded again even if no insert was seen, e.g. after the retention policy dropped prices
+PRICE_CACHE_MAX_AGE_SECONDS = float(os.getenv("PRICE_CACHE_MAX_AGE_SECONDS", "300"))
+PRICE_CACHE_POLL_INTERVAL_SECONDS = float(os.getenv("PRICE_CACHE_POLL_INTERVAL_SECONDS", "10"))
+logger = logging.getLogger(__name__)
+
+price_cache = ResponseCache(max_bytes=PRICE_CACHE_MAX_BYTES, max_age=PRICE_CACHE_MAX_AGE_SECONDS)
+
+
+def _query(loader: Callable[..., Any], *args: Any) -> Any:
+    """Run a data access function in its own session, so that cache hits do not check out a connection."""
+    db = SessionLocal()
+    try:
+        return loader(db, *args)
+    finally:
+        db.close()
+
+
+def _get_token_listings(db: Session) -> list[dict]:
+    # Plain dicts rather than ORM instances, which must not outlive their session
+    return [
+        {
+            "token_name": listing.token_name,
+            "network": listing.network,
+            "is_primary_market": listing.is_primary_market,
+        }
+        for listing in price_data.get_available_tokens_and_networks(db)
+    ]
+
+
+def get_last_prices() -> list[dict]:
+    return price_cache.get(("last_prices",), lambda: _query(price_data.get_last_prices))
+
+
+def get_last_price(token_name: str, network: str, is_primary_market: bool) -> Optional[dict]:
+    return price_cache.get(
+        ("last_price", token_name, network, is_primary_market),
+        lambda: _query(price_data.get_last_price, token_name, network, is_primary_market),
+    )
+
+
+def get_price_history(
+    token_name: str,
+    network: str,
+    is_primary_market: bool,
+    advanced: bool,
+    time_bucket: schemas.price.QueryableTimeBucket,
+) -> list[dict]:
+    return price_cache.get(
+        ("price_history", token_name, network, is_primary_market, advanced, time_bucket),
+        lambda: _query(price_data.get_price_history, token_name, network, is_primary_market, advanced, time_bucket),
+    )
+
+
+def get_available_tokens_and_networks() -> list[dict]:
+    return price_cache.get(("tokens",), lambda: _query(_get_token_listings))
+
+
+def get_stats() -> dict:
+    return price_cache.stats()
+
+
+def refresh_price_cache(db: Session) -> None:
+    """Invalidate the cached results if prices were saved since the last call, whatever their timestamps."""
+    prices_version = price_data.get_prices_version(db)
+    if price_cache.set_version(prices_version):
+        logger.info("Price cache invalidated, prices version %s", prices_version)
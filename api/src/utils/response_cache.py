@@ -0,0 +1,138 @@
+"""Process-local LRU cache of query results with request coalescing."""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate the memory used by a query result, following its lists, tuples and dicts."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    created_at: float
+
+
+class _Flight:
+    """A load in progress, awaited by the concurrent requests of the same key."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
+class ResponseCache:
+    """Thread-safe cache of query results, bounded in memory with least recently used eviction.
+
+    Concurrent misses of a key are coalesced: the first request runs the query and the others wait for its result.
+    Every entry is dropped when the version of the underlying data changes (see `set_version`), and entries expire
+    after `max_age` seconds in case a change is not detected.
+    """
+
+    def __init__(self, max_bytes: int, max_age: float) -> None:
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._flights: dict[Hashable, _Flight] = {}
+        self._size = 0
+        self._version: Hashable = None
+        # Incremented on invalidation, so that loads started before it are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached result of a key, or load it with `loader` once for all the concurrent requests."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at < self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            self._store(key, flight.value, generation)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            if generation != self._generation or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = _Entry(value, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self.evictions += 1
+
+    def set_version(self, version: Hashable) -> bool:
+        """Drop every entry if the data changed since the last call, and return whether it did."""
+        with self._lock:
+            if version == self._version:
+                return False
+            self._version = version
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
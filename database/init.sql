@@ -12,12 +12,160 @@ CREATE TABLE IF NOT EXISTS prices
     network           text                                   not null,
     is_primary_market boolean                                not null,
     premium           numeric(6, 5),
+    source            text,
     primary key (timestamp, token_name, network, is_primary_market)
 );
 SELECT create_hypertable('prices', 'timestamp');
 
 CREATE INDEX IF NOT EXISTS prices_token_network_market_timestamp_idx ON prices (token_name, network, is_primary_market, timestamp DESC);
 
+---
+/* Create continuous aggregates of the prices hypertable, one per price history time bucket, with the same columns.
+   Queries also aggregate the rows not materialized yet (real-time aggregation), so buckets are complete up to now.
+   Refresh policies materialize recent buckets again to pick up late rows: after backfilling older data, refresh the
+   aggregates over its range, e.g. CALL refresh_continuous_aggregate('prices_1_day', '2024-01-01', '2024-07-01');
+   Aggregates are created empty by create_price_history_aggregate, which can run in a transaction, then materialized
+   over the existing prices by a refresh, which cannot */
+CREATE OR REPLACE PROCEDURE create_price_history_aggregate(
+    view_name         text,
+    bucket_width      interval,
+    start_offset      interval,
+    end_offset        interval,
+    schedule_interval interval
+)
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    EXECUTE format(
+        'CREATE MATERIALIZED VIEW IF NOT EXISTS %I
+         WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+         SELECT time_bucket(%L::interval, timestamp) AS bucket,
+                token_name,
+                network,
+                is_primary_market,
+                min(price_eth)              AS min_price_eth,
+                max(price_eth)              AS max_price_eth,
+                avg(price_eth)              AS avg_price_eth,
+                first(price_eth, timestamp) AS first_price_eth,
+                last(price_eth, timestamp)  AS last_price_eth,
+                min(premium)                AS min_premium,
+                max(premium)                AS max_premium,
+                avg(premium)                AS avg_premium,
+                first(premium, timestamp)   AS first_premium,
+                last(premium, timestamp)    AS last_premium
+         FROM prices
+         GROUP BY bucket, token_name, network, is_primary_market
+         WITH NO DATA',
+        view_name, bucket_width
+    );
+
+    PERFORM add_continuous_aggregate_policy(
+        view_name::regclass, start_offset, end_offset, schedule_interval, if_not_exists => TRUE
+    );
+
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS %I ON %I (token_name, network, is_primary_market, bucket DESC)',
+        view_name || '_token_network_market_bucket_idx', view_name
+    );
+END
+$$;
+
+--                                    view              bucket       start offset  end offset   schedule interval
+CALL create_price_history_aggregate('prices_5_minutes', '5 minutes', '3 hours',    '5 minutes', '5 minutes');
+CALL create_price_history_aggregate('prices_1_hour',    '1 hour',    '1 day',      '1 hour',    '30 minutes');
+CALL create_price_history_aggregate('prices_1_day',     '1 day',     '7 days',     '1 day',     '1 hour');
+CALL create_price_history_aggregate('prices_1_week',    '1 week',    '1 month',    '1 week',    '1 day');
+CALL create_price_history_aggregate('prices_1_month',   '1 month',   '3 months',   '1 month',   '1 day');
+
+CALL refresh_continuous_aggregate('prices_5_minutes', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_hour', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_day', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_week', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_month', NULL, NULL);
+
+---
+/* Compress prices chunks once they are a week old. Rows are segmented by pair so that queries on a pair only decompress
+   its rows, and ordered by timestamp so that the latest rows of a pair are read first */
+ALTER TABLE prices SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'token_name, network, is_primary_market',
+    timescaledb.compress_orderby = 'timestamp DESC'
+);
+SELECT add_compression_policy('prices', compress_after => INTERVAL '7 days', if_not_exists => TRUE);
+
+/* Tiered retention: raw prices and each continuous aggregate are kept longer than the largest time window they serve.
+   Raw prices are dropped once the aggregates cover them: after a year, which is well past the largest refresh window of
+   the aggregates (3 months), so that refreshes never see dropped rows: do not refresh the aggregates manually over
+   ranges older than a year, it would delete their buckets. The monthly aggregate is kept forever. To backfill older
+   prices, pause the retention of prices until the aggregates are refreshed (see the Backfill section of the
+   price-fetcher README) */
+SELECT add_retention_policy('prices', drop_after => INTERVAL '1 year', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_5_minutes', drop_after => INTERVAL '1 month', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_hour', drop_after => INTERVAL '3 months', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_day', drop_after => INTERVAL '1 year', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_week', drop_after => INTERVAL '2 years', if_not_exists => TRUE);
+
+/* Derive the chunk interval of prices from its ingest rate over the last week, so that chunks hold about
+   target_chunk_rows rows (between an hour and a week of data). Only chunks created afterwards are affected.
+   Run daily as a job, and once now */
+CREATE OR REPLACE PROCEDURE tune_prices_chunk_interval(job_id integer, config jsonb)
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    target_chunk_rows bigint := coalesce((config ->> 'target_chunk_rows')::bigint, 10000000);
+    rows_per_day      numeric;
+    chunk_interval    interval;
+BEGIN
+    SELECT count(*) / 7.0 INTO rows_per_day FROM prices WHERE timestamp > now() - INTERVAL '7 days';
+    IF rows_per_day = 0 THEN
+        RETURN;
+    END IF;
+
+    chunk_interval := greatest(
+        INTERVAL '1 hour',
+        least(INTERVAL '7 days', make_interval(secs => (target_chunk_rows / rows_per_day * 86400)::double precision))
+    );
+    PERFORM set_chunk_time_interval('prices', chunk_interval);
+    RAISE NOTICE 'prices chunk interval set to % (% rows per day)', chunk_interval, round(rows_per_day);
+END
+$$;
+
+SELECT add_job('tune_prices_chunk_interval', INTERVAL '1 day', config => '{"target_chunk_rows": 10000000}')
+WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'tune_prices_chunk_interval');
+CALL tune_prices_chunk_interval(NULL, '{}');
+
+---
+/* Create price depth hypertable: secondary market prices for a ladder of trade sizes, one row per token, network and side */
+CREATE TABLE IF NOT EXISTS price_depth
+(
+    timestamp  timestamp with time zone not null,
+    token_name text                     not null,
+    network    text                     not null,
+    is_buy     boolean                  not null,
+    sizes_eth  numeric[]                not null,
+    prices_eth numeric(20, 18)[]        not null,
+    sources    text[],
+    primary key (timestamp, token_name, network, is_buy)
+);
+SELECT create_hypertable('price_depth', 'timestamp');
+
+CREATE INDEX IF NOT EXISTS price_depth_token_network_timestamp_idx ON price_depth (token_name, network, timestamp DESC);
+
+---
+/* Create fetcher workers and shard leases tables: token / chain pairs are split between price fetcher instances */
+CREATE TABLE IF NOT EXISTS fetcher_workers
+(
+    worker_id    text                     not null primary key,
+    heartbeat_at timestamp with time zone not null
+);
+
+CREATE TABLE IF NOT EXISTS fetcher_leases
+(
+    shard      integer                  not null primary key,
+    worker_id  text                     not null,
+    expires_at timestamp with time zone not null
+);
+
 ---
 /* Create token listings table */
 CREATE TABLE IF NOT EXISTS token_listings (
@@ -27,18 +175,49 @@ CREATE TABLE IF NOT EXISTS token_listings (
     PRIMARY KEY (token_name, network, is_primary_market)
 );
 
-/* Trigger function to upsert into token_listings on insert into prices */
+/* Create latest prices table: the last price of each token / network / market, so that the last prices are read
+   with point lookups instead of scanning the prices hypertable */
+CREATE TABLE IF NOT EXISTS latest_prices (
+    token_name        text                     NOT NULL,
+    network           text                     NOT NULL,
+    is_primary_market boolean                  NOT NULL,
+    timestamp         timestamp with time zone NOT NULL,
+    price_eth         numeric(20, 18),
+    price_usd         numeric(16, 2),
+    premium           numeric(6, 5),
+    source            text,
+    PRIMARY KEY (token_name, network, is_primary_market)
+);
+
+/* Trigger function to upsert into token_listings and latest_prices once per insert statement into prices, from the
+   rows it inserted: each listing of the statement is upserted once, with its latest row. Older rows (e.g. from a
+   backfill) do not replace the latest price. Transition tables on hypertables need TimescaleDB 2.17 or later */
 CREATE OR REPLACE FUNCTION upsert_token_listings()
 RETURNS TRIGGER AS $$
 BEGIN
     INSERT INTO token_listings (token_name, network, is_primary_market)
-    VALUES (NEW.token_name, NEW.network, NEW.is_primary_market)
+    SELECT DISTINCT token_name, network, is_primary_market
+    FROM inserted_prices
     ON CONFLICT (token_name, network, is_primary_market) DO NOTHING;
-    RETURN NEW;
+
+    INSERT INTO latest_prices (token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source)
+    SELECT DISTINCT ON (token_name, network, is_primary_market)
+           token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source
+    FROM inserted_prices
+    ORDER BY token_name, network, is_primary_market, timestamp DESC
+    ON CONFLICT (token_name, network, is_primary_market) DO UPDATE
+    SET timestamp = EXCLUDED.timestamp,
+        price_eth = EXCLUDED.price_eth,
+        price_usd = EXCLUDED.price_usd,
+        premium   = EXCLUDED.premium,
+        source    = EXCLUDED.source
+    WHERE latest_prices.timestamp < EXCLUDED.timestamp;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER trg_upsert_token_listings
 AFTER INSERT ON prices
-FOR EACH ROW
+REFERENCING NEW TABLE AS inserted_prices
+FOR EACH STATEMENT
 EXECUTE FUNCTION upsert_token_listings();
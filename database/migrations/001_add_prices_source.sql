@@ -0,0 +1,2 @@
+/* Record which secondary market provider a secondary market price comes from */
+ALTER TABLE prices ADD COLUMN IF NOT EXISTS source text;
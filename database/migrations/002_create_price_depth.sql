@@ -0,0 +1,15 @@
+/* Create price depth hypertable: secondary market prices for a ladder of trade sizes, one row per token, network and side */
+CREATE TABLE IF NOT EXISTS price_depth
+(
+    timestamp  timestamp with time zone not null,
+    token_name text                     not null,
+    network    text                     not null,
+    is_buy     boolean                  not null,
+    sizes_eth  numeric[]                not null,
+    prices_eth numeric(20, 18)[]        not null,
+    sources    text[],
+    primary key (timestamp, token_name, network, is_buy)
+);
+SELECT create_hypertable('price_depth', 'timestamp', if_not_exists => TRUE);
+
+CREATE INDEX IF NOT EXISTS price_depth_token_network_timestamp_idx ON price_depth (token_name, network, timestamp DESC);
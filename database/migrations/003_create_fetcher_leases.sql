@@ -0,0 +1,13 @@
+/* Create fetcher workers and shard leases tables: token / chain pairs are split between price fetcher instances */
+CREATE TABLE IF NOT EXISTS fetcher_workers
+(
+    worker_id    text                     not null primary key,
+    heartbeat_at timestamp with time zone not null
+);
+
+CREATE TABLE IF NOT EXISTS fetcher_leases
+(
+    shard      integer                  not null primary key,
+    worker_id  text                     not null,
+    expires_at timestamp with time zone not null
+);
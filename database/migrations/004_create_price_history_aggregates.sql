@@ -0,0 +1,62 @@
+/* Create continuous aggregates of the prices hypertable, one per price history time bucket, with the same columns.
+   Queries also aggregate the rows not materialized yet (real-time aggregation), so buckets are complete up to now.
+   Refresh policies materialize recent buckets again to pick up late rows: after backfilling older data, refresh the
+   aggregates over its range, e.g. CALL refresh_continuous_aggregate('prices_1_day', '2024-01-01', '2024-07-01');
+   Aggregates are created empty by create_price_history_aggregate, which can run in a transaction, then materialized
+   over the existing prices by a refresh, which cannot */
+CREATE OR REPLACE PROCEDURE create_price_history_aggregate(
+    view_name         text,
+    bucket_width      interval,
+    start_offset      interval,
+    end_offset        interval,
+    schedule_interval interval
+)
+LANGUAGE plpgsql AS
+$$
+BEGIN
+    EXECUTE format(
+        'CREATE MATERIALIZED VIEW IF NOT EXISTS %I
+         WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+         SELECT time_bucket(%L::interval, timestamp) AS bucket,
+                token_name,
+                network,
+                is_primary_market,
+                min(price_eth)              AS min_price_eth,
+                max(price_eth)              AS max_price_eth,
+                avg(price_eth)              AS avg_price_eth,
+                first(price_eth, timestamp) AS first_price_eth,
+                last(price_eth, timestamp)  AS last_price_eth,
+                min(premium)                AS min_premium,
+                max(premium)                AS max_premium,
+                avg(premium)                AS avg_premium,
+                first(premium, timestamp)   AS first_premium,
+                last(premium, timestamp)    AS last_premium
+         FROM prices
+         GROUP BY bucket, token_name, network, is_primary_market
+         WITH NO DATA',
+        view_name, bucket_width
+    );
+
+    PERFORM add_continuous_aggregate_policy(
+        view_name::regclass, start_offset, end_offset, schedule_interval, if_not_exists => TRUE
+    );
+
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS %I ON %I (token_name, network, is_primary_market, bucket DESC)',
+        view_name || '_token_network_market_bucket_idx', view_name
+    );
+END
+$$;
+
+--                                    view              bucket       start offset  end offset   schedule interval
+CALL create_price_history_aggregate('prices_5_minutes', '5 minutes', '3 hours',    '5 minutes', '5 minutes');
+CALL create_price_history_aggregate('prices_1_hour',    '1 hour',    '1 day',      '1 hour',    '30 minutes');
+CALL create_price_history_aggregate('prices_1_day',     '1 day',     '7 days',     '1 day',     '1 hour');
+CALL create_price_history_aggregate('prices_1_week',    '1 week',    '1 month',    '1 week',    '1 day');
+CALL create_price_history_aggregate('prices_1_month',   '1 month',   '3 months',   '1 month',   '1 day');
+
+CALL refresh_continuous_aggregate('prices_5_minutes', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_hour', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_day', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_week', NULL, NULL);
+CALL refresh_continuous_aggregate('prices_1_month', NULL, NULL);
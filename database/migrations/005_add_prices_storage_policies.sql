@@ -0,0 +1,49 @@
+/* Compress prices chunks once they are a week old. Rows are segmented by pair so that queries on a pair only decompress
+   its rows, and ordered by timestamp so that the latest rows of a pair are read first */
+ALTER TABLE prices SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'token_name, network, is_primary_market',
+    timescaledb.compress_orderby = 'timestamp DESC'
+);
+SELECT add_compression_policy('prices', compress_after => INTERVAL '7 days', if_not_exists => TRUE);
+
+/* Tiered retention: raw prices and each continuous aggregate are kept longer than the largest time window they serve.
+   Raw prices are dropped once the aggregates cover them: after a year, which is well past the largest refresh window of
+   the aggregates (3 months), so that refreshes never see dropped rows: do not refresh the aggregates manually over
+   ranges older than a year, it would delete their buckets. The monthly aggregate is kept forever. To backfill older
+   prices, pause the retention of prices until the aggregates are refreshed (see the Backfill section of the
+   price-fetcher README) */
+SELECT add_retention_policy('prices', drop_after => INTERVAL '1 year', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_5_minutes', drop_after => INTERVAL '1 month', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_hour', drop_after => INTERVAL '3 months', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_day', drop_after => INTERVAL '1 year', if_not_exists => TRUE);
+SELECT add_retention_policy('prices_1_week', drop_after => INTERVAL '2 years', if_not_exists => TRUE);
+
+/* Derive the chunk interval of prices from its ingest rate over the last week, so that chunks hold about
+   target_chunk_rows rows (between an hour and a week of data). Only chunks created afterwards are affected.
+   Run daily as a job, and once now */
+CREATE OR REPLACE PROCEDURE tune_prices_chunk_interval(job_id integer, config jsonb)
+LANGUAGE plpgsql AS
+$$
+DECLARE
+    target_chunk_rows bigint := coalesce((config ->> 'target_chunk_rows')::bigint, 10000000);
+    rows_per_day      numeric;
+    chunk_interval    interval;
+BEGIN
+    SELECT count(*) / 7.0 INTO rows_per_day FROM prices WHERE timestamp > now() - INTERVAL '7 days';
+    IF rows_per_day = 0 THEN
+        RETURN;
+    END IF;
+
+    chunk_interval := greatest(
+        INTERVAL '1 hour',
+        least(INTERVAL '7 days', make_interval(secs => (target_chunk_rows / rows_per_day * 86400)::double precision))
+    );
+    PERFORM set_chunk_time_interval('prices', chunk_interval);
+    RAISE NOTICE 'prices chunk interval set to % (% rows per day)', chunk_interval, round(rows_per_day);
+END
+$$;
+
+SELECT add_job('tune_prices_chunk_interval', INTERVAL '1 day', config => '{"target_chunk_rows": 10000000}')
+WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'tune_prices_chunk_interval');
+CALL tune_prices_chunk_interval(NULL, '{}');
@@ -0,0 +1,58 @@
+/* Create latest prices table: the last price of each token / network / market, so that the last prices are read
+   with point lookups instead of scanning the prices hypertable */
+CREATE TABLE IF NOT EXISTS latest_prices (
+    token_name        text                     NOT NULL,
+    network           text                     NOT NULL,
+    is_primary_market boolean                  NOT NULL,
+    timestamp         timestamp with time zone NOT NULL,
+    price_eth         numeric(20, 18),
+    price_usd         numeric(16, 2),
+    premium           numeric(6, 5),
+    source            text,
+    PRIMARY KEY (token_name, network, is_primary_market)
+);
+
+/* Trigger function to upsert into token_listings and latest_prices on insert into prices. Older rows (e.g. from a
+   backfill) do not replace the latest price */
+CREATE OR REPLACE FUNCTION upsert_token_listings()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO token_listings (token_name, network, is_primary_market)
+    VALUES (NEW.token_name, NEW.network, NEW.is_primary_market)
+    ON CONFLICT (token_name, network, is_primary_market) DO NOTHING;
+
+    INSERT INTO latest_prices (token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source)
+    VALUES (NEW.token_name, NEW.network, NEW.is_primary_market, NEW.timestamp, NEW.price_eth, NEW.price_usd, NEW.premium,
+            NEW.source)
+    ON CONFLICT (token_name, network, is_primary_market) DO UPDATE
+    SET timestamp = EXCLUDED.timestamp,
+        price_eth = EXCLUDED.price_eth,
+        price_usd = EXCLUDED.price_usd,
+        premium   = EXCLUDED.premium,
+        source    = EXCLUDED.source
+    WHERE latest_prices.timestamp < EXCLUDED.timestamp;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+/* Fill latest prices from the prices hypertable: one index scan per listing */
+INSERT INTO latest_prices (token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source)
+SELECT listing.token_name,
+       listing.network,
+       listing.is_primary_market,
+       latest.timestamp,
+       latest.price_eth,
+       latest.price_usd,
+       latest.premium,
+       latest.source
+FROM token_listings listing
+CROSS JOIN LATERAL (
+    SELECT timestamp, price_eth, price_usd, premium, source
+    FROM prices
+    WHERE prices.token_name = listing.token_name
+      AND prices.network = listing.network
+      AND prices.is_primary_market = listing.is_primary_market
+    ORDER BY timestamp DESC
+    LIMIT 1
+) latest
+ON CONFLICT (token_name, network, is_primary_market) DO NOTHING;
@@ -0,0 +1,38 @@
+/* Maintain token_listings and latest_prices once per insert statement into prices instead of once per row: the
+   trigger function reads the rows inserted by the statement from a transition table. The trigger is replaced in a
+   single transaction so that no insert runs without it. Needs TimescaleDB 2.17 or later */
+BEGIN;
+
+DROP TRIGGER IF EXISTS trg_upsert_token_listings ON prices;
+
+CREATE OR REPLACE FUNCTION upsert_token_listings()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO token_listings (token_name, network, is_primary_market)
+    SELECT DISTINCT token_name, network, is_primary_market
+    FROM inserted_prices
+    ON CONFLICT (token_name, network, is_primary_market) DO NOTHING;
+
+    INSERT INTO latest_prices (token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source)
+    SELECT DISTINCT ON (token_name, network, is_primary_market)
+           token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source
+    FROM inserted_prices
+    ORDER BY token_name, network, is_primary_market, timestamp DESC
+    ON CONFLICT (token_name, network, is_primary_market) DO UPDATE
+    SET timestamp = EXCLUDED.timestamp,
+        price_eth = EXCLUDED.price_eth,
+        price_usd = EXCLUDED.price_usd,
+        premium   = EXCLUDED.premium,
+        source    = EXCLUDED.source
+    WHERE latest_prices.timestamp < EXCLUDED.timestamp;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_upsert_token_listings
+AFTER INSERT ON prices
+REFERENCING NEW TABLE AS inserted_prices
+FOR EACH STATEMENT
+EXECUTE FUNCTION upsert_token_listings();
+
+COMMIT;
@@ -0,0 +1,102 @@
+"""
+Record and replay of the responses of the secondary market APIs and of the JSON-RPC node.
+"""
+
+import json
+import threading
+from typing import NamedTuple
+
+import httpx
+
+# Response headers kept in cassettes, the others depend on the recording session
+RECORDED_HEADERS = (
+    "Retry-After",
+    "X-RateLimit-Remaining",
+    "X-RateLimit-Reset",
+    "RateLimit-Remaining",
+    "RateLimit-Reset",
+)
+
+
+class CassetteResponse(NamedTuple):
+    status_code: int
+    headers: dict[str, str]
+    body: str
+
+    @classmethod
+    def from_httpx(cls, response: httpx.Response) -> "CassetteResponse":
+        return cls(
+            response.status_code,
+            {key: response.headers[key] for key in RECORDED_HEADERS if key in response.headers},
+            response.text,
+        )
+
+
+class Cassette:
+    """
+    Responses by service and request, saved as a JSON file.
+
+    JSON-RPC requests are identified by their methods and parameters, without their ids which depend on the order of
+    the requests: replayed responses get the ids of the replayed requests.
+    """
+
+    def __init__(self, interactions: dict[str, dict[str, CassetteResponse]] | None = None):
+        self.interactions = interactions or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cassette_file: str) -> "Cassette":
+        with open(cassette_file) as f:
+            data = json.load(f)
+        return cls(
+            {
+                service: {key: CassetteResponse(**response) for key, response in responses.items()}
+                for service, responses in data["interactions"].items()
+            }
+        )
+
+    def save(self, cassette_file: str):
+        with self._lock:
+            data = {
+                "version": 1,
+                "interactions": {
+                    service: {key: response._asdict() for key, response in sorted(responses.items())}
+                    for service, responses in self.interactions.items()
+                },
+            }
+        with open(cassette_file, "w") as f:
+            json.dump(data, f, indent=1)
+
+    @staticmethod
+    def _get_key(method: str, path: str, body: bytes) -> str:
+        if not body:
+            return f"{method} {path}"
+        request = json.loads(body)
+        requests = request if isinstance(request, list) else [request]
+        calls = [[rpc_request["method"], rpc_request.get("params", [])] for rpc_request in requests]
+        return f"{method} {json.dumps(calls if isinstance(request, list) else calls[0], sort_keys=True)}"
+
+    def record(self, service: str, method: str, path: str, body: bytes, response: CassetteResponse):
+        if body and response.status_code == 200:
+            # Ids are set back when the response is replayed
+            rpc_response = json.loads(response.body)
+            for item in rpc_response if isinstance(rpc_response, list) else [rpc_response]:
+                item.pop("id", None)
+            response = response._replace(body=json.dumps(rpc_response))
+        with self._lock:
+            self.interactions.setdefault(service, {})[self._get_key(method, path, body)] = response
+
+    def replay(self, service: str, method: str, path: str, body: bytes) -> CassetteResponse:
+        response = self.interactions.get(service, {}).get(self._get_key(method, path, body))
+        if response is None:
+            return CassetteResponse(404, {}, json.dumps({"error": "Request not recorded in the cassette"}))
+        if not body or response.status_code != 200:
+            return response
+
+        request, rpc_response = json.loads(body), json.loads(response.body)
+        if isinstance(request, list):
+            for rpc_request, item in zip(request, rpc_response):
+                item["id"] = rpc_request["id"]
+        else:
+            rpc_response["id"] = request["id"]
+        return response._replace(body=json.dumps(rpc_response))
@@ -0,0 +1,174 @@
+"""
+Ingest benchmark of the prices table: rows per second saved by `PostgresDataSaver` per batch size, with each way of
+maintaining `token_listings` and `latest_prices`.
+
+The benchmark needs a dedicated TimescaleDB database initialized with `database/init.sql`. Each variant installs its
+trigger on the prices table, then batches of `--pairs` token / chain pairs quoted at successive timestamps are saved
+with `save_data_points`:
+- "no trigger": the listings are not maintained, the cost of the insert alone
+- "per row": the former `FOR EACH ROW` trigger, upserting both tables for every inserted row
+- "per statement": the `FOR EACH STATEMENT` trigger of `database/init.sql`, upserting each listing of a statement once
+The statement-level trigger is installed again at the end. Background jobs are paused while the benchmark runs, and the
+synthetic rows are left in the database.
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from storage_benchmark import set_jobs_scheduled
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from data_storage.DataSaver import DataPoint  # noqa: E402
+from data_storage.PostgresDataSaver import PostgresDataSaver  # noqa: E402
+
+# Row-level version of the trigger function, before transition tables were used
+ROW_TRIGGER_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION benchmark_upsert_token_listings_per_row()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO token_listings (token_name, network, is_primary_market)
+        VALUES (NEW.token_name, NEW.network, NEW.is_primary_market)
+        ON CONFLICT (token_name, network, is_primary_market) DO NOTHING;
+
+        INSERT INTO latest_prices
+            (token_name, network, is_primary_market, timestamp, price_eth, price_usd, premium, source)
+        VALUES (NEW.token_name, NEW.network, NEW.is_primary_market, NEW.timestamp, NEW.price_eth, NEW.price_usd,
+                NEW.premium, NEW.source)
+        ON CONFLICT (token_name, network, is_primary_market) DO UPDATE
+        SET timestamp = EXCLUDED.timestamp,
+            price_eth = EXCLUDED.price_eth,
+            price_usd = EXCLUDED.price_usd,
+            premium   = EXCLUDED.premium,
+            source    = EXCLUDED.source
+        WHERE latest_prices.timestamp < EXCLUDED.timestamp;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+TRIGGERS_SQL = {
+    "no trigger": None,
+    "per row": """
+        CREATE TRIGGER trg_upsert_token_listings
+        AFTER INSERT ON prices
+        FOR EACH ROW
+        EXECUTE FUNCTION benchmark_upsert_token_listings_per_row()
+    """,
+    "per statement": """
+        CREATE TRIGGER trg_upsert_token_listings
+        AFTER INSERT ON prices
+        REFERENCING NEW TABLE AS inserted_prices
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION upsert_token_listings()
+    """,
+}
+
+
+def install_trigger(engine, variant: str):
+    with engine.begin() as connection:
+        connection.execute(text("DROP TRIGGER IF EXISTS trg_upsert_token_listings ON prices"))
+        if TRIGGERS_SQL[variant]:
+            connection.execute(text(TRIGGERS_SQL[variant]))
+
+
+def get_data_points(start: datetime, batch_size: int, batch_count: int, pairs: int) -> list[list[DataPoint]]:
+    """
+    Returns batches of data points, the pairs of each timestamp in turn, starting at `start` one millisecond apart
+    """
+    data_points = [
+        DataPoint(
+            timestamp=start + timedelta(milliseconds=i // pairs),
+            token_name=f"TOKEN{i % pairs // 2}",
+            price_eth=Decimal("1.05") + Decimal(i % 1000) / 10**6,
+            price_usd=None,
+            network="ethereum",
+            is_primary_market=i % 2 == 0,
+            premium=0.001,
+            source=None if i % 2 == 0 else "paraswap",
+        )
+        for i in range(batch_size * batch_count)
+    ]
+    return [data_points[i : i + batch_size] for i in range(0, len(data_points), batch_size)]
+
+
+def measure_ingest(data_saver: PostgresDataSaver, batches: list[list[DataPoint]]) -> float:
+    """
+    Returns the number of rows saved per second
+    """
+    started_at = time.perf_counter()
+    for batch in batches:
+        data_saver.save_data_points(batch)
+    return sum(len(batch) for batch in batches) / (time.perf_counter() - started_at)
+
+
+def parse_batch_size(value: str) -> tuple[int, int]:
+    batch_size, batch_count = value.split(":")
+    return int(batch_size), int(batch_count)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--database-url",
+        help="URL of a dedicated database initialized with database/init.sql",
+        default=os.getenv("DATABASE_URL"),
+    )
+    parser.add_argument(
+        "--batch-size",
+        help="Batch size and number of batches, e.g. '100:50' (can be repeated, default 1:2000, 100:200 and 10000:10)",
+        type=parse_batch_size,
+        action="append",
+    )
+    parser.add_argument("--pairs", help="Number of token / chain pairs quoted at each timestamp", type=int, default=100)
+    parser.add_argument("--runs", help="Number of runs per variant and batch size", type=int, default=3)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    batch_sizes = args.batch_size or [(1, 2000), (100, 200), (10_000, 10)]
+
+    engine = create_engine(args.database_url, isolation_level="AUTOCOMMIT")
+    data_saver = PostgresDataSaver(args.database_url)
+    # Runs insert new rows into the current chunk, one millisecond of timestamps per `--pairs` rows
+    start = datetime.now(timezone.utc)
+    results = {}
+    with engine.connect() as connection:
+        set_jobs_scheduled(connection, False)
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(ROW_TRIGGER_FUNCTION_SQL))
+        for variant in TRIGGERS_SQL:
+            install_trigger(engine, variant)
+            results[variant] = {}
+            for batch_size, batch_count in batch_sizes:
+                rows_per_second = []
+                for _ in range(args.runs):
+                    batches = get_data_points(start, batch_size, batch_count, args.pairs)
+                    start += timedelta(milliseconds=batch_size * batch_count // args.pairs + 1)
+                    rows_per_second.append(measure_ingest(data_saver, batches))
+                results[variant][batch_size] = statistics.median(rows_per_second)
+                print(f"{variant}, batches of {batch_size}: {results[variant][batch_size]:.0f} rows/s", file=sys.stderr)
+    finally:
+        install_trigger(engine, "per statement")
+        with engine.begin() as connection:
+            connection.execute(text("DROP FUNCTION IF EXISTS benchmark_upsert_token_listings_per_row()"))
+            set_jobs_scheduled(connection, True)
+        data_saver.close()
+
+    print(f"{'BATCH SIZE':<12}" + "".join(f"{variant + ' (rows/s)':>26}" for variant in results))
+    for batch_size, _ in batch_sizes:
+        print(f"{batch_size:<12}" + "".join(f"{result[batch_size]:>26.0f}" for result in results.values()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,301 @@
+"""
+Local stand-ins of the Paraswap and 1inch APIs and of a JSON-RPC node for benchmarks.
+
+Each service is served by its own HTTP server and answers either with synthetic responses (mock mode), with responses
+recorded in a cassette (replay mode), or by forwarding requests to the real service and recording its responses
+(record mode). Latency, errors, 429 responses and slow-loris responses are injected in mock and replay modes.
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from cassette import Cassette, CassetteResponse
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+
+PARASWAP = "paraswap"
+ONE_INCH = "1inch"
+RPC = "rpc"
+
+# Hosts of the real services, requests to them are redirected to the stand-ins
+UPSTREAM_URLS = {
+    PARASWAP: "https://apiv5.paraswap.io",
+    ONE_INCH: "https://api.1inch.dev",
+}
+
+AGGREGATE3_SELECTOR = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+GET_BLOCK_NUMBER_SELECTOR = function_signature_to_4byte_selector("getBlockNumber()")
+
+# Exchange rate returned for every primary market rate call, and fraction of it quoted on secondary markets
+MOCK_EXCHANGE_RATE = 11 * 10**17
+MOCK_SECONDARY_MARKET_RATIO = (99, 100)
+
+
+class LatencyDistribution(NamedTuple):
+    """
+    Distribution of the response latencies, parsed from `constant:<ms>`, `uniform:<min ms>:<max ms>` or
+    `lognormal:<median ms>:<sigma>`
+    """
+
+    kind: str
+    a: float = 0
+    b: float = 0
+
+    @classmethod
+    def parse(cls, value: str) -> "LatencyDistribution":
+        kind, *params = value.split(":")
+        expected_params = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected_params or len(params) != expected_params[kind]:
+            raise ValueError(f"invalid latency distribution: {value}")
+        return cls(kind, *(float(param) for param in params))
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Returns a latency in seconds
+        """
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b) / 1000
+        if self.kind == "lognormal":
+            return rng.lognormvariate(0, self.b) * self.a / 1000
+        return self.a / 1000
+
+
+@dataclass(frozen=True)
+class FaultProfile:
+    """
+    Faults injected in the responses of a service, rates are fractions of the requests
+    """
+
+    latency: LatencyDistribution = LatencyDistribution("constant")
+    error_rate: float = 0
+    throttle_rate: float = 0
+    # Slow-loris responses send their body one byte every `slowloris_interval` seconds
+    slowloris_rate: float = 0
+    slowloris_interval: float = 1
+
+
+def get_paraswap_response(path: str, body: bytes) -> CassetteResponse:
+    amount = int(parse_qs(urlsplit(path).query)["amount"][0])
+    amount_out = amount * MOCK_SECONDARY_MARKET_RATIO[0] // MOCK_SECONDARY_MARKET_RATIO[1]
+    return CassetteResponse(200, {}, json.dumps({"priceRoute": {"destAmount": str(amount_out)}}))
+
+
+def get_one_inch_response(path: str, body: bytes) -> CassetteResponse:
+    amount = int(parse_qs(urlsplit(path).query)["amount"][0])
+    amount_out = amount * MOCK_SECONDARY_MARKET_RATIO[0] // MOCK_SECONDARY_MARKET_RATIO[1]
+    return CassetteResponse(200, {}, json.dumps({"toAmount": str(amount_out)}))
+
+
+def get_rpc_result(method: str, params: list):
+    # A block every 12 seconds
+    block_number = int(time.time()) // 12
+    if method == "eth_chainId":
+        return "0x1"
+    if method == "eth_blockNumber":
+        return hex(block_number)
+    if method == "eth_getLogs":
+        return []
+    if method == "eth_call":
+        data = bytes.fromhex(params[0]["data"].removeprefix("0x"))
+        if data[:4] != AGGREGATE3_SELECTOR:
+            return "0x" + encode(["uint256"], [MOCK_EXCHANGE_RATE]).hex()
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        results = [
+            (
+                True,
+                encode(
+                    ["uint256"], [block_number if call_data[:4] == GET_BLOCK_NUMBER_SELECTOR else MOCK_EXCHANGE_RATE]
+                ),
+            )
+            for _, _, call_data in calls
+        ]
+        return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+    return None
+
+
+def get_rpc_response(path: str, body: bytes) -> CassetteResponse:
+    request = json.loads(body)
+    requests = request if isinstance(request, list) else [request]
+    responses = [
+        {
+            "jsonrpc": "2.0",
+            "id": rpc_request["id"],
+            "result": get_rpc_result(rpc_request["method"], rpc_request["params"]),
+        }
+        for rpc_request in requests
+    ]
+    return CassetteResponse(200, {}, json.dumps(responses if isinstance(request, list) else responses[0]))
+
+
+MOCK_RESPONDERS: dict[str, Callable[[str, bytes], CassetteResponse]] = {
+    PARASWAP: get_paraswap_response,
+    ONE_INCH: get_one_inch_response,
+    RPC: get_rpc_response,
+}
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    """
+    HTTP server standing in for one service
+    """
+
+    daemon_threads = True
+    # Clients of the price fetcher keep many connections open
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        service: str,
+        fault_profile: FaultProfile,
+        seed: int,
+        cassette: Optional[Cassette] = None,
+        record: bool = False,
+        upstream_url: Optional[str] = None,
+    ):
+        super().__init__(("127.0.0.1", 0), MockProviderRequestHandler)
+        self.service = service
+        self.fault_profile = fault_profile
+        self.cassette = cassette
+        self.record = record
+        self.upstream_url = upstream_url
+        self.upstream_client = httpx.Client(timeout=30) if record else None
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def draw(self) -> tuple[float, float]:
+        """
+        Returns a latency in seconds and a uniform number in [0, 1) picking the injected fault
+        """
+        with self._rng_lock:
+            return self.fault_profile.latency.sample(self._rng), self._rng.random()
+
+    def get_response(self, method: str, path: str, headers: dict, body: bytes) -> CassetteResponse:
+        if self.record:
+            url = self.upstream_url if self.service == RPC else f"{self.upstream_url}{path}"
+            upstream_response = self.upstream_client.request(
+                method,
+                url,
+                content=body or None,
+                headers={
+                    key: value for key, value in headers.items() if key.lower() in ("authorization", "content-type")
+                },
+            )
+            response = CassetteResponse.from_httpx(upstream_response)
+            self.cassette.record(self.service, method, path, body, response)
+            return response
+        if self.cassette is not None:
+            return self.cassette.replay(self.service, method, path, body)
+        return MOCK_RESPONDERS[self.service](path, body)
+
+    def handle_error(self, request, client_address):
+        # Clients drop the connections of cancelled and timed out requests
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        if self.upstream_client is not None:
+            self.upstream_client.close()
+
+
+class MockProviderRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockProviderServer
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        response = self.server.get_response(self.command, self.path, dict(self.headers), body)
+
+        slowloris_interval = None
+        if not self.server.record:
+            latency, fault = self.server.draw()
+            profile = self.server.fault_profile
+            time.sleep(latency)
+            if fault < profile.error_rate:
+                response = CassetteResponse(500, {}, json.dumps({"error": "Injected error"}))
+            elif fault < profile.error_rate + profile.throttle_rate:
+                response = CassetteResponse(429, {}, json.dumps({"error": "Injected rate limit"}))
+            elif fault < profile.error_rate + profile.throttle_rate + profile.slowloris_rate:
+                slowloris_interval = profile.slowloris_interval
+
+        content = response.body.encode()
+        self.send_response(response.status_code)
+        for key, value in response.headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if slowloris_interval is None:
+            self.wfile.write(content)
+            return
+        for i in range(len(content)):
+            self.wfile.write(content[i : i + 1])
+            self.wfile.flush()
+            time.sleep(slowloris_interval)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def log_message(self, format: str, *args):
+        logging.debug(f"{self.server.service}: {format % args}")
+
+
+def serve_mock_providers(
+    fault_profiles: dict[str, FaultProfile],
+    seed: int,
+    urls_queue,
+    stop_event,
+    cassette_file: Optional[str] = None,
+    record: bool = False,
+    rpc_upstream_url: Optional[str] = None,
+):
+    """
+    Serves the stand-ins until `stop_event` is set, meant to run in its own process so that it does not weigh on the
+    measured process
+
+    Args:
+        fault_profiles (dict[str, FaultProfile]): faults injected per service
+        seed (int): seed of the random latencies and faults
+        urls_queue (Queue): receives the URL of each service once they are served
+        stop_event (Event): stops the servers, and saves the cassette in record mode
+        cassette_file (Optional[str]): cassette to replay, or to record with `record`
+        record (bool): whether requests are forwarded to the real services and their responses recorded
+        rpc_upstream_url (Optional[str]): JSON-RPC node recorded in record mode
+    """
+    cassette = None
+    if cassette_file:
+        cassette = Cassette() if record else Cassette.load(cassette_file)
+
+    upstream_urls = {**UPSTREAM_URLS, RPC: rpc_upstream_url}
+    servers = {
+        service: MockProviderServer(
+            service, fault_profiles[service], seed + i, cassette, record, upstream_urls[service]
+        )
+        for i, service in enumerate((PARASWAP, ONE_INCH, RPC))
+    }
+    for server in servers.values():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls_queue.put({service: server.url for service, server in servers.items()})
+
+    stop_event.wait()
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+    if record:
+        cassette.save(cassette_file)
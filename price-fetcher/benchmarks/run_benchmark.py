@@ -0,0 +1,488 @@
+"""
+Benchmark of the price fetcher against local stand-ins of the secondary market APIs and of a JSON-RPC node.
+
+Each scenario runs `main()` (or `async_main.main()`) for a warm-up cycle and `--cycles` measured cycles in a fresh
+process, with a synthetic config of the given number of token / chain pairs, and reports the cycle time, the quote
+throughput, the p50 / p99 latency of the quotes and the peak RSS of the process. Results can be saved with `--output`
+and compared with the results of another commit with `--compare`.
+"""
+
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from mock_providers import (
+    ONE_INCH,
+    PARASWAP,
+    RPC,
+    UPSTREAM_URLS,
+    FaultProfile,
+    LatencyDistribution,
+    serve_mock_providers,
+)
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+# Chains supported by both secondary markets, synthetic tokens are quoted on them in this order
+SYNTHETIC_CHAINS = ["ethereum", "arbitrum", "optimism", "polygon", "gnosis", "base"]
+
+# Metrics checked by --compare, higher is worse for all of them
+COMPARED_METRICS = ("cycle_time_s", "quote_latency_p50_ms", "quote_latency_p99_ms", "peak_rss_mb")
+
+
+def get_synthetic_config(pair_count: int) -> dict:
+    """
+    Returns a config of `pair_count` token / chain pairs, tokens being quoted on up to 6 chains
+    """
+    tokens = []
+    for token_index in range(math.ceil(pair_count / len(SYNTHETIC_CHAINS))):
+        token_chains = SYNTHETIC_CHAINS[: min(len(SYNTHETIC_CHAINS), pair_count - token_index * len(SYNTHETIC_CHAINS))]
+        tokens.append(
+            {
+                "token_name": f"TOKEN{token_index}",
+                "token_addresses": {
+                    chain: f"0x{token_index:020x}{chain_index:020x}" for chain_index, chain in enumerate(token_chains)
+                },
+                "native_contract_abi": [
+                    {
+                        "name": "getExchangeRate",
+                        "outputs": [{"type": "uint256", "name": ""}],
+                        "inputs": [],
+                        "stateMutability": "view",
+                        "type": "function",
+                    }
+                ],
+                "get_exchange_rate_function_name": "getExchangeRate",
+            }
+        )
+    return {"tokens": tokens}
+
+
+def count_quotes(data_points: list) -> int:
+    """
+    Returns the number of secondary market data points of a cycle
+    """
+    return sum(1 for data_point in data_points if data_point and not data_point.is_primary_market)
+
+
+class RedirectTransport(httpx.BaseTransport):
+    """
+    Sends the requests to the real secondary market APIs to their stand-ins
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, redirects: dict[str, httpx.URL]):
+        self.transport = transport
+        self.redirects = redirects
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        redirect = self.redirects.get(request.url.host)
+        if redirect is not None:
+            request.url = request.url.copy_with(scheme=redirect.scheme, host=redirect.host, port=redirect.port)
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRedirectTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, redirects: dict[str, httpx.URL]):
+        self.transport = transport
+        self.redirects = redirects
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        redirect = self.redirects.get(request.url.host)
+        if redirect is not None:
+            request.url = request.url.copy_with(scheme=redirect.scheme, host=redirect.host, port=redirect.port)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def run_scenario(options: dict, urls: dict[str, str], config: dict, results_queue):
+    """
+    Runs the cycles of a scenario, meant to run in its own process so that its peak RSS is measured alone
+    """
+    os.environ["LOG_LEVEL"] = options["log_level"]
+    sys.path.insert(0, str(SRC_DIR))
+
+    import asyncio
+
+    from web3 import AsyncWeb3, Web3
+
+    import async_main
+    from data_storage.FakeDataSaver import FakeDataSaver
+    from main import main
+    from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+    from price_fetcher.AsyncCompositePriceFetcher import AsyncCompositePriceFetcher
+    from price_fetcher.AsyncOneInchPriceFetcher import AsyncOneInchPriceFetcher
+    from price_fetcher.AsyncParaswapPriceFetcher import AsyncParaswapPriceFetcher
+    from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+    from price_fetcher.CachedPrimaryMarketRateFetcher import CachedPrimaryMarketRateFetcher
+    from price_fetcher.CompositePriceFetcher import CompositePriceFetcher
+    from price_fetcher.HttpSessionConfig import HttpSessionConfig
+    from price_fetcher.OneInchPriceFetcher import OneInchPriceFetcher
+    from price_fetcher.ParaswapPriceFetcher import ParaswapPriceFetcher
+    from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketPriceFetcher, SecondaryMarketQuote
+
+    redirects = {httpx.URL(UPSTREAM_URLS[service]).host: httpx.URL(urls[service]) for service in UPSTREAM_URLS}
+    latencies: list[float] = []
+
+    class BenchmarkHttpSessionConfig(HttpSessionConfig):
+        def create_client(self, http_proxy, http2=True, headers=None) -> httpx.Client:
+            kwargs = self._client_kwargs(http_proxy, http2, headers)
+            transport = httpx.HTTPTransport(http2=http2, limits=kwargs["limits"])
+            return httpx.Client(**kwargs, transport=RedirectTransport(transport, redirects))
+
+        def create_async_client(self, http_proxy, http2=True, headers=None) -> httpx.AsyncClient:
+            kwargs = self._client_kwargs(http_proxy, http2, headers)
+            transport = httpx.AsyncHTTPTransport(http2=http2, limits=kwargs["limits"])
+            return httpx.AsyncClient(**kwargs, transport=AsyncRedirectTransport(transport, redirects))
+
+    class TimedPriceFetcher(SecondaryMarketPriceFetcher):
+        def __init__(self, price_fetcher: SecondaryMarketPriceFetcher):
+            self.price_fetcher = price_fetcher
+            self.name = price_fetcher.name
+
+        def get_amount_out(self, *args) -> int:
+            return self.price_fetcher.get_amount_out(*args)
+
+        def get_quote(self, *args) -> SecondaryMarketQuote:
+            started_at = time.perf_counter()
+            try:
+                return self.price_fetcher.get_quote(*args)
+            finally:
+                latencies.append(time.perf_counter() - started_at)
+
+        def close(self):
+            self.price_fetcher.close()
+
+    class AsyncTimedPriceFetcher(AsyncSecondaryMarketPriceFetcher):
+        def __init__(self, price_fetcher: AsyncSecondaryMarketPriceFetcher):
+            self.price_fetcher = price_fetcher
+            self.name = price_fetcher.name
+
+        async def get_amount_out(self, *args) -> int:
+            return await self.price_fetcher.get_amount_out(*args)
+
+        async def get_quote(self, *args) -> SecondaryMarketQuote:
+            started_at = time.perf_counter()
+            try:
+                return await self.price_fetcher.get_quote(*args)
+            finally:
+                latencies.append(time.perf_counter() - started_at)
+
+        async def close(self):
+            await self.price_fetcher.close()
+
+    http_session_config = BenchmarkHttpSessionConfig(
+        options["max_concurrency"], options["http_connect_timeout"], options["http_read_timeout"]
+    )
+    rate_limiters = {
+        secondary_market: AdaptiveRateLimiter(
+            options["rate_limit"],
+            options["max_concurrency"],
+            max_retries=options["max_retries"],
+            provider=secondary_market,
+        )
+        for secondary_market in options["secondary_market"]
+    }
+    primary_market_rate_fetcher = CachedPrimaryMarketRateFetcher()
+    data_saver = FakeDataSaver()
+    api_key = os.getenv("ONE_INCH_API_KEY", "")
+    cycle_times, quote_counts = [], []
+
+    if options["async_mode"]:
+        price_fetchers = [
+            AsyncParaswapPriceFetcher(None, rate_limiters[secondary_market], http_session_config)
+            if secondary_market == PARASWAP
+            else AsyncOneInchPriceFetcher(api_key, None, rate_limiters[secondary_market], http_session_config)
+            for secondary_market in options["secondary_market"]
+        ]
+        price_fetcher = AsyncTimedPriceFetcher(
+            price_fetchers[0] if len(price_fetchers) == 1 else AsyncCompositePriceFetcher(price_fetchers)
+        )
+
+        async def run_cycles():
+            web3_provider = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(urls[RPC], cache_allowed_requests=True))
+            try:
+                for cycle in range(options["cycles"] + 1):
+                    if cycle == 1:
+                        latencies.clear()
+                    started_at = time.perf_counter()
+                    data_points = await async_main.main(
+                        config,
+                        web3_provider,
+                        price_fetcher,
+                        data_saver,
+                        options["max_concurrency"],
+                        primary_market_rate_fetcher,
+                        options["cycle_timeout"],
+                    )
+                    if cycle:
+                        cycle_times.append(time.perf_counter() - started_at)
+                        quote_counts.append(count_quotes(data_points))
+            finally:
+                await price_fetcher.close()
+                await web3_provider.provider.disconnect()
+
+        asyncio.run(run_cycles())
+    else:
+        price_fetchers = [
+            ParaswapPriceFetcher(None, rate_limiters[secondary_market], http_session_config)
+            if secondary_market == PARASWAP
+            else OneInchPriceFetcher(api_key, None, rate_limiters[secondary_market], http_session_config)
+            for secondary_market in options["secondary_market"]
+        ]
+        price_fetcher = TimedPriceFetcher(
+            price_fetchers[0]
+            if len(price_fetchers) == 1
+            else CompositePriceFetcher(price_fetchers, max_workers=2 * len(price_fetchers) * options["max_concurrency"])
+        )
+        web3_provider = Web3(Web3.HTTPProvider(urls[RPC], cache_allowed_requests=True))
+        try:
+            for cycle in range(options["cycles"] + 1):
+                if cycle == 1:
+                    latencies.clear()
+                started_at = time.perf_counter()
+                data_points = main(
+                    config,
+                    web3_provider,
+                    price_fetcher,
+                    data_saver,
+                    options["max_concurrency"],
+                    primary_market_rate_fetcher,
+                    options["cycle_timeout"],
+                )
+                if cycle:
+                    cycle_times.append(time.perf_counter() - started_at)
+                    quote_counts.append(count_quotes(data_points))
+        finally:
+            price_fetcher.close()
+
+    pair_count = sum(len(token["token_addresses"]) for token in config["tokens"])
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    results_queue.put(
+        {
+            "pairs": pair_count,
+            "cycles": len(cycle_times),
+            "cycle_time_s": round(statistics.median(cycle_times), 4),
+            "throughput_quotes_per_s": round(sum(quote_counts) / sum(cycle_times), 1),
+            "failed_quotes_per_cycle": round(pair_count - statistics.mean(quote_counts), 1),
+            "quote_latency_p50_ms": round(quantiles[49] * 1000, 2) if quantiles else None,
+            "quote_latency_p99_ms": round(quantiles[98] * 1000, 2) if quantiles else None,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+    )
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=SRC_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict):
+    options = results["options"]
+    print(f"Commit {results['commit']}, {options['mode']} mode, {', '.join(options['secondary_market'])}")
+    print(
+        f"{'PAIRS':>6} {'CYCLE (s)':>10} {'QUOTES/s':>9} {'FAILED':>7} {'P50 (ms)':>9} {'P99 (ms)':>9} {'RSS (MB)':>9}"
+    )
+    for scenario in results["scenarios"]:
+        print(
+            f"{scenario['pairs']:>6} {scenario['cycle_time_s']:>10.3f} {scenario['throughput_quotes_per_s']:>9.1f} "
+            f"{scenario['failed_quotes_per_cycle']:>7.1f} {scenario['quote_latency_p50_ms'] or 0:>9.2f} "
+            f"{scenario['quote_latency_p99_ms'] or 0:>9.2f} {scenario['peak_rss_mb']:>9.1f}"
+        )
+
+
+def compare_results(results: dict, baseline: dict, max_regression: float) -> bool:
+    """
+    Prints the change of each metric from the baseline results, and returns whether none regressed by more than
+    `max_regression` percent
+    """
+    if baseline["options"] != results["options"]:
+        logging.warning("Baseline results were produced with other options, they may not be comparable")
+
+    print(f"\nChange from commit {baseline['commit']}:")
+    baseline_scenarios = {scenario["pairs"]: scenario for scenario in baseline["scenarios"]}
+    passed = True
+    for scenario in results["scenarios"]:
+        baseline_scenario = baseline_scenarios.get(scenario["pairs"])
+        if baseline_scenario is None:
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            if not baseline_scenario.get(metric) or scenario.get(metric) is None:
+                continue
+            change = (scenario[metric] / baseline_scenario[metric] - 1) * 100
+            regressed = change > max_regression
+            passed = passed and not regressed
+            changes.append(f"{metric} {change:+.1f}%{' REGRESSION' if regressed else ''}")
+        print(f"{scenario['pairs']:>6} pairs: {', '.join(changes)}")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--pairs",
+        help="Comma separated numbers of token / chain pairs of the scenarios",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[10, 100, 1000],
+    )
+    parser.add_argument("--cycles", help="Number of measured cycles per scenario", type=int, default=3)
+    parser.add_argument(
+        "-m",
+        "--secondary-market",
+        help="Comma separated secondary markets",
+        type=lambda value: [market.strip() for market in value.split(",")],
+        default=[PARASWAP],
+    )
+    parser.add_argument("-a", "--async-mode", help="benchmark the asyncio pipeline", action="store_true")
+    parser.add_argument("--max-concurrency", help="Maximum number of quotes in flight", type=int, default=32)
+    parser.add_argument(
+        "--rate-limit", help="Requests per second allowed per secondary market", type=float, default=1000
+    )
+    parser.add_argument("--max-retries", help="Maximum number of retries of a failed request", type=int, default=3)
+    parser.add_argument("--http-connect-timeout", help="HTTP connect timeout in seconds", type=float, default=5)
+    parser.add_argument("--http-read-timeout", help="HTTP read timeout in seconds", type=float, default=5)
+    parser.add_argument("--cycle-timeout", help="Time budget in seconds of a cycle", type=float)
+    parser.add_argument(
+        "--provider-latency",
+        help="Latency of the secondary markets (constant:<ms>, uniform:<min ms>:<max ms> or "
+        "lognormal:<median ms>:<sigma>)",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution.parse("lognormal:80:0.5"),
+    )
+    parser.add_argument(
+        "--rpc-latency", help="Latency of the JSON-RPC node", type=LatencyDistribution.parse, default="constant:5"
+    )
+    parser.add_argument("--error-rate", help="Fraction of secondary market 500 responses", type=float, default=0)
+    parser.add_argument("--throttle-rate", help="Fraction of secondary market 429 responses", type=float, default=0)
+    parser.add_argument(
+        "--slowloris-rate", help="Fraction of secondary market slow-loris responses", type=float, default=0
+    )
+    parser.add_argument(
+        "--slowloris-interval", help="Seconds between two bytes of a slow-loris response", type=float, default=1
+    )
+    parser.add_argument("--seed", help="Seed of the injected latencies and faults", type=int, default=0)
+    parser.add_argument("-c", "--config", help="Config to benchmark instead of synthetic ones (record and replay)")
+    parser.add_argument("--record", help="Record the responses of the real services to this cassette file")
+    parser.add_argument("--replay", help="Replay the responses recorded in this cassette file")
+    parser.add_argument(
+        "-w", "--web3-provider", help="JSON-RPC node recorded with --record", default=os.getenv("WEB3_PROVIDER")
+    )
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with the ones saved in this JSON file")
+    parser.add_argument(
+        "--max-regression",
+        help="Percentage by which a compared metric can grow before the benchmark fails",
+        type=float,
+        default=10,
+    )
+    parser.add_argument("--log-level", help="Log level of the price fetcher", default="WARNING")
+    args = parser.parse_args()
+    if (args.record or args.replay) and not args.config:
+        parser.error("--record and --replay need a --config")
+    if args.record and not args.web3_provider:
+        parser.error("--record needs a --web3-provider")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    provider_fault_profile = FaultProfile(
+        args.provider_latency, args.error_rate, args.throttle_rate, args.slowloris_rate, args.slowloris_interval
+    )
+    # Recorded responses are replayed at full speed unless latencies are given explicitly
+    if args.replay and "--provider-latency" not in sys.argv:
+        provider_fault_profile = FaultProfile(
+            LatencyDistribution("constant"), args.error_rate, args.throttle_rate, args.slowloris_rate
+        )
+    fault_profiles = {
+        PARASWAP: provider_fault_profile,
+        ONE_INCH: provider_fault_profile,
+        RPC: FaultProfile(LatencyDistribution("constant") if args.replay else args.rpc_latency),
+    }
+
+    options = {
+        "mode": "async" if args.async_mode else "sync",
+        "async_mode": args.async_mode,
+        "secondary_market": args.secondary_market,
+        "cycles": args.cycles,
+        "max_concurrency": args.max_concurrency,
+        "rate_limit": args.rate_limit,
+        "max_retries": args.max_retries,
+        "http_connect_timeout": args.http_connect_timeout,
+        "http_read_timeout": args.http_read_timeout,
+        "cycle_timeout": args.cycle_timeout,
+        "fault_profile": {service: repr(fault_profile) for service, fault_profile in fault_profiles.items()},
+        "seed": args.seed,
+        "config": args.config,
+        "cassette": args.replay,
+        "log_level": args.log_level,
+    }
+    if args.config:
+        with open(args.config) as f:
+            configs = [json.load(f)]
+    else:
+        configs = [get_synthetic_config(pair_count) for pair_count in args.pairs]
+
+    context = multiprocessing.get_context("spawn")
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "options": options,
+        "scenarios": [],
+    }
+    for config in configs:
+        # Fresh stand-ins per scenario so that every scenario sees the same random latencies and faults
+        urls_queue, results_queue, stop_event = context.Queue(), context.Queue(), context.Event()
+        server_process = context.Process(
+            target=serve_mock_providers,
+            args=(fault_profiles, args.seed, urls_queue, stop_event, args.record or args.replay, bool(args.record)),
+            kwargs={"rpc_upstream_url": args.web3_provider},
+        )
+        server_process.start()
+        try:
+            urls = urls_queue.get(timeout=30)
+            scenario_process = context.Process(target=run_scenario, args=(options, urls, config, results_queue))
+            scenario_process.start()
+            while True:
+                try:
+                    scenario = results_queue.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not scenario_process.is_alive():
+                        raise RuntimeError(f"Scenario process exited with code {scenario_process.exitcode}")
+            scenario_process.join()
+        finally:
+            stop_event.set()
+            server_process.join()
+        logging.info(f"{scenario['pairs']} pairs: {scenario['cycle_time_s']:.3f}s per cycle")
+        results["scenarios"].append(scenario)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare_results(results, baseline, args.max_regression):
+            sys.exit(1)
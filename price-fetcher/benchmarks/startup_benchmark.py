@@ -0,0 +1,175 @@
+"""
+Startup-time benchmark of the price fetcher CLI.
+
+Each command is run `--runs` times with `python -X importtime` against a local stand-in of the JSON-RPC node, and the
+median wall time and total import time are reported. The benchmark fails when the import time of a command exceeds its
+budget, or when a command imports a module it does not need (e.g. SQLAlchemy in dry-run mode).
+"""
+
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import NamedTuple
+
+from mock_providers import ONE_INCH, PARASWAP, RPC, FaultProfile, serve_mock_providers
+
+MAIN_PATH = Path(__file__).resolve().parents[1] / "src" / "main.py"
+
+
+class StartupCommand(NamedTuple):
+    name: str
+    args: list[str]
+    # Default budget of the total import time, in milliseconds
+    import_budget_ms: float
+    # Top-level modules the command must not import
+    forbidden_modules: tuple[str, ...]
+
+
+def get_commands(config_file: str, circuit_breaker_file: str, rpc_url: str) -> list[StartupCommand]:
+    return [
+        StartupCommand("help", ["--help"], 500, ("web3", "sqlalchemy", "schedule", "httpx")),
+        StartupCommand(
+            "circuit-breakers",
+            ["-c", config_file, "--circuit-breaker-file", circuit_breaker_file, "circuit-breakers"],
+            500,
+            ("web3", "sqlalchemy", "schedule", "httpx"),
+        ),
+        StartupCommand(
+            "one-off dry run", ["-c", config_file, "-w", rpc_url, "-d"], 2000, ("web3", "sqlalchemy", "schedule")
+        ),
+        StartupCommand(
+            "one-off async dry run", ["-c", config_file, "-w", rpc_url, "-d", "-a"], 3500, ("sqlalchemy", "schedule")
+        ),
+    ]
+
+
+def get_config() -> dict:
+    """
+    Returns a config whose tokens are not quoted on secondary markets, so that runs only call the JSON-RPC stand-in
+    """
+    return {
+        "tokens": [
+            {
+                "token_name": f"TOKEN{i}",
+                "token_addresses": {"ethereum": f"0x{i:040x}"},
+                "quoted_chains": [],
+                "native_contract_abi": [
+                    {
+                        "name": "getExchangeRate",
+                        "outputs": [{"type": "uint256", "name": ""}],
+                        "inputs": [],
+                        "stateMutability": "view",
+                        "type": "function",
+                    }
+                ],
+                "get_exchange_rate_function_name": "getExchangeRate",
+            }
+            for i in range(1, 4)
+        ]
+    }
+
+
+def parse_import_times(stderr: str) -> tuple[float, set[str]]:
+    """
+    Returns the total import time in milliseconds and the top-level packages imported, from `-X importtime` output
+    """
+    total_us, modules = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        modules.add(name.strip().split(".")[0])
+        # Modules imported by other modules are indented and counted in the cumulative time of their importer
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def run_command(command: StartupCommand, runs: int, main_path: Path = MAIN_PATH) -> dict:
+    wall_times, import_times, modules = [], [], set()
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", str(main_path), *command.args],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "LOG_LEVEL": "WARNING", "DRY_RUN": "", "LONG_RUN": ""},
+        )
+        wall_times.append(time.perf_counter() - started_at)
+        if result.returncode != 0:
+            raise RuntimeError(f"{command.name} exited with code {result.returncode}: {result.stderr[-2000:]}")
+        import_time, run_modules = parse_import_times(result.stderr)
+        import_times.append(import_time)
+        modules |= run_modules
+
+    return {
+        "command": command.name,
+        "wall_time_ms": round(statistics.median(wall_times) * 1000, 1),
+        "import_time_ms": round(statistics.median(import_times), 1),
+        "forbidden_imports": sorted(modules & set(command.forbidden_modules)),
+    }
+
+
+def parse_budget(value: str) -> tuple[str, float]:
+    name, budget = value.rsplit("=", 1)
+    return name, float(budget)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", help="Number of runs per command", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        help="Import time budget in milliseconds of a command, e.g. 'one-off dry run=2000' (can be repeated)",
+        type=parse_budget,
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--main", help="main.py to benchmark, e.g. in a worktree of another commit", type=Path, default=MAIN_PATH
+    )
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    args = parser.parse_args()
+    budgets = dict(args.budget)
+
+    context = multiprocessing.get_context("spawn")
+    urls_queue, stop_event = context.Queue(), context.Event()
+    fault_profiles = {service: FaultProfile() for service in (PARASWAP, ONE_INCH, RPC)}
+    server_process = context.Process(target=serve_mock_providers, args=(fault_profiles, 0, urls_queue, stop_event))
+    server_process.start()
+    try:
+        urls = urls_queue.get(timeout=30)
+        with tempfile.TemporaryDirectory() as directory:
+            config_file = os.path.join(directory, "config.json")
+            with open(config_file, "w") as f:
+                json.dump(get_config(), f)
+            commands = get_commands(config_file, os.path.join(directory, "circuit-breakers.json"), urls[RPC])
+            results = [run_command(command, args.runs, args.main) for command in commands]
+    finally:
+        stop_event.set()
+        server_process.join()
+
+    passed = True
+    print(f"{'COMMAND':<24} {'WALL (ms)':>10} {'IMPORTS (ms)':>13} {'BUDGET (ms)':>12}  FORBIDDEN IMPORTS")
+    for command, result in zip(commands, results):
+        budget = budgets.get(command.name, command.import_budget_ms)
+        result["import_budget_ms"] = budget
+        failed = result["import_time_ms"] > budget or result["forbidden_imports"]
+        passed = passed and not failed
+        print(
+            f"{command.name:<24} {result['wall_time_ms']:>10.1f} {result['import_time_ms']:>13.1f} {budget:>12.0f}  "
+            f"{', '.join(result['forbidden_imports']) or '-'}{'  FAILED' if failed else ''}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not passed:
+        sys.exit(1)
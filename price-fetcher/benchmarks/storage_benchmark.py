@@ -0,0 +1,267 @@
+"""
+Storage benchmark of the prices hypertable: history query latency and disk footprint before and after compression and
+retention.
+
+The benchmark needs a dedicated, empty TimescaleDB database initialized with `database/init.sql`: it fills the prices
+table with `--days` days of synthetic prices, refreshes the continuous aggregates, then measures the queries of the API
+and the size of the tables
+- with every chunk uncompressed
+- after running the compression policy of the prices table
+- after running the retention policies
+Background jobs are paused while the benchmark runs, and the synthetic data is left in the database.
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection
+
+NETWORKS = ["ethereum", "arbitrum"]
+
+# Time window of each time bucket, as served by the API
+TIME_WINDOWS = {
+    "5 minutes": "1 day",
+    "1 hour": "1 week",
+    "1 day": "6 months",
+    "1 week": "1 year",
+    "1 month": "5 years",
+}
+VIEWS = {
+    "5 minutes": "prices_5_minutes",
+    "1 hour": "prices_1_hour",
+    "1 day": "prices_1_day",
+    "1 week": "prices_1_week",
+    "1 month": "prices_1_month",
+}
+
+INSERT_DAY_SQL = text("""
+    INSERT INTO prices (timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)
+    SELECT ts,
+           token_name,
+           round((1.05 + 0.05 * sin(extract(epoch FROM ts) / 86400 + token_index) + random() * 0.001)::numeric, 18),
+           NULL,
+           network,
+           is_primary_market,
+           CASE WHEN is_primary_market THEN 0 ELSE round(((random() - 0.5) * 0.01)::numeric, 5) END,
+           CASE WHEN is_primary_market THEN NULL ELSE 'paraswap' END
+    FROM (SELECT date_trunc('day', now()) - make_interval(days => :days_ago) AS day_start) day,
+         generate_series(
+             day_start, day_start + INTERVAL '1 day' - CAST(:interval AS interval), CAST(:interval AS interval)
+         ) ts,
+         generate_series(1, :tokens) token_index,
+         LATERAL (SELECT 'TOKEN' || token_index AS token_name) token,
+         unnest(CAST(:networks AS text[])) network,
+         unnest(ARRAY[true, false]) is_primary_market
+    WHERE ts <= now()
+    ON CONFLICT DO NOTHING
+""")
+
+HISTORY_SQL = """
+    SELECT bucket, avg_price_eth, round(avg_premium*100, 3)
+    FROM {view}
+    WHERE bucket > now() - INTERVAL '{time_window}' - INTERVAL '{time_bucket}'
+      AND token_name = :token_name AND network = :network AND is_primary_market = :is_primary_market
+    ORDER BY bucket DESC
+"""
+
+RAW_HISTORY_SQL = """
+    SELECT time_bucket(INTERVAL '{time_bucket}', timestamp) AS bucket, avg(price_eth), round(avg(premium)*100, 3)
+    FROM prices
+    WHERE timestamp > now() - INTERVAL '{time_window}' - INTERVAL '{time_bucket}'
+      AND token_name = :token_name AND network = :network AND is_primary_market = :is_primary_market
+    GROUP BY bucket
+    ORDER BY bucket DESC
+"""
+
+LAST_PRICE_SQL = """
+    SELECT last(timestamp, timestamp), last(price_eth, timestamp), last(premium, timestamp)*100
+    FROM prices
+    WHERE token_name = :token_name AND network = :network AND is_primary_market = :is_primary_market
+"""
+
+LAST_PRICES_SQL = """
+    SELECT DISTINCT ON (token_name, network, is_primary_market) timestamp, token_name, network, price_eth
+    FROM prices
+    WHERE timestamp > now() - interval '7 days'
+    ORDER BY token_name, network, is_primary_market, timestamp DESC
+"""
+
+
+def get_queries() -> dict[str, tuple[str, bool]]:
+    """
+    Returns the benchmarked queries by name, and whether they filter on a token / chain pair
+    """
+    queries = {"last price": (LAST_PRICE_SQL, True), "last prices": (LAST_PRICES_SQL, False)}
+    for time_bucket, time_window in TIME_WINDOWS.items():
+        parameters = {"view": VIEWS[time_bucket], "time_bucket": time_bucket, "time_window": time_window}
+        queries[f"history {time_bucket}"] = (HISTORY_SQL.format(**parameters), True)
+        queries[f"raw history {time_bucket}"] = (RAW_HISTORY_SQL.format(**parameters), True)
+    return queries
+
+
+def fill_prices(connection: Connection, days: int, interval: str, tokens: int):
+    row_count = 0
+    for day in range(days, -1, -1):
+        result = connection.execute(
+            INSERT_DAY_SQL,
+            {
+                "days_ago": day,
+                "interval": interval,
+                "tokens": tokens,
+                "networks": NETWORKS,
+            },
+        )
+        row_count += result.rowcount
+        print(f"\rInserted {row_count} rows ({days - day + 1}/{days + 1} days)", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+
+def get_footprint(connection: Connection) -> dict:
+    prices_size, chunk_count, compressed_chunk_count = connection.execute(
+        text("""
+            SELECT hypertable_size('prices'),
+                   count(*),
+                   count(*) FILTER (WHERE is_compressed)
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = 'prices'
+        """)
+    ).one()
+    aggregates_size = connection.execute(
+        text("""
+            SELECT coalesce(sum(hypertable_size(
+                format('%I.%I', materialization_hypertable_schema, materialization_hypertable_name)::regclass
+            )), 0)
+            FROM timescaledb_information.continuous_aggregates
+        """)
+    ).scalar_one()
+    return {
+        "prices_bytes": prices_size,
+        "aggregates_bytes": int(aggregates_size),
+        "chunks": chunk_count,
+        "compressed_chunks": compressed_chunk_count,
+        "rows": connection.execute(text("SELECT count(*) FROM prices")).scalar_one(),
+    }
+
+
+def measure_queries(connection: Connection, runs: int, tokens: int) -> dict[str, dict]:
+    """
+    Returns the median latency in milliseconds and the number of rows of each query, run `runs` times over pairs
+    """
+    results = {}
+    for name, (sql, per_pair) in get_queries().items():
+        latencies, row_counts = [], []
+        for run in range(runs):
+            parameters = {}
+            if per_pair:
+                parameters = {
+                    "token_name": f"TOKEN{run % tokens + 1}",
+                    "network": NETWORKS[run % len(NETWORKS)],
+                    "is_primary_market": run % 2 == 0,
+                }
+            started_at = time.perf_counter()
+            row_counts.append(len(connection.execute(text(sql), parameters).fetchall()))
+            latencies.append((time.perf_counter() - started_at) * 1000)
+        results[name] = {"median_ms": statistics.median(latencies), "rows": max(row_counts)}
+    return results
+
+
+def run_jobs(connection: Connection, proc_name: str, hypertable_name: Optional[str] = None):
+    sql = "SELECT job_id FROM timescaledb_information.jobs WHERE proc_name = :proc_name"
+    if hypertable_name:
+        sql += " AND hypertable_name = :hypertable_name"
+    for job_id in connection.execute(text(sql), {"proc_name": proc_name, "hypertable_name": hypertable_name}).scalars():
+        started_at = time.perf_counter()
+        connection.execute(text("CALL run_job(:job_id)"), {"job_id": job_id})
+        print(f"Ran {proc_name} job {job_id} in {time.perf_counter() - started_at:.1f}s", file=sys.stderr)
+
+
+def set_jobs_scheduled(connection: Connection, scheduled: bool):
+    connection.execute(
+        # Jobs from 1000 on are policies and user-defined jobs, lower ids are internal jobs of TimescaleDB
+        text(
+            "SELECT alter_job(job_id, scheduled => :scheduled) FROM timescaledb_information.jobs WHERE job_id >= 1000"
+        ),
+        {"scheduled": scheduled},
+    )
+
+
+def format_size(size: int) -> str:
+    return f"{size / 2**20:.1f} MiB"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--database-url",
+        help="URL of a dedicated, empty database initialized with database/init.sql",
+        default=os.getenv("DATABASE_URL"),
+    )
+    parser.add_argument("--days", help="Number of days of synthetic prices", type=int, default=400)
+    parser.add_argument("--interval", help="Interval between two prices of a pair", default="5 minutes")
+    parser.add_argument("--tokens", help="Number of tokens, quoted on 2 chains and 2 markets", type=int, default=10)
+    parser.add_argument("--runs", help="Number of runs per query", type=int, default=20)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    # Continuous aggregates are refreshed and jobs are run outside of transactions
+    engine = create_engine(args.database_url, isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        if connection.execute(text("SELECT EXISTS (SELECT 1 FROM prices)")).scalar_one():
+            sys.exit("The prices table is not empty, run the benchmark on a dedicated database")
+
+        set_jobs_scheduled(connection, False)
+        try:
+            fill_prices(connection, args.days, args.interval, args.tokens)
+            for view in VIEWS.values():
+                connection.execute(text(f"CALL refresh_continuous_aggregate('{view}', NULL, NULL)"))
+            connection.execute(text("ANALYZE prices"))
+
+            phases = {}
+            phases["uncompressed"] = {
+                "footprint": get_footprint(connection),
+                "queries": measure_queries(connection, args.runs, args.tokens),
+            }
+            run_jobs(connection, "policy_compression", "prices")
+            connection.execute(text("ANALYZE prices"))
+            phases["compressed"] = {
+                "footprint": get_footprint(connection),
+                "queries": measure_queries(connection, args.runs, args.tokens),
+            }
+            run_jobs(connection, "policy_retention")
+            phases["after retention"] = {
+                "footprint": get_footprint(connection),
+                "queries": measure_queries(connection, args.runs, args.tokens),
+            }
+        finally:
+            set_jobs_scheduled(connection, True)
+
+    print(f"{'PHASE':<16} {'ROWS':>10} {'CHUNKS':>12} {'PRICES':>12} {'AGGREGATES':>12}")
+    for phase, result in phases.items():
+        footprint = result["footprint"]
+        print(
+            f"{phase:<16} {footprint['rows']:>10} "
+            f"{footprint['compressed_chunks']:>5}/{footprint['chunks']:<6} "
+            f"{format_size(footprint['prices_bytes']):>12} {format_size(footprint['aggregates_bytes']):>12}"
+        )
+    print()
+    print(f"{'QUERY (median ms / rows)':<26}" + "".join(f"{phase:>20}" for phase in phases))
+    for name in get_queries():
+        print(
+            f"{name:<26}"
+            + "".join(
+                f"{result['queries'][name]['median_ms']:>12.1f} / {result['queries'][name]['rows']:<5}"
+                for result in phases.values()
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(phases, f, indent=2)
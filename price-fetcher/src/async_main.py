@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Optional
+
+from web3 import AsyncWeb3
+
+from data_storage.DataSaver import DataPoint, DataSaver
+from depth_ladder import DepthLadder, DepthRung
+from metrics import record_error, scheduler_lag_seconds
+from price_fetcher.AdaptiveRateLimiter import retry_deadline
+from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
+from price_fetcher.SecondaryMarketPriceFetcher import (
+    CannotGetPriceException,
+    CircuitOpenException,
+    UnsupportedChainException,
+    UnsupportedTokenException,
+)
+from price_recorder import (
+    get_primary_market_data_point,
+    get_secondary_market_data_point,
+    log_cycle_duration,
+    save_data_points,
+    save_depth_points,
+)
+from utils import OverlapPolicy, chains, filter_config, get_quoted_chains, has_primary_market
+
+
+async def main(
+    config: dict,
+    web3_provider: AsyncWeb3,
+    price_fetcher: AsyncSecondaryMarketPriceFetcher,
+    data_saver: DataSaver,
+    max_concurrency: int,
+    primary_market_rate_fetcher: MulticallPrimaryMarketRateFetcher,
+    cycle_timeout: Optional[float] = None,
+    depth_ladder: Optional[DepthLadder] = None,
+    pair_filter: Optional[Callable[[str, str], bool]] = None,
+    primary_market_filter: Optional[Callable[[str], bool]] = None,
+) -> list[Optional[DataPoint]]:
+    """
+    Asyncio counterpart of main.main: primary market rates are read in a single Multicall3 call and every secondary
+    market quote of the cycle is fetched concurrently on the event loop. Quotes still in flight after `cycle_timeout`
+    seconds are cancelled. Data points of the cycle are saved in a single batch from a worker thread so the database
+    never blocks the loop, and returned
+    """
+    now = datetime.datetime.now()
+    started_at = time.monotonic()
+    # Throttled quotes are only retried within the cycle time budget
+    retry_deadline.set(None if cycle_timeout is None else started_at + cycle_timeout)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    chain = "ethereum"
+    config = filter_config(config, pair_filter, primary_market_filter)
+
+    primary_market_tokens = [token for token in config["tokens"] if has_primary_market(token)]
+    try:
+        block_number, primary_market_results = await primary_market_rate_fetcher.get_exchange_rates_async(
+            web3_provider, primary_market_tokens
+        )
+        logging.debug(f"Read {len(primary_market_tokens)} primary market rates at block {block_number}")
+    except Exception as e:
+        primary_market_results = {token["token_name"]: e for token in primary_market_tokens}
+
+    primary_market_prices = {}
+    data_points = []
+    for token in primary_market_tokens:
+        result = primary_market_results[token["token_name"]]
+        if isinstance(result, Exception):
+            logging.warning(f"Failed to get primary market rate for {token['token_name']} on {chain}: {str(result)}")
+            record_error(result)
+            continue
+        primary_market_prices[token["token_name"]] = result
+        if token.get("record_primary_market", True):
+            data_points.append(get_primary_market_data_point(now, token["token_name"], chain, result))
+
+    async def fetch_and_record_quote(token: dict, quote_chain: str, token_address: str):
+        token_name = token["token_name"]
+        async with semaphore:
+            try:
+                quote = await price_fetcher.get_quote(
+                    chains[quote_chain]["chain_id"],
+                    token_address,
+                    chains[quote_chain]["eth_token_address"],
+                )
+            except CircuitOpenException as e:
+                logging.debug(f"Skipped {token_name} on {quote_chain}: {str(e)}")
+                return
+            except (
+                UnsupportedChainException,
+                UnsupportedTokenException,
+                CannotGetPriceException,
+            ) as e:
+                logging.warning(f"Failed to get price for {token_name} on {quote_chain}: {str(e)}")
+                record_error(e)
+                return
+            except Exception as e:
+                # A bad response must not lose the data points already collected in the cycle
+                logging.error(
+                    f"Unexpected error getting price for {token_name} on {quote_chain}: {type(e).__name__}: {e}"
+                )
+                record_error(e)
+                return
+
+        data_points.append(
+            get_secondary_market_data_point(
+                now, token_name, quote_chain, quote.price, primary_market_prices[token_name], quote.source
+            )
+        )
+
+    depth_quotes = {}
+
+    async def fetch_depth_quote(rung: DepthRung):
+        async with semaphore:
+            try:
+                depth_quotes[rung] = await price_fetcher.get_amount_out_quote(
+                    chains[rung.chain]["chain_id"],
+                    rung.src_token_address,
+                    rung.dst_token_address,
+                    rung.amount,
+                )
+            except (
+                UnsupportedChainException,
+                UnsupportedTokenException,
+                CannotGetPriceException,
+            ) as e:
+                logging.debug(f"Failed to get {rung.size_eth} ETH depth for {rung.token_name} on {rung.chain}: {e}")
+                record_error(e)
+            except Exception as e:
+                logging.error(
+                    f"Unexpected error getting {rung.size_eth} ETH depth for {rung.token_name} on {rung.chain}: "
+                    f"{type(e).__name__}: {e}"
+                )
+                record_error(e)
+
+    quote_tasks = [
+        asyncio.create_task(fetch_and_record_quote(token, quote_chain, token["token_addresses"][quote_chain]))
+        for token in config["tokens"]
+        if token["token_name"] in primary_market_prices
+        for quote_chain in get_quoted_chains(token)
+    ]
+    # Depth ladder quotes wait for the semaphore after the 1 token quotes
+    depth_rungs = (
+        [
+            rung
+            for token in config["tokens"]
+            if token["token_name"] in primary_market_prices
+            for quote_chain in get_quoted_chains(token)
+            for rung in depth_ladder.get_rungs(
+                token["token_name"],
+                quote_chain,
+                token["token_addresses"][quote_chain],
+                chains[quote_chain]["eth_token_address"],
+                primary_market_prices[token["token_name"]],
+            )
+        ]
+        if depth_ladder
+        else []
+    )
+    quote_tasks += [asyncio.create_task(fetch_depth_quote(rung)) for rung in depth_rungs]
+    if quote_tasks:
+        timeout = None if cycle_timeout is None else max(0.0, started_at + cycle_timeout - time.monotonic())
+        done, stragglers = await asyncio.wait(quote_tasks, timeout=timeout)
+        if stragglers:
+            logging.warning(f"Cycle time budget of {cycle_timeout}s exceeded, cancelled {len(stragglers)} quotes")
+            for task in stragglers:
+                task.cancel()
+            await asyncio.gather(*stragglers, return_exceptions=True)
+        for task in done:
+            # Quote tasks catch their errors, an exception here would be a bug in recording the quote
+            if task.exception() is not None:
+                logging.error(f"Unexpected error recording a quote: {task.exception()!r}")
+                record_error(task.exception())
+
+    await asyncio.to_thread(save_data_points, data_saver, data_points)
+    if depth_ladder:
+        depth_points = depth_ladder.get_depth_points(now, depth_rungs, depth_quotes)
+        await asyncio.to_thread(save_depth_points, data_saver, depth_points)
+    log_cycle_duration(now, started_at, data_points)
+    return data_points
+
+
+async def run_periodically(
+    job: Callable[[], Awaitable[None]],
+    interval_minutes: int,
+    overlap_policy: OverlapPolicy = OverlapPolicy.COALESCE,
+    max_concurrent_runs: int = 1,
+):
+    """
+    Runs a job every `interval_minutes` minutes at the start of a minute, until cancelled.
+    A run due while previous ones are still in progress follows the overlap policy (see cycle_runner.CycleRunner).
+
+    Args:
+        job (Callable[[], Awaitable[None]]): coroutine function to run
+        interval_minutes (int): number of minutes between two runs
+        overlap_policy (OverlapPolicy): what to do when a run is due while previous ones are still in progress
+        max_concurrent_runs (int): maximum number of runs in progress at the same time with the allow policy
+    """
+    max_running_jobs = max_concurrent_runs if overlap_policy == OverlapPolicy.ALLOW else 1
+    running_jobs = set()
+    # Time at which the first run coalesced into the next one was due
+    coalesced_due_at = None
+
+    async def run_job(due_at: float):
+        nonlocal coalesced_due_at
+        while True:
+            scheduler_lag_seconds.observe(time.time() - due_at)
+            try:
+                await job()
+            except Exception as e:
+                logging.error(f"An unexpected error occurred while running the job: {str(e)}")
+            if coalesced_due_at is None:
+                return
+            due_at, coalesced_due_at = coalesced_due_at, None
+
+    next_run = math.floor((time.time() + interval_minutes * 60) / 60) * 60
+    try:
+        while True:
+            await asyncio.sleep(max(0.0, next_run - time.time()))
+            due_at = next_run
+            next_run += interval_minutes * 60
+            if len(running_jobs) < max_running_jobs:
+                task = asyncio.create_task(run_job(due_at))
+                running_jobs.add(task)
+                task.add_done_callback(running_jobs.discard)
+            elif overlap_policy == OverlapPolicy.COALESCE:
+                if coalesced_due_at is None:
+                    logging.warning("Previous cycle still in progress, next cycle will start when it completes")
+                    coalesced_due_at = due_at
+            else:
+                logging.warning(f"Skipping cycle, {len(running_jobs)} cycle(s) still in progress")
+    finally:
+        coalesced_due_at = None
+        if running_jobs:
+            await asyncio.gather(*running_jobs, return_exceptions=True)
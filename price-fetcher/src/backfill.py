@@ -0,0 +1,273 @@
+import asyncio
+import bisect
+import datetime
+import json
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from web3 import AsyncWeb3, Web3
+
+from data_storage.DataSaver import DataPoint, DataSaver
+from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
+
+
+class Backfiller:
+    """
+    Fills the history of the primary market prices of tokens by reading their rates at past blocks.
+
+    The timestamps of the time range, every `step` minutes, are processed in chunks of `chunk_size` timestamps:
+    1. each timestamp is mapped to the last block mined at or before it, with interpolation searches on block
+       timestamps (falling back to binary searches when they converge slowly) run for every timestamp of the chunk at
+       once
+    2. the rates of all the tokens are read at each of these blocks with one Multicall3 eth_call per block
+    3. the data points of the chunk are saved in a single batch, then the checkpoint file records the chunk as done
+
+    JSON-RPC requests are sent in batches of `batch_size` requests, up to `max_concurrency` batches at a time, and
+    failed batches are retried. A backfill that was interrupted resumes after its last saved chunk when it is run again
+    with the same tokens, start and step.
+    """
+
+    def __init__(
+        self,
+        web3_provider: AsyncWeb3,
+        primary_market_rate_fetcher: MulticallPrimaryMarketRateFetcher,
+        data_saver: DataSaver,
+        checkpoint_file: str,
+        batch_size: int = 100,
+        max_concurrency: int = 8,
+        chunk_size: int = 2000,
+        max_attempts: int = 5,
+    ):
+        self.web3_provider = web3_provider
+        self.primary_market_rate_fetcher = primary_market_rate_fetcher
+        self.data_saver = data_saver
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+
+        # Timestamps of the blocks fetched so far, sorted by block number
+        self._block_timestamps: dict[int, int] = {}
+        self._known_blocks: list[int] = []
+        self._known_timestamps: list[int] = []
+
+    async def _run_batches(self, items: list, run_batch: Callable[[list], Awaitable[list]]) -> list:
+        """
+        Runs a batched request per `batch_size` items, at most `max_concurrency` at a time, and returns the results in
+        the order of the items
+
+        Raises:
+            Exception: if a batch still fails after `max_attempts` attempts
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: list) -> list:
+            async with semaphore:
+                for attempt in range(1, self.max_attempts + 1):
+                    try:
+                        return await run_batch(batch)
+                    except Exception as e:
+                        if attempt == self.max_attempts:
+                            raise
+                        logging.warning(f"Batch of {len(batch)} requests failed (attempt {attempt}): {str(e)}")
+                        await asyncio.sleep(2**attempt)
+
+        results = await asyncio.gather(
+            *(run(items[i : i + self.batch_size]) for i in range(0, len(items), self.batch_size))
+        )
+        return [result for batch_results in results for result in batch_results]
+
+    async def _get_blocks(self, block_identifiers: list[int | str]) -> list[dict]:
+        async with self.web3_provider.batch_requests() as batch:
+            for block_identifier in block_identifiers:
+                batch.add(self.web3_provider.eth.get_block(block_identifier))
+            return await batch.async_execute()
+
+    def _add_block_timestamps(self, blocks: list[dict]):
+        for block in blocks:
+            self._block_timestamps[block["number"]] = block["timestamp"]
+        self._known_blocks = sorted(self._block_timestamps)
+        self._known_timestamps = [self._block_timestamps[block_number] for block_number in self._known_blocks]
+
+    def _forget_blocks_before(self, block_number: int):
+        """
+        Forgets the timestamps of the blocks before a given block, except the genesis block
+        """
+        self._block_timestamps = {
+            known_block_number: timestamp
+            for known_block_number, timestamp in self._block_timestamps.items()
+            if known_block_number >= block_number or known_block_number == 0
+        }
+        self._add_block_timestamps([])
+
+    async def get_blocks_at(self, timestamps: list[int]) -> list[Optional[int]]:
+        """
+        Returns the number of the last block mined at or before each of the given timestamps, None for timestamps
+        before the genesis block. The timestamps of the genesis and latest blocks must be known.
+
+        Args:
+            timestamps (list[int]): unix timestamps
+        """
+        blocks_at: dict[int, Optional[int]] = {}
+        # Width of the search interval of each timestamp at the previous round
+        previous_widths: dict[int, int] = {}
+        while True:
+            block_numbers_to_fetch = set()
+            for timestamp in timestamps:
+                if timestamp in blocks_at:
+                    continue
+
+                i = bisect.bisect_right(self._known_timestamps, timestamp)
+                if i == 0:
+                    blocks_at[timestamp] = None
+                    continue
+                if i == len(self._known_blocks):
+                    blocks_at[timestamp] = self._known_blocks[-1]
+                    continue
+
+                low, high = self._known_blocks[i - 1], self._known_blocks[i]
+                if high - low <= 1:
+                    blocks_at[timestamp] = low
+                    continue
+
+                # Block times are nearly constant so interpolation usually finds the block right away, along with the
+                # next one to bound it
+                width = high - low
+                if 2 * width > previous_widths.get(timestamp, math.inf):
+                    guess = (low + high) // 2
+                else:
+                    low_timestamp, high_timestamp = self._known_timestamps[i - 1], self._known_timestamps[i]
+                    guess = low + (timestamp - low_timestamp) * width // (high_timestamp - low_timestamp)
+                previous_widths[timestamp] = width
+                guess = min(max(guess, low + 1), high - 1)
+                block_numbers_to_fetch.add(guess)
+                if guess + 1 < high:
+                    block_numbers_to_fetch.add(guess + 1)
+
+            if not block_numbers_to_fetch:
+                return [blocks_at[timestamp] for timestamp in timestamps]
+            self._add_block_timestamps(await self._run_batches(sorted(block_numbers_to_fetch), self._get_blocks))
+
+    def _load_checkpoint(self, checkpoint: dict) -> Optional[int]:
+        """
+        Returns the last timestamp saved by a previous run of the same backfill, None if there is none
+
+        Raises:
+            ValueError: if the checkpoint file belongs to another backfill
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return None
+
+        with open(self.checkpoint_file) as f:
+            saved_checkpoint = json.load(f)
+        if {key: saved_checkpoint.get(key) for key in checkpoint} != checkpoint:
+            raise ValueError(
+                f"Checkpoint file {self.checkpoint_file} belongs to another backfill "
+                f"({json.dumps(saved_checkpoint)}), remove it or use another checkpoint file"
+            )
+        return saved_checkpoint["done_until"]
+
+    def _save_checkpoint(self, checkpoint: dict, done_until: int):
+        temporary_file = f"{self.checkpoint_file}.tmp"
+        with open(temporary_file, "w") as f:
+            json.dump({**checkpoint, "done_until": done_until}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_file, self.checkpoint_file)
+
+    async def run(
+        self,
+        tokens: list[dict],
+        start: datetime.datetime,
+        end: Optional[datetime.datetime],
+        step: int,
+    ):
+        """
+        Backfills the primary market prices of the given tokens
+
+        Args:
+            tokens (list[dict]): token configs
+            start (datetime): start of the time range
+            end (Optional[datetime]): end of the time range, defaults to the latest block
+            step (int): number of minutes between two data points
+
+        Raises:
+            ValueError: if the checkpoint file belongs to another backfill
+            Exception: if a batched request or the data saver fails, the backfill can be resumed
+        """
+        step_seconds = step * 60
+        genesis_block, latest_block = await self._get_blocks([0, "latest"])
+        self._add_block_timestamps([genesis_block, latest_block])
+
+        checkpoint = {
+            "tokens": [token["token_name"] for token in tokens],
+            "start": math.ceil(start.timestamp() / step_seconds) * step_seconds,
+            "step": step,
+        }
+        done_until = self._load_checkpoint(checkpoint)
+        first_timestamp = checkpoint["start"] if done_until is None else done_until + step_seconds
+        last_timestamp = min(int(end.timestamp()) if end else math.inf, latest_block["timestamp"])
+        timestamps = range(first_timestamp, last_timestamp + 1, step_seconds)
+        if done_until is not None:
+            logging.info(f"Resuming backfill after {datetime.datetime.fromtimestamp(done_until).isoformat()}")
+        logging.info(
+            f"Backfilling {len(timestamps)} timestamps of {len(tokens)} tokens up to block {latest_block['number']}"
+        )
+
+        started_at = time.monotonic()
+        for i in range(0, len(timestamps), self.chunk_size):
+            chunk = list(timestamps[i : i + self.chunk_size])
+            block_numbers = await self.get_blocks_at(chunk)
+
+            unique_block_numbers = sorted({block_number for block_number in block_numbers if block_number is not None})
+            results = await self._run_batches(
+                unique_block_numbers,
+                lambda batch: self.primary_market_rate_fetcher.get_exchange_rates_at_blocks_async(
+                    self.web3_provider, tokens, batch
+                ),
+            )
+            rates_at_blocks = dict(zip(unique_block_numbers, results))
+
+            data_points, failed_rates = [], 0
+            for timestamp, block_number in zip(chunk, block_numbers):
+                if block_number is None:
+                    continue
+                result = rates_at_blocks[block_number]
+                if isinstance(result, Exception):
+                    failed_rates += len(tokens)
+                    continue
+                for token in tokens:
+                    rate = result[1][token["token_name"]]
+                    if isinstance(rate, Exception):
+                        # e.g. blocks before the deployment of the token contract
+                        failed_rates += 1
+                        continue
+                    data_points.append(
+                        DataPoint(
+                            timestamp=datetime.datetime.fromtimestamp(timestamp),
+                            token_name=token["token_name"],
+                            price_eth=Web3.from_wei(rate, "ether"),
+                            price_usd=None,
+                            network="ethereum",
+                            is_primary_market=True,
+                            premium=0,
+                        )
+                    )
+
+            await asyncio.to_thread(self.data_saver.save_data_points, data_points)
+            self._save_checkpoint(checkpoint, chunk[-1])
+            self._forget_blocks_before(max(unique_block_numbers, default=0))
+
+            done = i + len(chunk)
+            logging.info(
+                f"Backfilled {done}/{len(timestamps)} timestamps up to {datetime.datetime.fromtimestamp(chunk[-1])} "
+                f"({len(data_points)} data points, {failed_rates} rates could not be read, "
+                f"{done / (time.monotonic() - started_at):.0f} timestamps/s)"
+            )
+
+    async def close(self):
+        await self.web3_provider.provider.disconnect()
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from metrics import scheduler_lag_seconds
+from utils import OverlapPolicy
+
+
+class CycleRunner:
+    """
+    Runs fetching cycles in background threads, following an overlap policy when a cycle is due while previous ones
+    are still in progress:
+    - skip: the new cycle is skipped
+    - coalesce: a single cycle is run right after the one in progress, however many were due in the meantime
+    - allow: up to `max_concurrent_runs` cycles run at the same time, further ones are skipped
+    """
+
+    def __init__(
+        self,
+        job: Callable[[], None],
+        overlap_policy: OverlapPolicy = OverlapPolicy.COALESCE,
+        max_concurrent_runs: int = 1,
+    ):
+        if max_concurrent_runs < 1:
+            raise ValueError("max_concurrent_runs must be at least 1")
+
+        self.job = job
+        self.overlap_policy = overlap_policy
+        self.max_concurrent_runs = max_concurrent_runs if overlap_policy == OverlapPolicy.ALLOW else 1
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_runs, thread_name_prefix="price-fetcher")
+        self._lock = threading.Lock()
+        self._running = 0
+        # Time at which the first cycle coalesced into the next one was due
+        self._coalesced_due_at: Optional[float] = None
+
+    def submit(self):
+        """
+        Start a cycle, or skip or coalesce it if previous cycles are still in progress
+        """
+        due_at = time.time()
+        with self._lock:
+            if self._running < self.max_concurrent_runs:
+                self._running += 1
+                self.executor.submit(self._run, due_at)
+            elif self.overlap_policy == OverlapPolicy.COALESCE:
+                if self._coalesced_due_at is None:
+                    logging.warning("Previous cycle still in progress, next cycle will start when it completes")
+                    self._coalesced_due_at = due_at
+            else:
+                logging.warning(f"Skipping cycle, {self._running} cycle(s) still in progress")
+
+    def _run(self, due_at: float):
+        while True:
+            scheduler_lag_seconds.observe(time.time() - due_at)
+            try:
+                self.job()
+            except Exception as e:
+                logging.error(f"An unexpected error occurred while running the job: {str(e)}")
+
+            with self._lock:
+                if self._coalesced_due_at is None:
+                    self._running -= 1
+                    return
+                due_at, self._coalesced_due_at = self._coalesced_due_at, None
+
+    def shutdown(self):
+        """
+        Wait for the cycles in progress to complete, coalesced cycles are not run
+        """
+        with self._lock:
+            self._coalesced_due_at = None
+            self.overlap_policy = OverlapPolicy.SKIP
+        self.executor.shutdown(wait=True)
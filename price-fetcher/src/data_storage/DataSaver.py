@@ -1,11 +1,48 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import NamedTuple, Optional
 
 
 class FailedToSaveDataPointException(Exception):
-    pass
+    """
+    Raised when data points cannot be saved. `transient` is False when saving the same data points again would fail
+    again (e.g. a value rejected by the database), rather than because the storage is unavailable
+    """
+
+    def __init__(self, message: str, transient: bool = True):
+        super().__init__(message)
+        self.transient = transient
+
+
+class DataPoint(NamedTuple):
+    """
+    Price of a token on a network at a given time
+    """
+
+    timestamp: datetime
+    token_name: str
+    price_eth: int | Decimal
+    price_usd: Optional[float]
+    network: str
+    is_primary_market: bool
+    premium: float
+    source: Optional[str] = None
+
+
+class DepthPoint(NamedTuple):
+    """
+    Secondary market prices of a token on a network at a given time for a ladder of trade sizes, on one side.
+    Prices are in ETH per token, None for the sizes that could not be quoted
+    """
+
+    timestamp: datetime
+    token_name: str
+    network: str
+    is_buy: bool
+    sizes_eth: list[Decimal]
+    prices_eth: list[Optional[Decimal]]
+    sources: list[Optional[str]]
 
 
 class DataSaver(ABC):
@@ -19,6 +56,7 @@ class DataSaver(ABC):
         network: str,
         is_primary_market: bool,
         premium: float,
+        source: Optional[str] = None,
     ):
         """
         Save data point to database
@@ -31,8 +69,41 @@ class DataSaver(ABC):
             network (str): network / chain name
             is_primary_market (bool): whether price is from primary market
             premium (float): premium
+            source (str): secondary market the price comes from
 
         Raises:
             FailedToSaveDataPointException: if data point cannot be saved
         """
         pass
+
+    @abstractmethod
+    def save_data_points(self, data_points: list[DataPoint]):
+        """
+        Save a batch of data points to database at once. Data points already saved are ignored.
+
+        Args:
+            data_points (list[DataPoint]): data points to save
+
+        Raises:
+            FailedToSaveDataPointException: if data points cannot be saved
+        """
+        pass
+
+    @abstractmethod
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        """
+        Save a batch of depth points to database at once. Depth points already saved are ignored.
+
+        Args:
+            depth_points (list[DepthPoint]): depth points to save
+
+        Raises:
+            FailedToSaveDataPointException: if depth points cannot be saved
+        """
+        pass
+
+    def close(self):
+        """
+        Flush pending data points and release the resources held by the data saver
+        """
+        pass
@@ -3,7 +3,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Optional
 
-from data_storage.DataSaver import DataSaver
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint
 
 
 class FakeDataSaver(DataSaver):
@@ -16,9 +16,22 @@ class FakeDataSaver(DataSaver):
         network: str,
         is_primary_market: bool,
         premium: float,
+        source: Optional[str] = None,
     ):
         logging.debug(
             f"Saving data point: {timestamp}, {token_name}, {price_eth}, {price_usd}, {network}, {is_primary_market}, "
-            f"{premium}"
+            f"{premium}, {source}"
         )
         return
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        for data_point in data_points:
+            self.save_data_point(*data_point)
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        for depth_point in depth_points:
+            logging.debug(
+                f"Saving depth point: {depth_point.timestamp}, {depth_point.token_name}, {depth_point.network}, "
+                f"{'buy' if depth_point.is_buy else 'sell'}, {depth_point.sizes_eth}, {depth_point.prices_eth}, "
+                f"{depth_point.sources}"
+            )
@@ -0,0 +1,219 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, Optional
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+from utils import FileFormat
+
+# Same scale as the numeric columns of the database
+PRICE_TYPE = pa.decimal128(38, 18)
+PRICE_QUANTUM = Decimal(10) ** -18
+
+DATA_POINT_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("token_name", pa.string()),
+        ("price_eth", PRICE_TYPE),
+        ("price_usd", pa.float64()),
+        ("network", pa.string()),
+        ("is_primary_market", pa.bool_()),
+        ("premium", pa.float64()),
+        ("source", pa.string()),
+    ]
+)
+DEPTH_POINT_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("token_name", pa.string()),
+        ("network", pa.string()),
+        ("is_buy", pa.bool_()),
+        ("sizes_eth", pa.list_(PRICE_TYPE)),
+        ("prices_eth", pa.list_(PRICE_TYPE)),
+        ("sources", pa.list_(pa.string())),
+    ]
+)
+
+# Datasets are named after the database tables
+DATA_POINT_DATASET = "prices"
+DEPTH_POINT_DATASET = "price_depth"
+
+
+def _to_price(value: Optional[int | Decimal]) -> Optional[Decimal]:
+    return None if value is None else Decimal(value).quantize(PRICE_QUANTUM)
+
+
+class _Partition:
+    """
+    Rows buffered for one dataset, day and token, and the file they are written to
+    """
+
+    def __init__(self, directory: str, schema: pa.Schema):
+        self.directory = directory
+        self.schema = schema
+        self.rows: list[dict] = []
+        self.writer = None
+        self.path: Optional[str] = None
+        # Monotonic time of the first row of the current file, buffered or written
+        self.started_at: Optional[float] = None
+
+
+class FileDataSaver(DataSaver):
+    """
+    Writes data and depth points to Parquet or Arrow IPC files, for research and offline backtests.
+
+    Files are partitioned Hive-style by UTC day and token (`<base_dir>/prices/date=2025-01-31/token=wstETH/`), so they
+    can be read with `pyarrow.dataset`, DuckDB or Polars. Rows are buffered per partition and written as a row group (or
+    record batch) once `row_group_size` rows are buffered. A file is written under a hidden `.tmp` name and renamed once
+    closed, which happens at the end of its day, after `roll_interval` seconds, or when the data saver is closed, so
+    readers only ever see complete files.
+
+    Unlike the database, files do not ignore data points that were already saved.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        file_format: FileFormat = FileFormat.PARQUET,
+        row_group_size: int = 10_000,
+        roll_interval: float = 3600,
+    ):
+        self.base_dir = base_dir
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.roll_interval = roll_interval
+
+        os.makedirs(base_dir, exist_ok=True)
+        self._partitions: dict[tuple[str, str, str], _Partition] = {}
+        self._file_sequence = 0
+        self._lock = threading.Lock()
+
+    def save_data_point(
+        self,
+        timestamp: datetime,
+        token_name: str,
+        price_eth: int | Decimal,
+        price_usd: Optional[float],
+        network: str,
+        is_primary_market: bool,
+        premium: float,
+        source: Optional[str] = None,
+    ):
+        self.save_data_points(
+            [DataPoint(timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)]
+        )
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        self._save(
+            DATA_POINT_DATASET,
+            DATA_POINT_SCHEMA,
+            [
+                {
+                    **data_point._asdict(),
+                    "timestamp": data_point.timestamp.astimezone(timezone.utc),
+                    "price_eth": _to_price(data_point.price_eth),
+                }
+                for data_point in data_points
+            ],
+        )
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self._save(
+            DEPTH_POINT_DATASET,
+            DEPTH_POINT_SCHEMA,
+            [
+                {
+                    **depth_point._asdict(),
+                    "timestamp": depth_point.timestamp.astimezone(timezone.utc),
+                    "sizes_eth": [_to_price(size) for size in depth_point.sizes_eth],
+                    "prices_eth": [_to_price(price) for price in depth_point.prices_eth],
+                }
+                for depth_point in depth_points
+            ],
+        )
+
+    def _save(self, dataset: str, schema: pa.Schema, rows: list[dict]):
+        with self._lock:
+            try:
+                for row in rows:
+                    day = row["timestamp"].date().isoformat()
+                    key = (dataset, day, row["token_name"])
+                    partition = self._partitions.get(key)
+                    if partition is None:
+                        # A day started: files of the previous days will not get any more rows
+                        self._close_partitions(lambda other_key: other_key[0] == dataset and other_key[1] < day)
+                        directory = os.path.join(
+                            self.base_dir, dataset, f"date={day}", f"token={quote(row['token_name'], safe='')}"
+                        )
+                        partition = self._partitions[key] = _Partition(directory, schema)
+
+                    partition.rows.append(row)
+                    if partition.started_at is None:
+                        partition.started_at = time.monotonic()
+                    if len(partition.rows) >= self.row_group_size:
+                        self._write_rows(partition)
+
+                now = time.monotonic()
+                self._close_partitions(
+                    lambda other_key: (
+                        self._partitions[other_key].started_at is not None
+                        and now - self._partitions[other_key].started_at >= self.roll_interval
+                    )
+                )
+            except (OSError, pa.ArrowException) as e:
+                raise FailedToSaveDataPointException(f"Failed to write {len(rows)} rows to {self.base_dir}: {str(e)}")
+
+    @staticmethod
+    def _get_temporary_path(path: str) -> str:
+        # Hidden files are skipped by `pyarrow.dataset`
+        return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+
+    def _write_rows(self, partition: _Partition):
+        """
+        Writes the buffered rows of a partition as a row group, must be called with the lock held
+        """
+        if not partition.rows:
+            return
+        if partition.writer is None:
+            os.makedirs(partition.directory, exist_ok=True)
+            self._file_sequence += 1
+            file_name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}-{self._file_sequence}"
+            partition.path = os.path.join(partition.directory, f"{file_name}.{self.file_format}")
+            temporary_path = self._get_temporary_path(partition.path)
+            if self.file_format == FileFormat.PARQUET:
+                partition.writer = pq.ParquetWriter(temporary_path, partition.schema, compression="zstd")
+            else:
+                partition.writer = pa.ipc.new_file(
+                    temporary_path, partition.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+                )
+
+        partition.writer.write_table(pa.Table.from_pylist(partition.rows, schema=partition.schema))
+        partition.rows = []
+
+    def _close_partitions(self, predicate: Callable[[tuple[str, str, str]], bool]):
+        """
+        Writes the buffered rows of the matching partitions, closes their files and forgets them, must be called with
+        the lock held
+        """
+        for key in [key for key in self._partitions if predicate(key)]:
+            partition = self._partitions[key]
+            self._write_rows(partition)
+            if partition.writer is not None:
+                partition.writer.close()
+                os.replace(self._get_temporary_path(partition.path), partition.path)
+                logging.debug(f"Closed {partition.path}")
+            del self._partitions[key]
+
+    def close(self):
+        with self._lock:
+            try:
+                self._close_partitions(lambda key: True)
+            except (OSError, pa.ArrowException) as e:
+                logging.error(f"Failed to close files in {self.base_dir}: {str(e)}")
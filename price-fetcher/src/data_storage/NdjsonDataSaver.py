@@ -0,0 +1,62 @@
+import json
+import sys
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, TextIO
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+
+
+def _to_json(value):
+    # Prices are written as strings so that they keep their precision
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class NdjsonDataSaver(DataSaver):
+    """
+    Streams data and depth points as newline-delimited JSON objects, to stdout by default, to pipe them into other tools
+    (e.g. `jq`). Objects have a `type` field (`price` or `depth`) and the fields of the data or depth points, each
+    batch is flushed once written.
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def save_data_point(
+        self,
+        timestamp: datetime,
+        token_name: str,
+        price_eth: int | Decimal,
+        price_usd: Optional[float],
+        network: str,
+        is_primary_market: bool,
+        premium: float,
+        source: Optional[str] = None,
+    ):
+        self.save_data_points(
+            [DataPoint(timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)]
+        )
+
+    def _write(self, kind: str, points: list[DataPoint] | list[DepthPoint]):
+        if not points:
+            return
+        lines = "".join(json.dumps({"type": kind, **point._asdict()}, default=_to_json) + "\n" for point in points)
+        with self._lock:
+            try:
+                self.stream.write(lines)
+                self.stream.flush()
+            except (OSError, ValueError) as e:
+                # Closed pipe or stream
+                raise FailedToSaveDataPointException(f"Failed to write {len(points)} {kind} points: {str(e)}")
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        self._write("price", data_points)
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self._write("depth", depth_points)
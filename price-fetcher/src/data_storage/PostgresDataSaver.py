@@ -1,11 +1,14 @@
 from _decimal import Decimal
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Numeric, String, create_engine
+from sqlalchemy import Boolean, Column, DateTime, Numeric, String, Table, create_engine, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from data_storage.DataSaver import DataSaver, FailedToSaveDataPointException
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+from metrics import rows_written_total
 
 Base = declarative_base()
 
@@ -24,9 +27,29 @@ class LstPriceDataPoint(Base):
     price_eth = Column(Numeric(20, 18))
     price_usd = Column(Numeric(16, 2))
     premium = Column(Numeric(6, 5))
+    source = Column(String(20))
+
+
+class LstPriceDepthPoint(Base):
+    """
+    Represents the secondary market prices of a token on a network at a given time for a ladder of trade sizes
+    """
+
+    __tablename__ = "price_depth"
+
+    timestamp = Column(DateTime(timezone=True), primary_key=True)
+    token_name = Column(String(10), primary_key=True)
+    network = Column(String(20), primary_key=True)
+    is_buy = Column(Boolean, primary_key=True)
+    sizes_eth = Column(ARRAY(Numeric), nullable=False)
+    prices_eth = Column(ARRAY(Numeric(20, 18)), nullable=False)
+    sources = Column(ARRAY(String(20)))
 
 
 class PostgresDataSaver(DataSaver):
+    # Postgres accepts at most 65535 bind parameters per statement (at most 8 per row)
+    max_rows_per_statement = 5000
+
     def __init__(self, db_connection_string: str):
         self.engine = create_engine(db_connection_string)
         self.session_maker = sessionmaker(bind=self.engine)
@@ -40,6 +63,7 @@ class PostgresDataSaver(DataSaver):
         network: str,
         is_primary_market: bool,
         premium: float,
+        source: Optional[str] = None,
     ):
         session = self.session_maker()
         try:
@@ -51,6 +75,7 @@ class PostgresDataSaver(DataSaver):
                 network=network,
                 is_primary_market=is_primary_market,
                 premium=premium,
+                source=source,
             )
             session.add(lst_price_data_point)
             session.commit()
@@ -59,3 +84,52 @@ class PostgresDataSaver(DataSaver):
             raise FailedToSaveDataPointException(f"Failed to save data point: {str(e)}")
         finally:
             session.close()
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        # Connection failures and timeouts, whereas e.g. integrity or data errors fail again with the same rows
+        return isinstance(error, (OperationalError, InterfaceError)) or (
+            isinstance(error, DBAPIError) and error.connection_invalidated
+        )
+
+    def _insert_rows(self, table: Table, rows: list[NamedTuple], kind: str):
+        """
+        Inserts rows in a single transaction with multi-row statements, ignoring the rows that already exist
+        """
+        if not rows:
+            return
+
+        inserted_rows = 0
+        try:
+            with self.engine.begin() as connection:
+                for i in range(0, len(rows), self.max_rows_per_statement):
+                    values = [row._asdict() for row in rows[i : i + self.max_rows_per_statement]]
+                    result = connection.execute(insert(table).values(values).on_conflict_do_nothing())
+                    inserted_rows += result.rowcount
+        except Exception as e:
+            raise FailedToSaveDataPointException(
+                f"Failed to save {len(rows)} {kind}: {str(e)}", transient=self._is_transient(e)
+            )
+
+        rows_written_total.inc(inserted_rows)
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        self._insert_rows(LstPriceDataPoint.__table__, data_points, "data points")
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self._insert_rows(LstPriceDepthPoint.__table__, depth_points, "depth points")
+
+    def get_raw_retention(self) -> Optional[timedelta]:
+        """
+        Returns the age after which the retention policy drops raw prices, or None if it is not scheduled
+        """
+        sql = text("""
+            SELECT (config ->> 'drop_after')::interval
+            FROM timescaledb_information.jobs
+            WHERE proc_name = 'policy_retention' AND hypertable_name = 'prices' AND scheduled
+        """)
+        with self.engine.connect() as connection:
+            return connection.execute(sql).scalar()
+
+    def close(self):
+        self.engine.dispose()
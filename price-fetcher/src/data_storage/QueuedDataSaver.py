@@ -0,0 +1,79 @@
+import logging
+import queue
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Optional
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+from metrics import record_error
+
+
+class QueuedDataSaver(DataSaver):
+    """
+    Decouples price fetching from database writes: batches of data (and depth) points are put in a bounded in-memory
+    queue and written by a background thread with the wrapped data saver, so a slow database never stalls the fetching
+    loop.
+    When the queue is full, new batches are rejected instead of blocking the caller.
+    """
+
+    def __init__(self, data_saver: DataSaver, max_queued_batches: int = 100):
+        self.data_saver = data_saver
+        # Queued items are a saving method of the wrapped data saver and the batch to save with it
+        self.queue: queue.Queue[Optional[tuple[Callable[[list], None], list]]] = queue.Queue(maxsize=max_queued_batches)
+        self.writer = threading.Thread(target=self._write_batches, name="data-saver", daemon=True)
+        self.writer.start()
+
+    def _write_batches(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                save, batch = item
+                save(batch)
+            except FailedToSaveDataPointException as e:
+                logging.error(f"Failed to save data points: {str(e)}")
+                record_error(e)
+            except Exception as e:
+                logging.error(f"An unexpected error occurred while saving data points: {str(e)}")
+                record_error(e)
+            finally:
+                self.queue.task_done()
+
+    def save_data_point(
+        self,
+        timestamp: datetime,
+        token_name: str,
+        price_eth: int | Decimal,
+        price_usd: Optional[float],
+        network: str,
+        is_primary_market: bool,
+        premium: float,
+        source: Optional[str] = None,
+    ):
+        self.save_data_points(
+            [DataPoint(timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)]
+        )
+
+    def _enqueue(self, save: Callable[[list], None], batch: list, kind: str):
+        if not batch:
+            return
+
+        try:
+            self.queue.put_nowait((save, list(batch)))
+        except queue.Full:
+            raise FailedToSaveDataPointException(
+                f"Write queue is full ({self.queue.maxsize} batches pending), dropping {len(batch)} {kind}"
+            )
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        self._enqueue(self.data_saver.save_data_points, data_points, "data points")
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self._enqueue(self.data_saver.save_depth_points, depth_points, "depth points")
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        self.data_saver.close()
@@ -0,0 +1,377 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+from metrics import record_error
+
+
+class SpooledDataSaver(DataSaver):
+    """
+    Durable write-ahead spool in front of a data saver.
+
+    Data points are appended to segmented log files in `spool_dir` (one JSON data or depth point per line) and
+    fsynced at most every `fsync_interval` seconds. A background thread drains sealed segments into the wrapped data
+    saver in large batches, and deletes a segment only once it has been saved. While the database is slow or down, data
+    points accumulate on disk and are bulk loaded when it is reachable again. Segments left over by a previous process
+    are replayed on start-up.
+
+    The wrapped data saver must ignore data points that were already saved (a segment can be replayed after a crash
+    between the database commit and the deletion of the segment). The spool never grows over `max_spool_bytes`: the
+    oldest segments are dropped first.
+
+    When a batch fails with an error that is not transient (see `FailedToSaveDataPointException.transient`), its
+    segments are saved one by one and the ones that still fail are moved to `dead-letter-*.ndjson` files in
+    `spool_dir`, so that a single invalid data point does not block the spool.
+    """
+
+    segment_prefix = "spool-"
+    dead_letter_prefix = "dead-letter-"
+    segment_suffix = ".ndjson"
+
+    def __init__(
+        self,
+        data_saver: DataSaver,
+        spool_dir: str,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        max_spool_bytes: int = 1024 * 1024 * 1024,
+        fsync_interval: float = 1,
+        drain_interval: float = 5,
+        retry_interval: float = 30,
+        max_batch_size: int = 100_000,
+    ):
+        self.data_saver = data_saver
+        self.spool_dir = spool_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.max_spool_bytes = max_spool_bytes
+        self.fsync_interval = fsync_interval
+        self.drain_interval = drain_interval
+        self.retry_interval = retry_interval
+        self.max_batch_size = max_batch_size
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data_available = threading.Event()
+        self._stopping = threading.Event()
+        self._segment_sizes: dict[int, int] = {
+            sequence: os.path.getsize(self._segment_path(sequence)) for sequence in self._list_segments()
+        }
+        if self._segment_sizes:
+            logging.info(f"Replaying {len(self._segment_sizes)} spooled segment(s) from {spool_dir}")
+            self._data_available.set()
+
+        # Always start a new segment so that leftover segments are immutable and can be drained right away
+        self._active_sequence = max(self._segment_sizes, default=0) + 1
+        self._active_file = None
+        self._last_fsync = 0.0
+
+        self.drainer = threading.Thread(target=self._drain_segments, name="spool-drainer", daemon=True)
+        self.drainer.start()
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self.spool_dir, f"{self.segment_prefix}{sequence:012d}{self.segment_suffix}")
+
+    def _list_segments(self) -> list[int]:
+        return sorted(
+            int(file_name[len(self.segment_prefix) : -len(self.segment_suffix)])
+            for file_name in os.listdir(self.spool_dir)
+            if file_name.startswith(self.segment_prefix) and file_name.endswith(self.segment_suffix)
+        )
+
+    @staticmethod
+    def _serialize(data_point: DataPoint | DepthPoint) -> str:
+        if isinstance(data_point, DepthPoint):
+            # Depth points are JSON objects, to be told apart from data points
+            return json.dumps(
+                {
+                    "depth": [
+                        data_point.timestamp.isoformat(),
+                        data_point.token_name,
+                        data_point.network,
+                        data_point.is_buy,
+                        [str(size) for size in data_point.sizes_eth],
+                        [None if price is None else str(price) for price in data_point.prices_eth],
+                        data_point.sources,
+                    ]
+                }
+            )
+        return json.dumps(
+            [
+                data_point.timestamp.isoformat(),
+                data_point.token_name,
+                str(data_point.price_eth),
+                data_point.price_usd,
+                data_point.network,
+                data_point.is_primary_market,
+                data_point.premium,
+                data_point.source,
+            ]
+        )
+
+    @staticmethod
+    def _deserialize(line: str) -> DataPoint | DepthPoint:
+        values = json.loads(line)
+        if isinstance(values, dict):
+            timestamp, token_name, network, is_buy, sizes_eth, prices_eth, sources = values["depth"]
+            return DepthPoint(
+                datetime.fromisoformat(timestamp),
+                token_name,
+                network,
+                is_buy,
+                [Decimal(size) for size in sizes_eth],
+                [None if price is None else Decimal(price) for price in prices_eth],
+                sources,
+            )
+
+        timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, *source = values
+        return DataPoint(
+            datetime.fromisoformat(timestamp),
+            token_name,
+            Decimal(price_eth),
+            price_usd,
+            network,
+            is_primary_market,
+            premium,
+            *source,
+        )
+
+    def _seal_active_segment(self):
+        """
+        Closes the active segment so that it can be drained, must be called with the lock held
+        """
+        if self._active_file is None:
+            return
+        self._active_file.flush()
+        os.fsync(self._active_file.fileno())
+        self._active_file.close()
+        self._active_file = None
+        self._active_sequence += 1
+
+    def _enforce_max_spool_size(self):
+        """
+        Drops the oldest sealed segments while the spool is over its size limit, must be called with the lock held
+        """
+        while sum(self._segment_sizes.values()) > self.max_spool_bytes and len(self._segment_sizes) > 1:
+            oldest_sequence = min(self._segment_sizes)
+            if oldest_sequence == self._active_sequence:
+                return
+            size = self._segment_sizes.pop(oldest_sequence)
+            try:
+                os.remove(self._segment_path(oldest_sequence))
+            except FileNotFoundError:
+                pass
+            logging.error(
+                f"Spool is over {self.max_spool_bytes} bytes, dropped segment {oldest_sequence} ({size} bytes)"
+            )
+
+    def save_data_point(
+        self,
+        timestamp: datetime,
+        token_name: str,
+        price_eth: int | Decimal,
+        price_usd: Optional[float],
+        network: str,
+        is_primary_market: bool,
+        premium: float,
+        source: Optional[str] = None,
+    ):
+        self.save_data_points(
+            [DataPoint(timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)]
+        )
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self.save_data_points(depth_points)
+
+    def save_data_points(self, data_points: list[DataPoint | DepthPoint]):
+        if not data_points:
+            return
+
+        payload = "".join(self._serialize(data_point) + "\n" for data_point in data_points)
+        try:
+            with self._lock:
+                if self._active_file is None:
+                    self._active_file = open(self._segment_path(self._active_sequence), "a", encoding="utf-8")
+                    self._segment_sizes.setdefault(self._active_sequence, 0)
+
+                self._active_file.write(payload)
+                self._active_file.flush()
+                self._segment_sizes[self._active_sequence] += len(payload.encode("utf-8"))
+
+                now = time.monotonic()
+                if now - self._last_fsync >= self.fsync_interval:
+                    os.fsync(self._active_file.fileno())
+                    self._last_fsync = now
+
+                if self._segment_sizes[self._active_sequence] >= self.segment_max_bytes:
+                    self._seal_active_segment()
+                self._enforce_max_spool_size()
+        except OSError as e:
+            raise FailedToSaveDataPointException(f"Failed to spool {len(data_points)} data points: {str(e)}")
+
+        self._data_available.set()
+
+    def _read_segment(self, sequence: int) -> list[DataPoint | DepthPoint]:
+        data_points = []
+        with open(self._segment_path(sequence), encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.endswith("\n"):
+                    logging.warning(f"Skipping truncated line {line_number} of spooled segment {sequence}")
+                    continue
+                try:
+                    data_points.append(self._deserialize(line))
+                except (ValueError, TypeError) as e:
+                    logging.warning(f"Skipping invalid line {line_number} of spooled segment {sequence}: {str(e)}")
+        return data_points
+
+    def _drain_segments(self):
+        while True:
+            self._data_available.wait(self.drain_interval)
+            self._data_available.clear()
+            stopping = self._stopping.is_set()
+
+            with self._lock:
+                sequences = sorted(sequence for sequence in self._segment_sizes if sequence < self._active_sequence)
+                # While older segments are pending, keep appending to the active one so that the backlog is made of
+                # a few large segments rather than one small segment per run
+                if self._active_file is not None and (not sequences or stopping):
+                    sequences.append(self._active_sequence)
+                    self._seal_active_segment()
+
+            if not self._drain(sequences) and self._stopping.wait(self.retry_interval):
+                return
+            if stopping:
+                return
+
+    def _drain(self, sequences: list[int]) -> bool:
+        """
+        Saves the given segments with the wrapped data saver, merging them into batches of up to `max_batch_size`
+        data points, and deletes them once saved
+
+        Returns:
+            bool: False if a batch could not be saved because of a transient error
+        """
+        batch_sequences, batch = [], []
+        for i, sequence in enumerate(sequences):
+            try:
+                batch.extend(self._read_segment(sequence))
+            except FileNotFoundError:
+                # Dropped by the size limit in the meantime
+                pass
+            batch_sequences.append(sequence)
+
+            if len(batch) < self.max_batch_size and i < len(sequences) - 1:
+                continue
+
+            try:
+                self._save_segments(batch_sequences, batch)
+            except Exception as e:
+                if self._is_transient(e):
+                    logging.error(f"Failed to drain spooled segment(s) {batch_sequences}, retrying later: {str(e)}")
+                    record_error(e)
+                    return False
+                # Find the segments that cannot be saved, so that they do not block the others
+                logging.warning(f"Failed to drain spooled segment(s) {batch_sequences}, retrying them one by one")
+                if not self._drain_one_by_one(batch_sequences):
+                    return False
+            else:
+                logging.debug(f"Drained {len(batch)} spooled data points from segment(s) {batch_sequences}")
+            batch_sequences, batch = [], []
+
+        return True
+
+    def _drain_one_by_one(self, sequences: list[int]) -> bool:
+        """
+        Saves the given segments one at a time, and moves the ones that still cannot be saved to dead-letter files
+
+        Returns:
+            bool: False if a segment could not be saved because of a transient error
+        """
+        for sequence in sequences:
+            try:
+                self._save_segments([sequence], self._read_segment(sequence))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                record_error(e)
+                if self._is_transient(e):
+                    logging.error(f"Failed to drain spooled segment {sequence}, retrying later: {str(e)}")
+                    return False
+                self._dead_letter(sequence, e)
+        return True
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        return isinstance(error, FailedToSaveDataPointException) and error.transient
+
+    def _save_segments(self, sequences: list[int], data_points: list[DataPoint | DepthPoint]):
+        """
+        Saves the data points then the depth points read from the given segments, and deletes the segments once both
+        are saved. If only the data points are saved, they are removed from the segments so that they are not saved
+        again when the segments are retried
+        """
+        depth_points = [point for point in data_points if isinstance(point, DepthPoint)]
+        data_points = [point for point in data_points if isinstance(point, DataPoint)]
+        self.data_saver.save_data_points(data_points)
+        try:
+            self.data_saver.save_depth_points(depth_points)
+        except Exception:
+            if data_points:
+                for sequence in sequences:
+                    self._remove_data_points(sequence)
+            raise
+
+        with self._lock:
+            for sequence in sequences:
+                self._segment_sizes.pop(sequence, None)
+                try:
+                    os.remove(self._segment_path(sequence))
+                except FileNotFoundError:
+                    pass
+
+    def _remove_data_points(self, sequence: int):
+        """
+        Rewrites a segment with its depth points only
+        """
+        path = self._segment_path(sequence)
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    # Depth points are the JSON objects
+                    lines = [line for line in f if line.startswith("{") and line.endswith("\n")]
+            except FileNotFoundError:
+                return
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, path)
+            if sequence in self._segment_sizes:
+                self._segment_sizes[sequence] = os.path.getsize(path)
+
+    def _dead_letter(self, sequence: int, error: Exception):
+        """
+        Moves a segment that cannot be saved out of the spool, to be inspected and replayed manually
+        """
+        file_name = f"{self.dead_letter_prefix}{sequence:012d}{self.segment_suffix}"
+        dead_letter_path = os.path.join(self.spool_dir, file_name)
+        with self._lock:
+            self._segment_sizes.pop(sequence, None)
+            try:
+                os.replace(self._segment_path(sequence), dead_letter_path)
+            except FileNotFoundError:
+                return
+        logging.error(f"Failed to save spooled segment {sequence}, moved it to {dead_letter_path}: {str(error)}")
+
+    def close(self):
+        self._stopping.set()
+        self._data_available.set()
+        self.drainer.join()
+        with self._lock:
+            self._seal_active_segment()
+        self.data_saver.close()
@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Optional
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+
+
+class TeeDataSaver(DataSaver):
+    """
+    Fans each batch of data (and depth) points out to several data savers, e.g. the database and files.
+
+    Every data saver gets every batch, even when saving to another one fails. Data savers are called in turn from the
+    caller's thread: wrap the slow ones in a `QueuedDataSaver` (or a `SpooledDataSaver`) so that they neither delay the
+    fetching loop nor the other data savers.
+    """
+
+    def __init__(self, data_savers: list[DataSaver]):
+        self.data_savers = data_savers
+
+    def save_data_point(
+        self,
+        timestamp: datetime,
+        token_name: str,
+        price_eth: int | Decimal,
+        price_usd: Optional[float],
+        network: str,
+        is_primary_market: bool,
+        premium: float,
+        source: Optional[str] = None,
+    ):
+        self.save_data_points(
+            [DataPoint(timestamp, token_name, price_eth, price_usd, network, is_primary_market, premium, source)]
+        )
+
+    def _fan_out(self, get_save: Callable[[DataSaver], Callable[[list], None]], batch: list):
+        errors = []
+        for data_saver in self.data_savers:
+            try:
+                get_save(data_saver)(batch)
+            except FailedToSaveDataPointException as e:
+                errors.append(f"{type(data_saver).__name__}: {str(e)}")
+        if errors:
+            raise FailedToSaveDataPointException("; ".join(errors))
+
+    def save_data_points(self, data_points: list[DataPoint]):
+        self._fan_out(lambda data_saver: data_saver.save_data_points, data_points)
+
+    def save_depth_points(self, depth_points: list[DepthPoint]):
+        self._fan_out(lambda data_saver: data_saver.save_depth_points, depth_points)
+
+    def close(self):
+        for data_saver in self.data_savers:
+            try:
+                data_saver.close()
+            except Exception as e:
+                logging.error(f"Failed to close {type(data_saver).__name__}: {str(e)}")
@@ -0,0 +1,125 @@
+import datetime
+import logging
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from data_storage.DataSaver import DepthPoint
+from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketPriceFetcher, SecondaryMarketQuote
+
+
+class DepthRung(NamedTuple):
+    """
+    Secondary market quote of a depth ladder: `amount` wei of `src_token_address` sold for `dst_token_address`
+    """
+
+    token_name: str
+    chain: str
+    is_buy: bool
+    size_eth: Decimal
+    src_token_address: str
+    dst_token_address: str
+    amount: int
+
+
+class DepthLadder:
+    """
+    Ladder of trade sizes quoted on both sides for each token and chain:
+    - sell side: `size` ETH worth of token (converted with the primary market rate) sold for ETH
+    - buy side: `size` ETH sold for token
+
+    Prices are in ETH per token on both sides, so that the depth curve can be compared to the 1 token price.
+    """
+
+    def __init__(self, sizes_eth: list[Decimal]):
+        if not sizes_eth or any(size <= 0 for size in sizes_eth):
+            raise ValueError("Depth ladder sizes must be strictly positive")
+        self.sizes_eth = sorted(set(sizes_eth))
+
+    def get_rungs(
+        self,
+        token_name: str,
+        chain: str,
+        token_address: str,
+        eth_token_address: str,
+        primary_market_price: int,
+    ) -> list[DepthRung]:
+        """
+        Returns the quotes of the ladder of a token on a chain
+
+        Args:
+            token_name (str): token name
+            chain (str): network / chain name
+            token_address (str): token address on the chain
+            eth_token_address (str): ETH token address on the chain
+            primary_market_price (int): primary market price in wei, used to size the sell side (sizes are used as
+                token amounts when it is not known)
+        """
+        one_ether = SecondaryMarketPriceFetcher.one_ether
+        rungs = []
+        for size_eth in self.sizes_eth:
+            eth_amount = int(size_eth * one_ether)
+            token_amount = eth_amount * one_ether // primary_market_price if primary_market_price > 0 else eth_amount
+            rungs.append(DepthRung(token_name, chain, False, size_eth, token_address, eth_token_address, token_amount))
+            rungs.append(DepthRung(token_name, chain, True, size_eth, eth_token_address, token_address, eth_amount))
+        return rungs
+
+    @staticmethod
+    def get_price(rung: DepthRung, amount_out: int) -> Optional[Decimal]:
+        """
+        Returns the price in ETH per token of a ladder quote, None if nothing would be received
+        """
+        if amount_out <= 0:
+            return None
+        if rung.is_buy:
+            price = Decimal(rung.amount) / Decimal(amount_out)
+        else:
+            price = Decimal(amount_out) / Decimal(rung.amount)
+        return price.quantize(Decimal(10) ** -18)
+
+    def get_depth_points(
+        self,
+        timestamp: datetime.datetime,
+        rungs: list[DepthRung],
+        quotes: dict[DepthRung, SecondaryMarketQuote],
+    ) -> list[DepthPoint]:
+        """
+        Groups the quotes of the ladders into one depth point per token, chain and side
+
+        Args:
+            timestamp (datetime): timestamp of the fetching cycle
+            rungs (list[DepthRung]): quotes of the ladders
+            quotes (dict[DepthRung, SecondaryMarketQuote]): quotes that could be fetched
+
+        Returns:
+            list[DepthPoint]: depth points, ladders without any quote are skipped
+        """
+        ladders: dict[tuple[str, str, bool], list[DepthRung]] = {}
+        for rung in rungs:
+            ladders.setdefault((rung.token_name, rung.chain, rung.is_buy), []).append(rung)
+
+        depth_points = []
+        for (token_name, chain, is_buy), ladder in ladders.items():
+            ladder_quotes = [quotes.get(rung) for rung in ladder]
+            if all(quote is None for quote in ladder_quotes):
+                continue
+
+            prices_eth = [
+                None if quote is None else self.get_price(rung, quote.price)
+                for rung, quote in zip(ladder, ladder_quotes)
+            ]
+            logging.debug(
+                f"{token_name} on {chain} {'buy' if is_buy else 'sell'} depth: "
+                + ", ".join(f"{rung.size_eth} ETH -> {price}" for rung, price in zip(ladder, prices_eth))
+            )
+            depth_points.append(
+                DepthPoint(
+                    timestamp=timestamp,
+                    token_name=token_name,
+                    network=chain,
+                    is_buy=is_buy,
+                    sizes_eth=[rung.size_eth for rung in ladder],
+                    prices_eth=prices_eth,
+                    sources=[None if quote is None else quote.source for quote in ladder_quotes],
+                )
+            )
+        return depth_points
@@ -1,28 +1,56 @@
+import asyncio
+import contextvars
 import datetime
+import importlib.util
 import json
 import logging
 import os
 import sys
 import time
-from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
-
-import schedule
-from web3 import Web3
-
-from data_storage.DataSaver import DataSaver, FailedToSaveDataPointException
-from data_storage.FakeDataSaver import FakeDataSaver
-from data_storage.PostgresDataSaver import PostgresDataSaver
-from price_fetcher.OneInchPriceFetcher import OneInchPriceFetcher
-from price_fetcher.ParaswapPriceFetcher import ParaswapPriceFetcher
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Callable, Optional
+
+from data_storage.DataSaver import DataPoint, DataSaver
+from depth_ladder import DepthLadder
+from metrics import record_error
+from price_fetcher.AdaptiveRateLimiter import retry_deadline
+from price_fetcher.CircuitBreaker import CircuitBreaker
 from price_fetcher.SecondaryMarketPriceFetcher import (
     CannotGetPriceException,
+    CircuitOpenException,
     SecondaryMarketPriceFetcher,
     UnsupportedChainException,
     UnsupportedTokenException,
 )
-from utils import SecondaryMarket, chains, eth_price_to_string, get_premium
+from price_recorder import (
+    get_primary_market_data_point,
+    get_secondary_market_data_point,
+    log_cycle_duration,
+    save_data_points,
+    save_depth_points,
+)
+from utils import (
+    MULTICALL3_ADDRESS,
+    FileFormat,
+    OverlapPolicy,
+    QuotePolicy,
+    SecondaryMarket,
+    chains,
+    filter_config,
+    get_quoted_chains,
+    has_primary_market,
+)
+
+# Heavy dependencies (web3, SQLAlchemy, schedule...) are imported by the code paths that need them, so that one-off
+# runs and commands that do not fetch prices start fast
+if TYPE_CHECKING:
+    from web3 import Web3
+    from web3.providers import AsyncBaseProvider, BaseProvider
+
+    from price_fetcher.JsonRpcClient import JsonRpcClient
+    from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
 
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -30,6 +58,8 @@ logging.basicConfig(
     stream=sys.stdout,
 )
 
+DEFAULT_MAX_CONCURRENCY = 8
+
 
 def load_config(config_file_path: str):
     """
@@ -50,86 +80,236 @@ def get_env_or_default_or_required(env_key: str, default_value: Optional[str] =
     return {"required": True}
 
 
+def parse_secondary_markets(value: str) -> list[SecondaryMarket]:
+    """
+    Parses a comma separated list of secondary markets, duplicates are ignored
+    """
+    try:
+        return list(dict.fromkeys(SecondaryMarket(market.strip()) for market in value.split(",")))
+    except ValueError:
+        raise ArgumentTypeError(f"invalid secondary market list: {value} (choose from {', '.join(SecondaryMarket)})")
+
+
+def parse_depth_ladder(value: str) -> list[Decimal]:
+    """
+    Parses a comma separated list of trade sizes in ETH
+    """
+    try:
+        return [Decimal(size.strip()) for size in value.split(",")]
+    except InvalidOperation:
+        raise ArgumentTypeError(f"invalid depth ladder: {value} (expected comma separated sizes in ETH)")
+
+
 def main(
     config: dict,
-    web3_provider: Web3,
+    web3_provider: "Web3 | JsonRpcClient",
     price_fetcher: SecondaryMarketPriceFetcher,
     data_saver: DataSaver,
-):
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    primary_market_rate_fetcher: Optional["MulticallPrimaryMarketRateFetcher"] = None,
+    cycle_timeout: Optional[float] = None,
+    depth_ladder: Optional[DepthLadder] = None,
+    pair_filter: Optional[Callable[[str, str], bool]] = None,
+    primary_market_filter: Optional[Callable[[str], bool]] = None,
+) -> list[Optional[DataPoint]]:
     primary_market_price = 0
     now = datetime.datetime.now()
+    started_at = time.monotonic()
+    # Throttled quotes are only retried within the cycle time budget
+    retry_deadline.set(None if cycle_timeout is None else started_at + cycle_timeout)
+    quotes_to_fetch = []
+    data_points = []
+    if primary_market_rate_fetcher is None:
+        from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
+
+        primary_market_rate_fetcher = MulticallPrimaryMarketRateFetcher()
+    config = filter_config(config, pair_filter, primary_market_filter)
+
+    # Get every primary market price at once
+    primary_market_tokens = [token for token in config["tokens"] if has_primary_market(token)]
+    try:
+        block_number, primary_market_prices = primary_market_rate_fetcher.get_exchange_rates(
+            web3_provider, primary_market_tokens
+        )
+        logging.debug(f"Read {len(primary_market_tokens)} primary market rates at block {block_number}")
+    except Exception as e:
+        primary_market_prices = {token["token_name"]: e for token in primary_market_tokens}
 
     for token in config["tokens"]:
-        # Get primary market price
-        if (
-            "ethereum" in token["token_addresses"]
-            and "native_contract_abi" in token
-            and "get_exchange_rate_function_name" in token
-        ):
-            token_address = token["token_addresses"]["ethereum"]
+        if token["token_name"] in primary_market_prices:
             chain = "ethereum"
-            contract = web3_provider.eth.contract(address=token_address, abi=token["native_contract_abi"])
-            get_exchange_rate_function = contract.functions[token["get_exchange_rate_function_name"]]
-            try:
-                primary_market_price = get_exchange_rate_function().call()
-            except Exception as e:
-                logging.warning(f"Failed to get primary market rate for {token['token_name']} on {chain}: {str(e)}")
+            result = primary_market_prices[token["token_name"]]
+            if isinstance(result, Exception):
+                logging.warning(
+                    f"Failed to get primary market rate for {token['token_name']} on {chain}: {str(result)}"
+                )
+                record_error(result)
                 continue
 
-            if primary_market_price >= 0:
-                logging.info(
-                    f"Primary market price for {token['token_name']} on {chain} is "
-                    f"{eth_price_to_string(primary_market_price)} ETH"
-                )
+            primary_market_price = result
+            if token.get("record_primary_market", True):
+                data_points.append(get_primary_market_data_point(now, token["token_name"], chain, primary_market_price))
+
+        # Queue secondary market quotes on given chains
+        for chain in get_quoted_chains(token):
+            quotes_to_fetch.append((token["token_name"], chain, token["token_addresses"][chain], primary_market_price))
+
+    # Get secondary market prices concurrently, requests are paced by the price fetcher rate limiter
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="quote")
+    pending_quotes = {
+        executor.submit(
+            contextvars.copy_context().run,
+            price_fetcher.get_quote,
+            chains[chain]["chain_id"],
+            token_address,
+            chains[chain]["eth_token_address"],
+        ): (token_name, chain, token_primary_market_price)
+        for token_name, chain, token_address, token_primary_market_price in quotes_to_fetch
+    }
+
+    # Depth ladder quotes go through the same pool after the 1 token quotes
+    depth_rungs = (
+        [
+            rung
+            for token_name, chain, token_address, token_primary_market_price in quotes_to_fetch
+            for rung in depth_ladder.get_rungs(
+                token_name, chain, token_address, chains[chain]["eth_token_address"], token_primary_market_price
+            )
+        ]
+        if depth_ladder
+        else []
+    )
+    pending_depth_quotes = {
+        executor.submit(
+            contextvars.copy_context().run,
+            price_fetcher.get_amount_out_quote,
+            chains[rung.chain]["chain_id"],
+            rung.src_token_address,
+            rung.dst_token_address,
+            rung.amount,
+        ): rung
+        for rung in depth_rungs
+    }
+    depth_quotes = {}
+
+    timeout = None if cycle_timeout is None else max(0.0, started_at + cycle_timeout - time.monotonic())
+    try:
+        for future in as_completed([*pending_quotes, *pending_depth_quotes], timeout=timeout):
+            if future in pending_depth_quotes:
+                rung = pending_depth_quotes[future]
                 try:
-                    data_saver.save_data_point(
-                        timestamp=now,
-                        token_name=token["token_name"],
-                        price_eth=web3_provider.from_wei(primary_market_price, "ether"),
-                        price_usd=None,
-                        network=chain,
-                        is_primary_market=True,
-                        premium=0,
+                    depth_quotes[rung] = future.result()
+                except (
+                    UnsupportedChainException,
+                    UnsupportedTokenException,
+                    CannotGetPriceException,
+                ) as e:
+                    logging.debug(f"Failed to get {rung.size_eth} ETH depth for {rung.token_name} on {rung.chain}: {e}")
+                    record_error(e)
+                except Exception as e:
+                    # A bad response must not lose the data points already collected in the cycle
+                    logging.error(
+                        f"Unexpected error getting {rung.size_eth} ETH depth for {rung.token_name} on {rung.chain}: "
+                        f"{type(e).__name__}: {e}"
                     )
-                except FailedToSaveDataPointException as e:
-                    logging.error(f"Failed to save data point: {str(e)}")
+                    record_error(e)
+                continue
 
-        # Get secondary market prices on given chains
-        for chain in token["token_addresses"]:
-            token_address = token["token_addresses"][chain]
+            token_name, chain, token_primary_market_price = pending_quotes[future]
             try:
-                price = price_fetcher.get_price(
-                    chains[chain]["chain_id"],
-                    token_address,
-                    chains[chain]["eth_token_address"],
-                )
+                quote = future.result()
+            except CircuitOpenException as e:
+                logging.debug(f"Skipped {token_name} on {chain}: {str(e)}")
+                continue
             except (
                 UnsupportedChainException,
                 UnsupportedTokenException,
                 CannotGetPriceException,
             ) as e:
-                logging.warning(f"Failed to get price for {token['token_name']} on {chain}: {str(e)}")
+                logging.warning(f"Failed to get price for {token_name} on {chain}: {str(e)}")
+                record_error(e)
+                continue
+            except Exception as e:
+                # A bad response must not lose the data points already collected in the cycle
+                logging.error(f"Unexpected error getting price for {token_name} on {chain}: {type(e).__name__}: {e}")
+                record_error(e)
                 continue
 
-            premium = get_premium(primary_market_price, price)
-
-            if price >= 0:
-                logging.info(
-                    f"{token['token_name']} on {chain} is {eth_price_to_string(price)} ETH -> "
-                    f"{abs(premium * 100):.3f}% {'premium' if premium >= 0 else 'discount'}"
+            data_points.append(
+                get_secondary_market_data_point(
+                    now, token_name, chain, quote.price, token_primary_market_price, quote.source
                 )
-                try:
-                    data_saver.save_data_point(
-                        timestamp=now,
-                        token_name=token["token_name"],
-                        price_eth=web3_provider.from_wei(price, "ether"),
-                        price_usd=None,
-                        network=chain,
-                        is_primary_market=False,
-                        premium=premium,
-                    )
-                except FailedToSaveDataPointException as e:
-                    logging.error(f"Failed to save data point: {str(e)}")
+            )
+    except TimeoutError:
+        # Quotes that did not start are cancelled, the ones in flight are abandoned and bounded by the HTTP timeouts
+        stragglers = sum(1 for future in [*pending_quotes, *pending_depth_quotes] if not future.done())
+        logging.warning(f"Cycle time budget of {cycle_timeout}s exceeded, cancelled {stragglers} quotes")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    save_data_points(data_saver, data_points)
+    if depth_ladder:
+        save_depth_points(data_saver, depth_ladder.get_depth_points(now, depth_rungs, depth_quotes))
+    log_cycle_duration(now, started_at, data_points)
+    return data_points
+
+
+def get_endpoint_uris(web3_provider: str) -> list[str]:
+    """
+    Returns the URLs of a comma separated list of Web3 provider URLs
+    """
+    return [uri.strip() for uri in web3_provider.split(",") if uri.strip()]
+
+
+def get_web3_provider(web3_provider: str, hedge_percentile: float, **kwargs) -> "BaseProvider":
+    """
+    Returns an HTTP provider for a single Web3 provider URL, or a provider pool routing requests between the URLs of a
+    comma separated list
+    """
+    endpoint_uris = get_endpoint_uris(web3_provider)
+    if len(endpoint_uris) == 1:
+        from web3 import HTTPProvider
+
+        return HTTPProvider(endpoint_uris[0], **kwargs)
+
+    from price_fetcher.RpcProviderPool import RpcProviderPool
+
+    return RpcProviderPool(endpoint_uris, hedge_percentile, **kwargs)
+
+
+def get_async_web3_provider(web3_provider: str, hedge_percentile: float, **kwargs) -> "AsyncBaseProvider":
+    """
+    Asyncio version of `get_web3_provider`
+    """
+    endpoint_uris = get_endpoint_uris(web3_provider)
+    if len(endpoint_uris) == 1:
+        from web3 import AsyncHTTPProvider
+
+        return AsyncHTTPProvider(endpoint_uris[0], **kwargs)
+
+    from price_fetcher.AsyncRpcProviderPool import AsyncRpcProviderPool
+
+    return AsyncRpcProviderPool(endpoint_uris, hedge_percentile, **kwargs)
+
+
+def print_circuit_breakers(circuit_breaker: CircuitBreaker):
+    """
+    Prints the state of the circuits that failed since they were last closed
+    """
+    circuits = circuit_breaker.get_circuits()
+    if not circuits:
+        print("No failing pair or provider")
+        return
+
+    now = time.time()
+    print(f"{'KEY':<80} {'STATE':<9} {'FAILURES':>8} {'REPROBE AT':<19} LAST ERROR")
+    for key, circuit in sorted(circuits.items()):
+        if circuit["open_until"] is None:
+            state, reprobe_at = "failing", ""
+        else:
+            state = "open" if now < circuit["open_until"] else "half-open"
+            reprobe_at = datetime.datetime.fromtimestamp(circuit["open_until"]).isoformat(sep=" ", timespec="seconds")
+        print(f"{key:<80} {state:<9} {circuit['failures']:>8} {reprobe_at:<19} {circuit['last_error']}")
 
 
 if __name__ == "__main__":
@@ -157,75 +337,691 @@ if __name__ == "__main__":
     parser.add_argument(
         "-m",
         "--secondary-market",
-        help="Secondary market to use",
-        type=SecondaryMarket,
-        choices=list(SecondaryMarket),
+        help="Secondary market to use, or comma separated list of secondary markets to quote concurrently",
+        type=parse_secondary_markets,
         **get_env_or_default_or_required("SECONDARY_MARKET", SecondaryMarket.PARASWAP),
     )
+    parser.add_argument(
+        "--quote-policy",
+        help="How to pick the price when several secondary markets are quoted",
+        type=QuotePolicy,
+        choices=list(QuotePolicy),
+        **get_env_or_default_or_required("QUOTE_POLICY", QuotePolicy.BEST),
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        help="Latency percentile of a secondary market after which a second identical request is sent to it "
+        "when several secondary markets are quoted (0 disables hedging)",
+        type=float,
+        **get_env_or_default_or_required("HEDGE_PERCENTILE", "95"),
+    )
     parser.add_argument(
         "-w",
         "--web3-provider",
-        help="Web3 provider URL",
+        help="Web3 provider URL, or comma separated list of URLs of the same chain to route requests between "
+        "(required unless the command is circuit-breakers)",
+        type=str,
+        default=os.getenv("WEB3_PROVIDER") or None,
+    )
+    parser.add_argument(
+        "--rpc-hedge-percentile",
+        help="Latency percentile of a Web3 provider URL after which a second identical request is sent to the next "
+        "URL when several URLs are given (0 disables hedging)",
+        type=float,
+        **get_env_or_default_or_required("RPC_HEDGE_PERCENTILE", "95"),
+    )
+    parser.add_argument(
+        "-r",
+        "--rate-limit",
+        help="Maximum number of requests per second sent to the secondary market (defaults to the provider quota)",
+        type=float,
+        default=os.getenv("RATE_LIMIT") or None,
+    )
+    parser.add_argument(
+        "-b",
+        "--rate-limit-burst",
+        help="Maximum number of requests sent at once to the secondary market (defaults to the provider quota)",
+        type=int,
+        default=os.getenv("RATE_LIMIT_BURST") or None,
+    )
+    parser.add_argument(
+        "--max-rate-limit",
+        help="Maximum number of requests per second the rate limit can grow to while the secondary market accepts "
+        "them (defaults to the rate limit)",
+        type=float,
+        default=os.getenv("MAX_RATE_LIMIT") or None,
+    )
+    parser.add_argument(
+        "--max-retries",
+        help="Maximum number of retries of a throttled or failed secondary market request",
+        type=int,
+        **get_env_or_default_or_required("MAX_RETRIES", "3"),
+    )
+    parser.add_argument(
+        "--circuit-breaker-file",
+        help="File keeping the state of the circuit breakers of secondary market pairs and providers across restarts",
+        type=str,
+        **get_env_or_default_or_required("CIRCUIT_BREAKER_FILE", "circuit-breakers.json"),
+    )
+    parser.add_argument(
+        "--circuit-breaker-threshold",
+        help="Number of consecutive failed quotes after which a pair is skipped until its next re-probe (0 disables "
+        "circuit breakers)",
+        type=int,
+        **get_env_or_default_or_required("CIRCUIT_BREAKER_THRESHOLD", "3"),
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        help="Maximum number of secondary market quotes in flight at the same time",
+        type=int,
+        **get_env_or_default_or_required("MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY)),
+    )
+    parser.add_argument(
+        "--http-pool-size",
+        help="Maximum number of keep-alive connections opened to the secondary market",
+        type=int,
+        **get_env_or_default_or_required("HTTP_POOL_SIZE", "10"),
+    )
+    parser.add_argument(
+        "--http-connect-timeout",
+        help="Timeout in seconds to connect to the secondary market",
+        type=float,
+        **get_env_or_default_or_required("HTTP_CONNECT_TIMEOUT", "5"),
+    )
+    parser.add_argument(
+        "--http-read-timeout",
+        help="Timeout in seconds to read a response from the secondary market",
+        type=float,
+        **get_env_or_default_or_required("HTTP_READ_TIMEOUT", "10"),
+    )
+    parser.add_argument(
+        "--multicall-address",
+        help="Address of the Multicall3 contract used to read primary market rates",
+        type=str,
+        **get_env_or_default_or_required("MULTICALL_ADDRESS", MULTICALL3_ADDRESS),
+    )
+    parser.add_argument(
+        "--spool-dir",
+        help="Directory of the on-disk spool where data points are kept until they are saved to the database",
+        type=str,
+        default=os.getenv("SPOOL_DIR") or None,
+    )
+    parser.add_argument(
+        "--max-spool-size",
+        help="Maximum size in MB of the on-disk spool, oldest data points are dropped beyond it",
+        type=int,
+        **get_env_or_default_or_required("MAX_SPOOL_SIZE", "1024"),
+    )
+    parser.add_argument(
+        "--file-sink",
+        help="Directory where data points are also written to Parquet or Arrow IPC files, partitioned by day and token "
+        "(only there with --dry-run)",
+        type=str,
+        default=os.getenv("FILE_SINK_DIR") or None,
+    )
+    parser.add_argument(
+        "--file-format",
+        help="Format of the files written with --file-sink",
+        type=FileFormat,
+        choices=list(FileFormat),
+        **get_env_or_default_or_required("FILE_FORMAT", FileFormat.PARQUET),
+    )
+    parser.add_argument(
+        "--row-group-size",
+        help="Number of rows buffered per day and token before they are written to a file as a row group",
+        type=int,
+        **get_env_or_default_or_required("ROW_GROUP_SIZE", "10000"),
+    )
+    parser.add_argument(
+        "--file-roll-interval",
+        help="Time in seconds after which files written with --file-sink are closed and new ones started",
+        type=float,
+        **get_env_or_default_or_required("FILE_ROLL_INTERVAL", "3600"),
+    )
+    parser.add_argument(
+        "--ndjson",
+        help="also stream data points as NDJSON to stdout (logs go to stderr)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cycle-timeout",
+        help="Time budget in seconds of a fetching cycle, quotes still in flight are cancelled beyond it "
+        "(defaults to the interval between two cycles in long-run mode)",
+        type=float,
+        default=os.getenv("CYCLE_TIMEOUT") or None,
+    )
+    parser.add_argument(
+        "--overlap-policy",
+        help="What to do when a fetching cycle is due while previous ones are still in progress (long-run mode)",
+        type=OverlapPolicy,
+        choices=list(OverlapPolicy),
+        **get_env_or_default_or_required("OVERLAP_POLICY", OverlapPolicy.COALESCE),
+    )
+    parser.add_argument(
+        "--max-concurrent-runs",
+        help="Maximum number of fetching cycles in progress at the same time with the allow overlap policy",
+        type=int,
+        **get_env_or_default_or_required("MAX_CONCURRENT_RUNS", "1"),
+    )
+    parser.add_argument(
+        "--adaptive-schedule",
+        help="poll pairs more often when their premium moves and less often when it is flat (long-run mode)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--min-interval",
+        help="Minimum number of minutes between two fetches of a pair with the adaptive schedule",
+        type=int,
+        **get_env_or_default_or_required("MIN_INTERVAL", "1"),
+    )
+    parser.add_argument(
+        "--max-interval",
+        help="Maximum number of minutes between two fetches of a pair with the adaptive schedule",
+        type=int,
+        **get_env_or_default_or_required("MAX_INTERVAL", "60"),
+    )
+    parser.add_argument(
+        "--premium-change-threshold",
+        help="Change of premium in percentage points above which a pair is polled more often with the adaptive "
+        "schedule",
+        type=float,
+        **get_env_or_default_or_required("PREMIUM_CHANGE_THRESHOLD", "0.05"),
+    )
+    parser.add_argument(
+        "--depth-ladder",
+        help="Comma separated trade sizes in ETH quoted on both sides for each token and chain (e.g. 10,100,1000)",
+        type=parse_depth_ladder,
+        default=os.getenv("DEPTH_LADDER") or None,
+    )
+    parser.add_argument(
+        "--shard-count",
+        help="Number of shards the token / chain pairs are split into between the workers sharing the database "
+        "(0 disables sharding)",
+        type=int,
+        **get_env_or_default_or_required("SHARD_COUNT", "0"),
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="Identifier of this worker in the shard leases (defaults to hostname and process id)",
+        type=str,
+        default=os.getenv("WORKER_ID") or None,
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        help="Duration in seconds of the shard leases (defaults to twice the schedule interval)",
+        type=float,
+        default=os.getenv("LEASE_TTL") or None,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help="Port of the Prometheus /metrics endpoint served in long-run mode (0 disables it)",
+        type=int,
+        **get_env_or_default_or_required("METRICS_PORT", "9108"),
+    )
+    parser.add_argument(
+        "-a",
+        "--async-mode",
+        help="fetch prices with the asyncio pipeline instead of threads",
+        action="store_true",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    backfill_parser = subparsers.add_parser(
+        "backfill",
+        help="fill the history of the primary market prices by reading the rates at past blocks "
+        "(needs an archive node)",
+    )
+    backfill_parser.add_argument(
+        "--start",
+        help="Start of the time range to backfill (ISO 8601)",
+        type=datetime.datetime.fromisoformat,
+        required=True,
+    )
+    backfill_parser.add_argument(
+        "--end",
+        help="End of the time range to backfill (ISO 8601, defaults to the latest block)",
+        type=datetime.datetime.fromisoformat,
+    )
+    backfill_parser.add_argument(
+        "--step",
+        help="Number of minutes between two backfilled data points",
+        type=int,
+        default=5,
+    )
+    backfill_parser.add_argument(
+        "--tokens",
+        help="Comma separated names of the tokens to backfill (defaults to every token with a primary market)",
+        type=lambda value: [token_name.strip() for token_name in value.split(",")],
+    )
+    backfill_parser.add_argument(
+        "--checkpoint-file",
+        help="File recording the progress of the backfill, an interrupted backfill resumes from it",
+        type=str,
+        default="backfill-checkpoint.json",
+    )
+    backfill_parser.add_argument(
+        "--batch-size",
+        help="Number of JSON-RPC requests per batch",
+        type=int,
+        default=100,
+    )
+    backfill_parser.add_argument(
+        "--max-concurrent-batches",
+        help="Maximum number of JSON-RPC batches in flight at the same time",
+        type=int,
+        default=8,
+    )
+    circuit_breakers_parser = subparsers.add_parser(
+        "circuit-breakers",
+        help="print the state of the circuit breakers of secondary market pairs and providers",
+    )
+    circuit_breakers_parser.add_argument(
+        "--reset",
+        help="close the circuit of the given key, or every circuit with 'all'",
         type=str,
-        **get_env_or_default_or_required("WEB3_PROVIDER"),
     )
     args = parser.parse_args()
+    if args.command != "circuit-breakers" and not args.web3_provider:
+        parser.error("the following arguments are required: -w/--web3-provider")
+
+    # Print or reset circuit breakers and exit
+    if args.command == "circuit-breakers":
+        circuit_breaker = CircuitBreaker(args.circuit_breaker_file)
+        if args.reset:
+            circuit_breaker.reset(None if args.reset == "all" else args.reset)
+        print_circuit_breakers(circuit_breaker)
+        sys.exit(0)
+
+    # Stdout is kept for the data points streamed as NDJSON
+    ndjson = args.ndjson or os.getenv("NDJSON") == "true"
+    if ndjson:
+        logging.getLogger().handlers[0].setStream(sys.stderr)
+    if args.file_sink and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--file-sink requires pyarrow, install it with the arrow extra (uv sync --extra arrow)")
 
     # Load config
     loaded_config = load_config(args.config)
 
-    # Setup web3 provider
-    w3 = Web3(Web3.HTTPProvider(args.web3_provider))
+    # Backfill primary market prices and exit
+    if args.command == "backfill":
+        from web3 import AsyncWeb3
 
-    # Setup secondary market price fetcher
-    if args.secondary_market == SecondaryMarket.PARASWAP:
-        secondary_market_price_fetcher: SecondaryMarketPriceFetcher = ParaswapPriceFetcher(os.getenv("HTTP_PROXY"))
-    else:
-        secondary_market_price_fetcher: SecondaryMarketPriceFetcher = OneInchPriceFetcher(
-            os.getenv("ONE_INCH_API_KEY"), os.getenv("HTTP_PROXY")
+        from backfill import Backfiller
+        from data_storage.FakeDataSaver import FakeDataSaver
+        from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
+
+        backfill_tokens = [
+            token
+            for token in loaded_config["tokens"]
+            if has_primary_market(token) and (args.tokens is None or token["token_name"] in args.tokens)
+        ]
+        if args.dry_run or os.getenv("DRY_RUN") == "true":
+            backfill_data_saver: DataSaver = FakeDataSaver()
+        else:
+            from data_storage.PostgresDataSaver import PostgresDataSaver
+
+            postgres_data_saver = PostgresDataSaver(os.getenv("DATABASE_URL"))
+            # Rows older than the raw retention would be dropped by the next run of the policy, and refreshing the
+            # continuous aggregates over them would delete their buckets
+            raw_retention = postgres_data_saver.get_raw_retention()
+            if raw_retention is not None and args.start.timestamp() < time.time() - raw_retention.total_seconds():
+                postgres_data_saver.close()
+                parser.error(
+                    f"--start is older than the retention of raw prices ({raw_retention}), pause the retention policy "
+                    "before backfilling and resume it once the continuous aggregates are refreshed "
+                    "(see the Backfill section of the README)"
+                )
+            backfill_data_saver = postgres_data_saver
+        backfiller = Backfiller(
+            AsyncWeb3(get_async_web3_provider(args.web3_provider, args.rpc_hedge_percentile)),
+            MulticallPrimaryMarketRateFetcher(args.multicall_address),
+            backfill_data_saver,
+            args.checkpoint_file,
+            args.batch_size,
+            args.max_concurrent_batches,
+        )
+
+        async def run_backfill():
+            try:
+                await backfiller.run(backfill_tokens, args.start, args.end, args.step)
+            finally:
+                await backfiller.close()
+
+        try:
+            asyncio.run(run_backfill())
+        except KeyboardInterrupt:
+            logging.info("Stopping backfill after receiving keyboard interrupt, it will resume from its checkpoint.")
+        except Exception as e:
+            logging.error(f"Backfill failed, it will resume from its checkpoint: {str(e)}")
+            sys.exit(1)
+        finally:
+            backfill_data_saver.close()
+        sys.exit(0)
+
+    # Setup circuit breakers, pairs and providers that keep failing are skipped until their next re-probe
+    circuit_breaker = (
+        CircuitBreaker(args.circuit_breaker_file, args.circuit_breaker_threshold)
+        if args.circuit_breaker_threshold
+        else None
+    )
+
+    from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+    from price_fetcher.HttpSessionConfig import HttpSessionConfig
+    from price_fetcher.OneInchPriceFetcher import OneInchPriceFetcher
+    from price_fetcher.ParaswapPriceFetcher import ParaswapPriceFetcher
+
+    # Setup one rate limiter per secondary market
+    secondary_market_price_fetcher_classes = {
+        SecondaryMarket.PARASWAP: ParaswapPriceFetcher,
+        SecondaryMarket.ONE_INCH: OneInchPriceFetcher,
+    }
+    # Rates adapt to the throttling of each provider and API key
+    rate_limiters = {
+        secondary_market: AdaptiveRateLimiter(
+            args.rate_limit or secondary_market_price_fetcher_classes[secondary_market].default_requests_per_second,
+            args.rate_limit_burst or secondary_market_price_fetcher_classes[secondary_market].default_burst,
+            max_requests_per_second=args.max_rate_limit,
+            max_retries=args.max_retries,
+            provider=secondary_market,
+            api_key=os.getenv("ONE_INCH_API_KEY") if secondary_market == SecondaryMarket.ONE_INCH else None,
         )
+        for secondary_market in args.secondary_market
+    }
+    http_session_config = HttpSessionConfig(args.http_pool_size, args.http_connect_timeout, args.http_read_timeout)
 
-    # Setup data saver
+    # Setup data savers, writes are done in the background so that a slow database or sink does not delay price
+    # fetching
+    from data_storage.QueuedDataSaver import QueuedDataSaver
+
+    data_savers: list[DataSaver] = []
     if args.dry_run or os.getenv("DRY_RUN") == "true":
-        data_saver: DataSaver = FakeDataSaver()
+        pass
+    elif args.spool_dir:
+        from data_storage.PostgresDataSaver import PostgresDataSaver
+        from data_storage.SpooledDataSaver import SpooledDataSaver
+
+        data_savers.append(
+            SpooledDataSaver(
+                PostgresDataSaver(os.getenv("DATABASE_URL")),
+                args.spool_dir,
+                max_spool_bytes=args.max_spool_size * 1024 * 1024,
+            )
+        )
     else:
-        data_saver: DataSaver = PostgresDataSaver(os.getenv("DATABASE_URL"))
+        from data_storage.PostgresDataSaver import PostgresDataSaver
 
-    # Launch
-    if args.long_run or os.getenv("LONG_RUN") == "true":
-        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-fetcher")
+        data_savers.append(QueuedDataSaver(PostgresDataSaver(os.getenv("DATABASE_URL"))))
 
-        def run_main_job():
-            try:
-                main(loaded_config, w3, secondary_market_price_fetcher, data_saver)
-            except Exception as e:
-                logging.error(f"An unexpected error occurred while running the job: {str(e)}")
+    if args.file_sink:
+        from data_storage.FileDataSaver import FileDataSaver
 
-        def schedule_run():
-            executor.submit(run_main_job)
+        data_savers.append(
+            QueuedDataSaver(
+                FileDataSaver(args.file_sink, args.file_format, args.row_group_size, args.file_roll_interval)
+            )
+        )
+    if ndjson:
+        from data_storage.NdjsonDataSaver import NdjsonDataSaver
 
-        schedule.every(args.schedule).minutes.at(":00").do(schedule_run)
-        logging.info(f"Started. Price fetching will run every {args.schedule} minutes.")
+        data_savers.append(QueuedDataSaver(NdjsonDataSaver()))
 
-        try:
-            while True:
-                try:
-                    schedule.run_pending()
-                except Exception as e:
-                    logging.error(f"An unexpected error occurred while scheduling: {str(e)}")
+    if not data_savers:
+        from data_storage.FakeDataSaver import FakeDataSaver
+
+        data_saver: DataSaver = QueuedDataSaver(FakeDataSaver())
+    elif len(data_savers) == 1:
+        data_saver: DataSaver = data_savers[0]
+    else:
+        from data_storage.TeeDataSaver import TeeDataSaver
+
+        data_saver: DataSaver = TeeDataSaver(data_savers)
+
+    long_run = args.long_run or os.getenv("LONG_RUN") == "true"
+    depth_ladder = DepthLadder(args.depth_ladder) if args.depth_ladder else None
+    if long_run and args.metrics_port:
+        from metrics import start_metrics_server
+
+        start_metrics_server(args.metrics_port)
+
+    # Setup shard leases, token / chain pairs are split between the workers sharing the database
+    if args.shard_count:
+        from sharding.ShardLeaseManager import ShardLeaseManager
+
+        shard_lease_manager = ShardLeaseManager(
+            os.getenv("DATABASE_URL"),
+            args.shard_count,
+            args.lease_ttl or 2 * args.schedule * 60,
+            args.worker_id,
+        )
+    else:
+        shard_lease_manager = None
+
+    # Setup per-pair schedule, each cycle only fetches the pairs due at its tick
+    if long_run:
+        from pair_scheduler import PairScheduler
+
+        pair_scheduler = PairScheduler(
+            loaded_config,
+            args.schedule,
+            args.adaptive_schedule or os.getenv("ADAPTIVE_SCHEDULE") == "true",
+            args.min_interval,
+            args.max_interval,
+            args.premium_change_threshold / 100,
+        )
+    else:
+        pair_scheduler = None
+    # Cycles start every tick of the pair scheduler, which is shorter than the schedule with per-pair intervals
+    cycle_timeout = args.cycle_timeout or (pair_scheduler.tick_interval * 60 if pair_scheduler else None)
+
+    def get_pair_filter() -> Optional[Callable[[str, str], bool]]:
+        """
+        Leases the shards of the cycle and returns the filter of the pairs they contain
+        """
+        if shard_lease_manager is None:
+            return None
+        shards = shard_lease_manager.acquire_shards()
+        return lambda token_name, chain: shard_lease_manager.get_shard(token_name, chain) in shards
 
-                idle_seconds = schedule.idle_seconds()
-                if idle_seconds is None:
-                    idle_seconds = 1
+    # Launch with asyncio
+    if args.async_mode or os.getenv("ASYNC_MODE") == "true":
+        from web3 import AsyncWeb3
+
+        import async_main
+        from price_fetcher.AsyncCircuitBreakerPriceFetcher import AsyncCircuitBreakerPriceFetcher
+        from price_fetcher.AsyncCompositePriceFetcher import AsyncCompositePriceFetcher
+        from price_fetcher.AsyncOneInchPriceFetcher import AsyncOneInchPriceFetcher
+        from price_fetcher.AsyncParaswapPriceFetcher import AsyncParaswapPriceFetcher
+        from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+        from price_fetcher.CachedPrimaryMarketRateFetcher import CachedPrimaryMarketRateFetcher
+
+        # Setup primary market rate fetcher, rates are cached until a block or rate update event invalidates them
+        primary_market_rate_fetcher = CachedPrimaryMarketRateFetcher(args.multicall_address)
+
+        async_w3 = AsyncWeb3(
+            get_async_web3_provider(args.web3_provider, args.rpc_hedge_percentile, cache_allowed_requests=True)
+        )
+        async_price_fetchers: list[AsyncSecondaryMarketPriceFetcher] = [
+            AsyncParaswapPriceFetcher(os.getenv("HTTP_PROXY"), rate_limiters[secondary_market], http_session_config)
+            if secondary_market == SecondaryMarket.PARASWAP
+            else AsyncOneInchPriceFetcher(
+                os.getenv("ONE_INCH_API_KEY"),
+                os.getenv("HTTP_PROXY"),
+                rate_limiters[secondary_market],
+                http_session_config,
+            )
+            for secondary_market in args.secondary_market
+        ]
+        if circuit_breaker:
+            async_price_fetchers = [
+                AsyncCircuitBreakerPriceFetcher(price_fetcher, circuit_breaker)
+                for price_fetcher in async_price_fetchers
+            ]
+        if len(async_price_fetchers) == 1:
+            async_price_fetcher = async_price_fetchers[0]
+        else:
+            async_price_fetcher = AsyncCompositePriceFetcher(
+                async_price_fetchers, args.quote_policy, args.hedge_percentile
+            )
+
+        async def run_async_main_job():
+            pair_filter, primary_market_filter = await asyncio.to_thread(get_pair_filter), None
+            if pair_scheduler:
+                due_pairs = pair_scheduler.pop_due_pairs()
+                if not due_pairs:
+                    logging.debug("No pair due, skipping cycle")
+                    return
+                pair_filter, primary_market_filter = pair_scheduler.get_pair_filters(due_pairs, pair_filter)
+
+            data_points = await async_main.main(
+                loaded_config,
+                async_w3,
+                async_price_fetcher,
+                data_saver,
+                args.max_concurrency,
+                primary_market_rate_fetcher,
+                cycle_timeout,
+                depth_ladder,
+                pair_filter,
+                primary_market_filter,
+            )
+            if pair_scheduler:
+                pair_scheduler.record_data_points(data_points)
+
+        async def run_async():
+            try:
+                if long_run:
+                    logging.info(f"Started. Due pairs will be fetched every {pair_scheduler.tick_interval} minutes.")
+                    await async_main.run_periodically(
+                        run_async_main_job, pair_scheduler.tick_interval, args.overlap_policy, args.max_concurrent_runs
+                    )
                 else:
-                    idle_seconds = max(0, idle_seconds)
-                time.sleep(idle_seconds)
+                    try:
+                        await run_async_main_job()
+                    except Exception as e:
+                        logging.error(f"An unexpected error occurred: {str(e)}")
+            finally:
+                await async_price_fetcher.close()
+                data_saver.close()
+                if shard_lease_manager:
+                    shard_lease_manager.close()
+
+        try:
+            asyncio.run(run_async())
         except KeyboardInterrupt:
             logging.info("Stopping scheduler after receiving keyboard interrupt.")
-        finally:
-            executor.shutdown(wait=True)
     else:
-        try:
-            main(loaded_config, w3, secondary_market_price_fetcher, data_saver)
-        except Exception as e:
-            logging.error(f"An unexpected error occurred: {str(e)}")
+        from price_fetcher.CircuitBreakerPriceFetcher import CircuitBreakerPriceFetcher
+        from price_fetcher.CompositePriceFetcher import CompositePriceFetcher
+
+        # Setup secondary market price fetchers
+        secondary_market_price_fetchers: list[SecondaryMarketPriceFetcher] = [
+            ParaswapPriceFetcher(os.getenv("HTTP_PROXY"), rate_limiters[secondary_market], http_session_config)
+            if secondary_market == SecondaryMarket.PARASWAP
+            else OneInchPriceFetcher(
+                os.getenv("ONE_INCH_API_KEY"),
+                os.getenv("HTTP_PROXY"),
+                rate_limiters[secondary_market],
+                http_session_config,
+            )
+            for secondary_market in args.secondary_market
+        ]
+        if circuit_breaker:
+            secondary_market_price_fetchers = [
+                CircuitBreakerPriceFetcher(price_fetcher, circuit_breaker)
+                for price_fetcher in secondary_market_price_fetchers
+            ]
+        if len(secondary_market_price_fetchers) == 1:
+            secondary_market_price_fetcher = secondary_market_price_fetchers[0]
+        else:
+            # Each quote of the cycle can have a request and a hedged request in flight per secondary market
+            secondary_market_price_fetcher = CompositePriceFetcher(
+                secondary_market_price_fetchers,
+                args.quote_policy,
+                args.hedge_percentile,
+                max_workers=2 * len(secondary_market_price_fetchers) * args.max_concurrency,
+            )
+
+        # Launch
+        if long_run:
+            import schedule
+            from web3 import Web3
+
+            from cycle_runner import CycleRunner
+            from price_fetcher.CachedPrimaryMarketRateFetcher import CachedPrimaryMarketRateFetcher
+
+            # Setup web3 provider and primary market rate fetcher, rates are cached until a block or rate update event
+            # invalidates them
+            w3 = Web3(get_web3_provider(args.web3_provider, args.rpc_hedge_percentile, cache_allowed_requests=True))
+            primary_market_rate_fetcher = CachedPrimaryMarketRateFetcher(args.multicall_address)
+
+            def run_main_job():
+                # Shard leases are renewed at every tick, even when no pair is due
+                pair_filter = get_pair_filter()
+                due_pairs = pair_scheduler.pop_due_pairs()
+                if not due_pairs:
+                    logging.debug("No pair due, skipping cycle")
+                    return
+
+                data_points = main(
+                    loaded_config,
+                    w3,
+                    secondary_market_price_fetcher,
+                    data_saver,
+                    args.max_concurrency,
+                    primary_market_rate_fetcher,
+                    cycle_timeout,
+                    depth_ladder,
+                    *pair_scheduler.get_pair_filters(due_pairs, pair_filter),
+                )
+                pair_scheduler.record_data_points(data_points)
+
+            cycle_runner = CycleRunner(run_main_job, args.overlap_policy, args.max_concurrent_runs)
+            schedule.every(pair_scheduler.tick_interval).minutes.at(":00").do(cycle_runner.submit)
+            logging.info(f"Started. Due pairs will be fetched every {pair_scheduler.tick_interval} minutes.")
+
+            try:
+                while True:
+                    try:
+                        schedule.run_pending()
+                    except Exception as e:
+                        logging.error(f"An unexpected error occurred while scheduling: {str(e)}")
+
+                    idle_seconds = schedule.idle_seconds()
+                    if idle_seconds is None:
+                        idle_seconds = 1
+                    else:
+                        idle_seconds = max(0, idle_seconds)
+                    time.sleep(idle_seconds)
+            except KeyboardInterrupt:
+                logging.info("Stopping scheduler after receiving keyboard interrupt.")
+            finally:
+                cycle_runner.shutdown()
+                secondary_market_price_fetcher.close()
+                data_saver.close()
+                if shard_lease_manager:
+                    shard_lease_manager.close()
+        else:
+            from price_fetcher.JsonRpcClient import JsonRpcClient
+            from price_fetcher.MulticallPrimaryMarketRateFetcher import MulticallPrimaryMarketRateFetcher
+
+            # A single cycle has nothing to cache, and its rates are read with one eth_call that does not need web3
+            json_rpc_client = JsonRpcClient(get_endpoint_uris(args.web3_provider), http_session_config)
+            try:
+                main(
+                    loaded_config,
+                    json_rpc_client,
+                    secondary_market_price_fetcher,
+                    data_saver,
+                    args.max_concurrency,
+                    MulticallPrimaryMarketRateFetcher(args.multicall_address),
+                    cycle_timeout,
+                    depth_ladder,
+                    get_pair_filter(),
+                )
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {str(e)}")
+            finally:
+                json_rpc_client.close()
+                secondary_market_price_fetcher.close()
+                data_saver.close()
+                if shard_lease_manager:
+                    shard_lease_manager.close()
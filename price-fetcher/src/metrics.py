@@ -0,0 +1,107 @@
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from utils import chains
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+quote_latency_seconds = Histogram(
+    "price_fetcher_quote_latency_seconds",
+    "Latency of secondary market quote requests, excluding rate limiting",
+    ["provider", "chain"],
+    buckets=LATENCY_BUCKETS,
+)
+rpc_call_latency_seconds = Histogram(
+    "price_fetcher_rpc_call_latency_seconds",
+    "Latency of JSON-RPC calls to the Web3 provider",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+rpc_endpoint_requests_total = Counter(
+    "price_fetcher_rpc_endpoint_requests_total",
+    "Number of JSON-RPC requests sent to each endpoint of the RPC provider pool, by outcome",
+    ["endpoint", "outcome"],
+)
+rpc_hedged_requests_total = Counter(
+    "price_fetcher_rpc_hedged_requests_total",
+    "Number of slow JSON-RPC requests hedged to another endpoint of the RPC provider pool",
+    ["endpoint"],
+)
+errors_total = Counter(
+    "price_fetcher_errors_total",
+    "Errors raised while fetching or saving prices, by exception type",
+    ["exception"],
+)
+cycle_data_points = Histogram(
+    "price_fetcher_cycle_data_points",
+    "Number of data points saved per fetching cycle",
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+rows_written_total = Counter(
+    "price_fetcher_rows_written_total",
+    "Number of rows inserted in the database",
+)
+cycle_duration_seconds = Histogram(
+    "price_fetcher_cycle_duration_seconds",
+    "Duration of fetching cycles",
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+scheduler_lag_seconds = Histogram(
+    "price_fetcher_scheduler_lag_seconds",
+    "Delay between the time a fetching cycle was due and the time it started",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+rate_limit_requests_per_second = Gauge(
+    "price_fetcher_rate_limit_requests_per_second",
+    "Current request rate allowed to a secondary market provider",
+    ["provider", "api_key"],
+)
+throttle_events_total = Counter(
+    "price_fetcher_throttle_events_total",
+    "Number of 429 responses from a secondary market provider",
+    ["provider", "api_key"],
+)
+request_retries_total = Counter(
+    "price_fetcher_request_retries_total",
+    "Number of retried requests to a secondary market provider",
+    ["provider", "api_key"],
+)
+circuit_breaker_skipped_requests_total = Counter(
+    "price_fetcher_circuit_breaker_skipped_requests_total",
+    "Number of secondary market requests skipped because the circuit of their pair or provider is open",
+    ["provider"],
+)
+
+_chain_names = {chain["chain_id"]: chain_name for chain_name, chain in chains.items()}
+
+
+def get_chain_label(chain_id: int) -> str:
+    """
+    Returns the name of a chain for metric labels, its id if it is not a known chain
+
+    Args:
+        chain_id (int): chain id
+    """
+    return _chain_names.get(chain_id, str(chain_id))
+
+
+def record_error(exception: BaseException):
+    """
+    Counts an error by exception type
+
+    Args:
+        exception (BaseException): raised exception
+    """
+    errors_total.labels(type(exception).__name__).inc()
+
+
+def start_metrics_server(port: int):
+    """
+    Serves the metrics on /metrics from a background thread
+
+    Args:
+        port (int): HTTP port
+    """
+    start_http_server(port)
+    logging.info(f"Serving metrics on port {port}")
@@ -0,0 +1,176 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from data_storage.DataSaver import DataPoint
+from utils import has_primary_market
+
+PRIMARY_MARKET = "primary_market"
+SECONDARY_MARKET = "secondary_market"
+
+
+class Pair(NamedTuple):
+    token_name: str
+    chain: str
+    market: str
+
+
+class PairScheduler:
+    """
+    Priority queue of the next due time of each token / chain / market pair.
+
+    Intervals are read in minutes from the `intervals` objects of the config and of its tokens (token values win):
+    `primary_market` for the primary market price, `secondary_market` for the secondary market prices and a chain name
+    for the secondary market price on that chain. Pairs without interval use `default_interval`.
+
+    In adaptive mode, the interval of a secondary market pair is halved (down to `min_interval`) when its premium moved
+    by at least `premium_change_threshold` since its previous price, and doubled (up to `max_interval`) otherwise.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        default_interval: int,
+        adaptive: bool = False,
+        min_interval: int = 1,
+        max_interval: int = 60,
+        premium_change_threshold: float = 0.0005,
+    ):
+        self.adaptive = adaptive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.premium_change_threshold = premium_change_threshold
+
+        self._intervals: dict[Pair, int] = {}
+        for token in config["tokens"]:
+            intervals = {**config.get("intervals", {}), **token.get("intervals", {})}
+            # Tokens without primary market still have their secondary market prices fetched
+            if has_primary_market(token):
+                self._intervals[Pair(token["token_name"], "ethereum", PRIMARY_MARKET)] = intervals.get(
+                    PRIMARY_MARKET, default_interval
+                )
+            for chain in token["token_addresses"]:
+                self._intervals[Pair(token["token_name"], chain, SECONDARY_MARKET)] = intervals.get(
+                    chain, intervals.get(SECONDARY_MARKET, default_interval)
+                )
+
+        self._queue: list[tuple[float, Pair]] = []
+        self._next_due_at: dict[Pair, float] = {}
+        self._last_due_at: dict[Pair, float] = {}
+        self._last_premiums: dict[Pair, float] = {}
+        # Cycles can run concurrently with the allow overlap policy
+        self._lock = threading.Lock()
+
+        # Every pair is due at the first tick
+        for pair in self._intervals:
+            self._schedule(pair, 0)
+
+    @property
+    def tick_interval(self) -> int:
+        """
+        Number of minutes between two ticks, so that every interval is a multiple of it
+        """
+        intervals = list(self._intervals.values())
+        if self.adaptive:
+            intervals += [self.min_interval, self.max_interval]
+        return math.gcd(*intervals) or 1
+
+    def _schedule(self, pair: Pair, due_at: float):
+        self._next_due_at[pair] = due_at
+        heapq.heappush(self._queue, (due_at, pair))
+
+    def _get_next_due_at(self, pair: Pair, last_due_at: float, now: float) -> float:
+        interval = self._intervals[pair] * 60
+        return last_due_at + max(1, math.ceil((now - last_due_at) / interval)) * interval
+
+    def pop_due_pairs(self, now: Optional[float] = None) -> frozenset[Pair]:
+        """
+        Pops the pairs due at `now` (defaults to the current time) and schedules their next fetch
+
+        Returns:
+            frozenset[Pair]: pairs to fetch in the cycle
+        """
+        now = time.time() if now is None else now
+        # Pairs due within the next second are fetched with the cycle of the tick they belong to
+        due_pairs = set()
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now + 1:
+                due_at, pair = heapq.heappop(self._queue)
+                if self._next_due_at.get(pair) != due_at:
+                    # Rescheduled in the meantime
+                    continue
+                due_pairs.add(pair)
+                # Pairs of the first tick are aligned on its minute
+                self._last_due_at[pair] = due_at or math.floor(now / 60) * 60
+                self._schedule(pair, self._get_next_due_at(pair, self._last_due_at[pair], now))
+        return frozenset(due_pairs)
+
+    def get_next_due_at(self) -> Optional[float]:
+        """
+        Returns the time at which the next pair is due, None if there is no pair
+        """
+        with self._lock:
+            while self._queue and self._next_due_at.get(self._queue[0][1]) != self._queue[0][0]:
+                heapq.heappop(self._queue)
+            return self._queue[0][0] if self._queue else None
+
+    def record_data_points(self, data_points: list[Optional[DataPoint]], now: Optional[float] = None):
+        """
+        Adapts the interval of the secondary market pairs of saved data points to the change of their premium
+
+        Args:
+            data_points (list[Optional[DataPoint]]): data points of a fetching cycle, None values are skipped
+            now (Optional[float]): current time, defaults to time.time()
+        """
+        if not self.adaptive:
+            return
+
+        now = time.time() if now is None else now
+        with self._lock:
+            for data_point in data_points:
+                if data_point is None or data_point.is_primary_market:
+                    continue
+                pair = Pair(data_point.token_name, data_point.network, SECONDARY_MARKET)
+                if pair not in self._intervals:
+                    continue
+
+                last_premium = self._last_premiums.get(pair)
+                self._last_premiums[pair] = data_point.premium
+                if last_premium is None:
+                    continue
+
+                interval = self._intervals[pair]
+                if abs(data_point.premium - last_premium) >= self.premium_change_threshold:
+                    self._intervals[pair] = max(self.min_interval, interval // 2)
+                else:
+                    self._intervals[pair] = min(self.max_interval, interval * 2)
+                if self._intervals[pair] != interval:
+                    logging.debug(f"Polling {pair.token_name} on {pair.chain} every {self._intervals[pair]} minutes")
+                    self._schedule(pair, self._get_next_due_at(pair, self._last_due_at[pair], now))
+
+    def get_pair_filters(
+        self, due_pairs: frozenset[Pair], pair_filter: Optional[Callable[[str, str], bool]] = None
+    ) -> tuple[Callable[[str, str], bool], Callable[[str], bool]]:
+        """
+        Returns the filters of the due secondary and primary market pairs, restricted to the pairs accepted by
+        `pair_filter` if any
+
+        Args:
+            due_pairs (frozenset[Pair]): pairs of the cycle
+            pair_filter (Optional[Callable[[str, str], bool]]): returns whether a token name / chain pair is fetched
+        """
+
+        def secondary_market_filter(token_name: str, chain: str) -> bool:
+            return Pair(token_name, chain, SECONDARY_MARKET) in due_pairs and (
+                pair_filter is None or pair_filter(token_name, chain)
+            )
+
+        def primary_market_filter(token_name: str) -> bool:
+            return Pair(token_name, "ethereum", PRIMARY_MARKET) in due_pairs and (
+                pair_filter is None or pair_filter(token_name, "ethereum")
+            )
+
+        return secondary_market_filter, primary_market_filter
@@ -0,0 +1,172 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from metrics import rate_limit_requests_per_second, request_retries_total, throttle_events_total
+from price_fetcher.TokenBucketRateLimiter import TokenBucketRateLimiter
+
+# time.monotonic() value after which failed requests are not retried anymore, set for each fetching cycle
+retry_deadline: ContextVar[Optional[float]] = ContextVar("retry_deadline", default=None)
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class AdaptiveRateLimiter(TokenBucketRateLimiter):
+    """
+    Token bucket whose rate follows the responses of a secondary market provider (AIMD):
+    - each successful request adds `additive_increase / requests_per_second` requests per second, i.e. the rate grows
+      by `additive_increase` requests per second every second, up to `max_requests_per_second`
+    - a 429 response halves the rate (down to `min_requests_per_second`), at most once per `burst / rate` seconds since
+      responses to the requests already in flight arrive afterwards
+    - `Retry-After` headers and provider rate limit headers (`X-RateLimit-Remaining` / `X-RateLimit-Reset` and their
+      `RateLimit-` counterparts) with no request left hold every request until the given time
+
+    Failed requests with a retryable status are retried after a jittered exponential backoff, as long as the retry
+    fits before the `retry_deadline` of the fetching cycle.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        burst: int = 1,
+        max_requests_per_second: Optional[float] = None,
+        min_requests_per_second: Optional[float] = None,
+        additive_increase: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30,
+        provider: str = "",
+        api_key: Optional[str] = None,
+    ):
+        super().__init__(requests_per_second, burst)
+        self.max_requests_per_second = max(requests_per_second, max_requests_per_second or requests_per_second)
+        self.min_requests_per_second = min(requests_per_second, min_requests_per_second or requests_per_second / 20)
+        self.additive_increase = additive_increase or requests_per_second / 10
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._held_until = 0.0
+        self._decreased_at = -float("inf")
+        # API keys are identified by a digest in metrics
+        api_key_label = hashlib.sha256(api_key.encode()).hexdigest()[:8] if api_key else "none"
+        self._rate_gauge = rate_limit_requests_per_second.labels(provider, api_key_label)
+        self._throttle_counter = throttle_events_total.labels(provider, api_key_label)
+        self._retry_counter = request_retries_total.labels(provider, api_key_label)
+        self._rate_gauge.set(requests_per_second)
+
+    def _set_rate(self, requests_per_second: float):
+        """
+        Changes the rate, must be called with the lock held
+        """
+        now = time.monotonic()
+        # Refill the bucket at the previous rate up to now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.requests_per_second)
+        self._updated_at = now
+        self.requests_per_second = requests_per_second
+        self._rate_gauge.set(requests_per_second)
+
+    def reserve(self) -> float:
+        delay = super().reserve()
+        with self._lock:
+            return max(delay, self._held_until - time.monotonic())
+
+    def has_spare_token(self) -> bool:
+        with self._lock:
+            if self._held_until > time.monotonic():
+                return False
+        return super().has_spare_token()
+
+    def hold(self, seconds: float):
+        """
+        Holds every request for the given number of seconds
+        """
+        with self._lock:
+            self._held_until = max(self._held_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def get_hold_duration(headers: Mapping[str, str]) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before the next request according to the `Retry-After` or rate limit
+        headers of a response, None if they do not ask to wait
+        """
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+        for prefix in ("X-RateLimit-", "RateLimit-"):
+            remaining, reset = headers.get(f"{prefix}Remaining"), headers.get(f"{prefix}Reset")
+            if remaining is None or reset is None:
+                continue
+            try:
+                if float(remaining) > 0:
+                    return None
+                reset = float(reset)
+            except ValueError:
+                continue
+            # Reset is either a number of seconds or a unix timestamp
+            return max(0.0, reset - time.time() if reset > 1_000_000_000 else reset)
+        return None
+
+    def record_response(self, status_code: int, headers: Mapping[str, str]):
+        """
+        Adapts the rate to the response of a request
+
+        Args:
+            status_code (int): HTTP status code
+            headers (Mapping[str, str]): response headers
+        """
+        hold_duration = self.get_hold_duration(headers)
+        if hold_duration:
+            self.hold(hold_duration)
+
+        with self._lock:
+            if status_code == 429:
+                self._throttle_counter.inc()
+                now = time.monotonic()
+                if now - self._decreased_at < self.burst / self.requests_per_second:
+                    return
+                self._decreased_at = now
+                self._set_rate(max(self.min_requests_per_second, self.requests_per_second * self.decrease_factor))
+                # Requests already allowed by the bucket would hit the limit as well
+                self._tokens = min(self._tokens, 0.0)
+            elif status_code < 400 and self.requests_per_second < self.max_requests_per_second:
+                self._set_rate(
+                    min(
+                        self.max_requests_per_second,
+                        self.requests_per_second + self.additive_increase / self.requests_per_second,
+                    )
+                )
+
+    def get_retry_delay(self, status_code: int, attempt: int) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before retrying a failed request (on top of the rate limiting), None if
+        it must not be retried
+
+        Args:
+            status_code (int): HTTP status code of the response
+            attempt (int): number of retries already made for the request
+        """
+        if status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+            return None
+
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2**attempt))
+        deadline = retry_deadline.get()
+        with self._lock:
+            held_for = max(0.0, self._held_until - time.monotonic())
+        if deadline is not None and time.monotonic() + max(delay, held_for) >= deadline:
+            return None
+
+        self._retry_counter.inc()
+        return delay
@@ -0,0 +1,55 @@
+from metrics import circuit_breaker_skipped_requests_total
+from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+from price_fetcher.CircuitBreaker import CircuitBreaker
+from price_fetcher.SecondaryMarketPriceFetcher import (
+    CannotGetPriceException,
+    CircuitOpenException,
+    ProviderUnavailableException,
+    UnsupportedTokenException,
+)
+
+
+class AsyncCircuitBreakerPriceFetcher(AsyncSecondaryMarketPriceFetcher):
+    """
+    Asyncio counterpart of CircuitBreakerPriceFetcher
+    """
+
+    def __init__(self, price_fetcher: AsyncSecondaryMarketPriceFetcher, circuit_breaker: CircuitBreaker):
+        self.price_fetcher = price_fetcher
+        self.circuit_breaker = circuit_breaker
+        self.name = price_fetcher.name
+        self.rate_limiter = price_fetcher.rate_limiter
+        self.latency_tracker = price_fetcher.latency_tracker
+        self._skipped_counter = circuit_breaker_skipped_requests_total.labels(self.name)
+
+    async def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        provider_key = self.circuit_breaker.get_provider_key(self.name)
+        pair_key = self.circuit_breaker.get_pair_key(self.name, chain_id, src_token_address, dst_token_address)
+        try:
+            self.circuit_breaker.check(provider_key)
+            self.circuit_breaker.check(pair_key)
+        except CircuitOpenException:
+            self._skipped_counter.inc()
+            raise
+
+        is_pair_quote = amount == self.one_ether
+        try:
+            amount_out = await self.price_fetcher.get_amount_out(chain_id, src_token_address, dst_token_address, amount)
+        except ProviderUnavailableException as e:
+            self.circuit_breaker.record_failure(provider_key, e)
+            raise
+        except (UnsupportedTokenException, CannotGetPriceException) as e:
+            # The provider answered, the pair failed
+            self.circuit_breaker.record_success(provider_key)
+            if is_pair_quote:
+                self.circuit_breaker.record_failure(pair_key, e)
+            raise
+
+        self.circuit_breaker.record_success(provider_key)
+        if is_pair_quote:
+            self.circuit_breaker.record_success(pair_key)
+        return amount_out
+
+    async def close(self):
+        await self.price_fetcher.close()
+        self.circuit_breaker.save()
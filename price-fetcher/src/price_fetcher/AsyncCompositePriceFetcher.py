@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+from price_fetcher.CompositePriceFetcher import CompositePriceFetcher
+from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketQuote
+from utils import QuotePolicy
+
+
+class AsyncCompositePriceFetcher(AsyncSecondaryMarketPriceFetcher):
+    """
+    Asyncio counterpart of CompositePriceFetcher, requests that are not needed anymore are cancelled
+    """
+
+    name = CompositePriceFetcher.name
+
+    def __init__(
+        self,
+        price_fetchers: list[AsyncSecondaryMarketPriceFetcher],
+        policy: QuotePolicy = QuotePolicy.BEST,
+        hedge_percentile: Optional[float] = 95,
+    ):
+        if not price_fetchers:
+            raise ValueError("At least one price fetcher is required")
+        if len({price_fetcher.name for price_fetcher in price_fetchers}) != len(price_fetchers):
+            raise ValueError("Price fetchers must quote different providers")
+
+        self.price_fetchers = price_fetchers
+        self.policy = policy
+        self.hedge_percentile = hedge_percentile
+
+    def get_hedge_delay(self, price_fetcher: AsyncSecondaryMarketPriceFetcher) -> Optional[float]:
+        """
+        Returns the number of seconds after which a request to the given provider is hedged, None if it is not
+        """
+        if not self.hedge_percentile or price_fetcher.latency_tracker is None:
+            return None
+        return price_fetcher.latency_tracker.percentile(self.hedge_percentile)
+
+    @staticmethod
+    def can_hedge(price_fetcher: AsyncSecondaryMarketPriceFetcher) -> bool:
+        """
+        Returns whether a hedged request can be sent to the given provider right away, a hedged request waiting for
+        the rate limiter would only arrive after the request it hedges
+        """
+        return price_fetcher.rate_limiter is None or price_fetcher.rate_limiter.has_spare_token()
+
+    async def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        return (await self.get_amount_out_quote(chain_id, src_token_address, dst_token_address, amount)).price
+
+    async def get_quote(self, chain_id: int, token_address: str, eth_token_address: str) -> SecondaryMarketQuote:
+        return await self.get_amount_out_quote(chain_id, token_address, eth_token_address, self.one_ether)
+
+    async def get_amount_out_quote(
+        self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int
+    ) -> SecondaryMarketQuote:
+        args = (chain_id, src_token_address, dst_token_address, amount)
+        started_at = time.monotonic()
+        attempts: dict[asyncio.Task, AsyncSecondaryMarketPriceFetcher] = {}
+        hedge_deadlines: dict[str, float] = {}
+        for price_fetcher in self.price_fetchers:
+            attempts[asyncio.create_task(price_fetcher.get_amount_out(*args))] = price_fetcher
+            hedge_delay = self.get_hedge_delay(price_fetcher)
+            if hedge_delay is not None:
+                hedge_deadlines[price_fetcher.name] = started_at + hedge_delay
+
+        prices: dict[str, int] = {}
+        errors: dict[str, Exception] = {}
+        pending = set(attempts)
+        try:
+            while pending and not (self.policy == QuotePolicy.FIRST_GOOD and prices):
+                timeout = max(0.0, min(hedge_deadlines.values()) - time.monotonic()) if hedge_deadlines else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    provider_name = attempts[task].name
+                    if provider_name in prices:
+                        continue
+                    try:
+                        prices[provider_name] = task.result()
+                    except Exception as e:
+                        errors[provider_name] = e
+                        if any(attempts[other].name == provider_name for other in pending):
+                            # The hedged request can still succeed
+                            continue
+                    hedge_deadlines.pop(provider_name, None)
+
+                # The other request to a provider that already answered lost the race
+                for task in pending:
+                    if attempts[task].name in prices:
+                        task.cancel()
+                pending = {task for task in pending if attempts[task].name not in prices}
+
+                now = time.monotonic()
+                for provider_name, deadline in list(hedge_deadlines.items()):
+                    if deadline > now:
+                        continue
+                    del hedge_deadlines[provider_name]
+                    price_fetcher = next(fetcher for fetcher in self.price_fetchers if fetcher.name == provider_name)
+                    if not self.can_hedge(price_fetcher):
+                        logging.debug(f"Not hedging {provider_name} quote, its rate limiter has no spare token")
+                        continue
+                    logging.debug(f"Hedging {provider_name} quote for {src_token_address} on chain {chain_id}")
+                    hedged_task = asyncio.create_task(price_fetcher.get_amount_out(*args))
+                    attempts[hedged_task] = price_fetcher
+                    pending.add(hedged_task)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return CompositePriceFetcher.select_quote(self.policy, prices, errors)
+
+    async def close(self):
+        for price_fetcher in self.price_fetchers:
+            await price_fetcher.close()
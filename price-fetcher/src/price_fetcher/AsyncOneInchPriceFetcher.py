@@ -0,0 +1,49 @@
+from typing import Optional
+
+from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+from price_fetcher.HttpSessionConfig import HttpSessionConfig
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.OneInchPriceFetcher import OneInchPriceFetcher
+from price_fetcher.ProviderRequester import ProviderRequester
+from price_fetcher.SecondaryMarketPriceFetcher import UnsupportedChainException
+
+
+class AsyncOneInchPriceFetcher(AsyncSecondaryMarketPriceFetcher):
+    name = OneInchPriceFetcher.name
+    default_requests_per_second = OneInchPriceFetcher.default_requests_per_second
+    default_burst = OneInchPriceFetcher.default_burst
+    supports_http2 = OneInchPriceFetcher.supports_http2
+    supported_chain_ids = OneInchPriceFetcher.supported_chain_ids
+
+    def __init__(
+        self,
+        one_inch_api_key: str,
+        http_proxy: Optional[str],
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        http_session_config: Optional[HttpSessionConfig] = None,
+    ):
+        self.one_inch_api_key = one_inch_api_key
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            self.default_requests_per_second, self.default_burst, provider=self.name
+        )
+        self.session = (http_session_config or HttpSessionConfig()).create_async_client(
+            http_proxy, self.supports_http2, headers={"Authorization": one_inch_api_key or ""}
+        )
+        self.latency_tracker = LatencyTracker()
+        self.requester = ProviderRequester(self.name, "1inch", self.rate_limiter, self.latency_tracker)
+
+    async def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        if chain_id not in self.supported_chain_ids:
+            raise UnsupportedChainException(f"Chain id {chain_id} is not supported by 1inch")
+
+        return await self.requester.get_async(
+            self.session,
+            OneInchPriceFetcher.get_quote_url(chain_id, src_token_address, dst_token_address, amount),
+            chain_id,
+            src_token_address,
+            OneInchPriceFetcher.parse_quote,
+        )
+
+    async def close(self):
+        await self.session.aclose()
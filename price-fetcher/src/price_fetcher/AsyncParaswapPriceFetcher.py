@@ -0,0 +1,45 @@
+from typing import Optional
+
+from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+from price_fetcher.AsyncSecondaryMarketPriceFetcher import AsyncSecondaryMarketPriceFetcher
+from price_fetcher.HttpSessionConfig import HttpSessionConfig
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.ParaswapPriceFetcher import ParaswapPriceFetcher
+from price_fetcher.ProviderRequester import ProviderRequester
+from price_fetcher.SecondaryMarketPriceFetcher import UnsupportedChainException
+
+
+class AsyncParaswapPriceFetcher(AsyncSecondaryMarketPriceFetcher):
+    name = ParaswapPriceFetcher.name
+    default_requests_per_second = ParaswapPriceFetcher.default_requests_per_second
+    default_burst = ParaswapPriceFetcher.default_burst
+    supports_http2 = ParaswapPriceFetcher.supports_http2
+    supported_chain_ids = ParaswapPriceFetcher.supported_chain_ids
+
+    def __init__(
+        self,
+        http_proxy: Optional[str],
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        http_session_config: Optional[HttpSessionConfig] = None,
+    ):
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            self.default_requests_per_second, self.default_burst, provider=self.name
+        )
+        self.session = (http_session_config or HttpSessionConfig()).create_async_client(http_proxy, self.supports_http2)
+        self.latency_tracker = LatencyTracker()
+        self.requester = ProviderRequester(self.name, "Paraswap", self.rate_limiter, self.latency_tracker)
+
+    async def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        if chain_id not in self.supported_chain_ids:
+            raise UnsupportedChainException(f"Chain id {chain_id} is not supported by Paraswap")
+
+        return await self.requester.get_async(
+            self.session,
+            ParaswapPriceFetcher.get_quote_url(chain_id, src_token_address, dst_token_address, amount),
+            chain_id,
+            src_token_address,
+            ParaswapPriceFetcher.parse_quote,
+        )
+
+    async def close(self):
+        await self.session.aclose()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from web3 import AsyncHTTPProvider
+from web3._utils.caching import async_handle_request_caching
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from metrics import rpc_endpoint_requests_total, rpc_hedged_requests_total
+from price_fetcher.RpcEndpointHealth import RpcEndpointException, RpcEndpointHealth, is_rate_limited
+from price_fetcher.RpcProviderPool import NON_IDEMPOTENT_METHODS
+
+
+class AsyncRpcProviderPool(AsyncJSONBaseProvider):
+    """
+    Asyncio version of `RpcProviderPool`: the losing request of a hedged pair is cancelled
+    """
+
+    def __init__(
+        self,
+        endpoint_uris: list[str],
+        hedge_percentile: Optional[float] = 95,
+        max_error_rate: float = 0.5,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.endpoints = [
+            (
+                AsyncHTTPProvider(uri, exception_retry_configuration=None),
+                RpcEndpointHealth(uri, max_error_rate=max_error_rate),
+            )
+            for uri in endpoint_uris
+        ]
+        self.hedge_percentile = hedge_percentile
+
+    def __str__(self) -> str:
+        return f"Async RPC provider pool of {', '.join(health.name for _, health in self.endpoints)}"
+
+    def get_routed_endpoints(self) -> list[tuple[AsyncHTTPProvider, RpcEndpointHealth]]:
+        """
+        Returns the endpoints in the order requests are routed to them
+        """
+        return sorted(self.endpoints, key=lambda endpoint: endpoint[1].get_routing_key())
+
+    def get_hedge_delay(self, health: RpcEndpointHealth) -> Optional[float]:
+        """
+        Returns the number of seconds after which a request to the given endpoint is hedged, None if it is not
+        """
+        if not self.hedge_percentile:
+            return None
+        return health.latency_tracker.percentile(self.hedge_percentile)
+
+    @staticmethod
+    async def _call(
+        provider: AsyncHTTPProvider,
+        health: RpcEndpointHealth,
+        send: Callable[[AsyncHTTPProvider], Awaitable[Any]],
+    ) -> RPCResponse | list[RPCResponse]:
+        started_at = time.monotonic()
+        try:
+            response = await send(provider)
+            if is_rate_limited(response):
+                raise RpcEndpointException(f"Rate limited: {response['error'].get('message')}")
+        except asyncio.CancelledError:
+            # Lost the race with a hedged request, the endpoint did not fail
+            raise
+        except Exception:
+            health.record_failure(time.monotonic() - started_at)
+            rpc_endpoint_requests_total.labels(health.name, "failure").inc()
+            raise
+        health.record_success(time.monotonic() - started_at)
+        rpc_endpoint_requests_total.labels(health.name, "success").inc()
+        return response
+
+    async def _send(
+        self, description: str, idempotent: bool, send: Callable[[AsyncHTTPProvider], Awaitable[Any]]
+    ) -> RPCResponse | list[RPCResponse]:
+        """
+        Sends a request to the routed endpoints, failing over and hedging as described in `RpcProviderPool`
+
+        Raises:
+            Exception: the error of the last endpoint, if the request failed on every endpoint it was sent to
+        """
+        endpoints = self.get_routed_endpoints()
+        if not idempotent:
+            endpoints = endpoints[:1]
+
+        last_error: Optional[Exception] = None
+        pending: dict[asyncio.Task, RpcEndpointHealth] = {}
+        hedge_deadline: Optional[float] = None
+
+        try:
+            while endpoints or pending:
+                if not pending:
+                    provider, health = endpoints.pop(0)
+                    hedge_delay = self.get_hedge_delay(health) if endpoints else None
+                    pending[asyncio.create_task(self._call(provider, health, send))] = health
+                    hedge_deadline = None if hedge_delay is None else time.monotonic() + hedge_delay
+
+                timeout = (
+                    max(0.0, hedge_deadline - time.monotonic()) if hedge_deadline is not None and endpoints else None
+                )
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    provider, health = endpoints.pop(0)
+                    logging.debug(f"Hedging {description} to {health.name}")
+                    rpc_hedged_requests_total.labels(health.name).inc()
+                    pending[asyncio.create_task(self._call(provider, health, send))] = health
+                    hedge_deadline = None
+                    continue
+
+                for task in done:
+                    health = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        logging.info(f"{description} failed on {health.name}: {type(e).__name__}")
+                        last_error = e
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Completed at the same time as the returned request
+                    task.exception()
+
+        raise last_error
+
+    @async_handle_request_caching
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return await self._send(
+            method, method not in NON_IDEMPOTENT_METHODS, lambda provider: provider.make_request(method, params)
+        )
+
+    async def make_batch_request(
+        self, batch_requests: list[tuple[RPCEndpoint, Any]]
+    ) -> list[RPCResponse] | RPCResponse:
+        return await self._send(
+            f"Batch of {len(batch_requests)} requests",
+            all(method not in NON_IDEMPOTENT_METHODS for method, _ in batch_requests),
+            lambda provider: provider.make_batch_request(batch_requests),
+        )
+
+    async def disconnect(self):
+        for provider, _ in self.endpoints:
+            await provider.disconnect()
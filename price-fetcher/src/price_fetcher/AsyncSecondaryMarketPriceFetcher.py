@@ -0,0 +1,92 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketQuote
+from price_fetcher.TokenBucketRateLimiter import TokenBucketRateLimiter
+
+
+class AsyncSecondaryMarketPriceFetcher(ABC):
+    """
+    Asyncio counterpart of SecondaryMarketPriceFetcher, raising the same exceptions
+    """
+
+    one_ether = 10**18
+
+    # Name of the provider, recorded along with the prices it quoted
+    name: str = ""
+
+    # Provider quota used when no explicit rate limit is configured
+    default_requests_per_second: float = 1
+    default_burst: int = 1
+
+    # Rate limiter and round-trip latencies of the requests sent to the provider, used to hedge slow requests
+    rate_limiter: Optional[TokenBucketRateLimiter] = None
+    latency_tracker: Optional[LatencyTracker] = None
+
+    @abstractmethod
+    async def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        """
+        Get the amount of destination token received when selling the given amount of source token on given network
+
+        Args:
+            chain_id (int): chain id
+            src_token_address (str): address of the sold token on network with given chain id
+            dst_token_address (str): address of the bought token on network with given chain id
+            amount (int): sold amount in wei
+
+        Returns:
+            int: bought amount in wei
+
+        Raises:
+            UnsupportedChainException: if chain id is not supported
+            UnsupportedTokenException: if token is not supported
+            CannotGetPriceException: if price cannot be fetched
+        """
+        pass
+
+    async def get_price(self, chain_id: int, token_address: str, eth_token_address: str) -> int:
+        """
+        Get price in ETH from secondary market for given token on given network
+
+        Args:
+            chain_id (int): chain id
+            token_address (str): token address on network with given chain id
+            eth_token_address (str): ETH token address on network with given chain id
+
+        Returns:
+            int: price in wei
+
+        Raises:
+            UnsupportedChainException: if chain id is not supported
+            UnsupportedTokenException: if token is not supported
+            CannotGetPriceException: if price cannot be fetched
+        """
+        return await self.get_amount_out(chain_id, token_address, eth_token_address, self.one_ether)
+
+    async def get_quote(self, chain_id: int, token_address: str, eth_token_address: str) -> SecondaryMarketQuote:
+        """
+        Get price in ETH from secondary market for given token on given network, along with the provider it comes from
+
+        Raises the same exceptions as get_price
+        """
+        return SecondaryMarketQuote(await self.get_price(chain_id, token_address, eth_token_address), self.name)
+
+    async def get_amount_out_quote(
+        self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int
+    ) -> SecondaryMarketQuote:
+        """
+        Get the amount of destination token received when selling the given amount of source token on given network,
+        along with the provider it comes from
+
+        Raises the same exceptions as get_amount_out
+        """
+        return SecondaryMarketQuote(
+            await self.get_amount_out(chain_id, src_token_address, dst_token_address, amount), self.name
+        )
+
+    async def close(self):
+        """
+        Release the resources (HTTP sessions...) held by the price fetcher
+        """
+        pass
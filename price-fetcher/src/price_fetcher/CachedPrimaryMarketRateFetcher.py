@@ -0,0 +1,268 @@
+import logging
+import threading
+from typing import Optional
+
+from eth_utils import event_signature_to_log_topic, to_checksum_address
+from web3 import AsyncWeb3, Web3
+from web3.types import BlockIdentifier
+
+from metrics import record_error, rpc_call_latency_seconds
+from price_fetcher.MulticallPrimaryMarketRateFetcher import MULTICALL3_ADDRESS, MulticallPrimaryMarketRateFetcher
+
+# Rates cached for longer than this number of blocks are read again rather than checked with eth_getLogs, whose block
+# range is limited by most providers
+MAX_LOGS_BLOCK_RANGE = 10_000
+
+
+class CachedPrimaryMarketRateFetcher(MulticallPrimaryMarketRateFetcher):
+    """
+    Multicall3 primary market rate fetcher caching the rates by contract and function.
+
+    Tokens with `rate_update_events` in their config keep their cached rate across blocks until one of these events is
+    emitted, which is checked with a single eth_getLogs call for all of them. Other tokens (e.g. sfrxETH, whose rate
+    grows at every block) and tokens not cached yet are read with Multicall3 at every call, which also returns the
+    current block number; otherwise the current block number is read with eth_blockNumber. Cached rates are used as long
+    as no new block was mined or no event was emitted, and only the rates that may have changed are read with a second
+    Multicall3 call. A read where nothing changed costs one eth_blockNumber call (and one eth_getLogs call when blocks
+    were mined) when every token has rate update events, and one Multicall3 call of the tokens without events and one
+    eth_getLogs call otherwise.
+
+    The cache is thread-safe, so that overlapping fetching cycles can share the fetcher: each read works on a snapshot
+    of the cached rates of its tokens, and only replaces a cached rate with a rate known at a later block.
+    """
+
+    def __init__(self, multicall_address: str = MULTICALL3_ADDRESS):
+        super().__init__(multicall_address)
+        # Block number at which each rate was read (or last known to be unchanged) and rate, by contract and function
+        self._rates: dict[tuple[str, str], tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_cache_key(token: dict) -> tuple[str, str]:
+        return to_checksum_address(token["token_addresses"]["ethereum"]), token["get_exchange_rate_function_name"]
+
+    def _get_cached_rates(self, tokens: list[dict]) -> dict[tuple[str, str], tuple[int, int]]:
+        """
+        Returns a snapshot of the cached block number and rate of the given tokens
+        """
+        with self._lock:
+            return {
+                cache_key: self._rates[cache_key]
+                for cache_key in map(self._get_cache_key, tokens)
+                if cache_key in self._rates
+            }
+
+    @staticmethod
+    def _get_rate_update_events(token: dict) -> set[tuple[str, bytes]]:
+        """
+        Returns the address and topic of the events emitted when the rate of a token changes
+        """
+        return {
+            (
+                to_checksum_address(event.get("address", token["token_addresses"]["ethereum"])),
+                event_signature_to_log_topic(event["signature"]),
+            )
+            for event in token.get("rate_update_events", [])
+        }
+
+    def _get_logs_filter(
+        self, tokens: list[dict], block_number: int, cached_rates: dict[tuple[str, str], tuple[int, int]]
+    ) -> Optional[dict]:
+        """
+        Returns the eth_getLogs filter of the rate update events that may have been emitted since the cached rates of
+        the given tokens were read, None if there is no such rate
+        """
+        from_block, addresses, topics = None, set(), set()
+        for token in tokens:
+            cached = cached_rates.get(self._get_cache_key(token))
+            events = self._get_rate_update_events(token)
+            if cached is None or not events or not 0 < block_number - cached[0] <= MAX_LOGS_BLOCK_RANGE:
+                continue
+            from_block = cached[0] + 1 if from_block is None else min(from_block, cached[0] + 1)
+            for address, topic in events:
+                addresses.add(address)
+                topics.add(topic)
+
+        if from_block is None:
+            return None
+        return {
+            "fromBlock": from_block,
+            "toBlock": block_number,
+            "address": sorted(addresses),
+            "topics": [sorted(topics)],
+        }
+
+    def _get_stale_tokens(
+        self,
+        tokens: list[dict],
+        block_number: int,
+        logs: Optional[list],
+        cached_rates: dict[tuple[str, str], tuple[int, int]],
+    ) -> list[dict]:
+        """
+        Returns the tokens whose rate must be read, given the rate update events emitted since their cached rate was
+        read (None if they could not be fetched)
+        """
+        emitted_events = (
+            [(to_checksum_address(log["address"]), bytes(log["topics"][0]), log["blockNumber"]) for log in logs]
+            if logs
+            else []
+        )
+        stale_tokens = []
+        for token in tokens:
+            cached = cached_rates.get(self._get_cache_key(token))
+            if cached is not None and cached[0] >= block_number:
+                continue
+
+            events = self._get_rate_update_events(token)
+            if (
+                cached is None
+                or not events
+                or logs is None
+                or block_number - cached[0] > MAX_LOGS_BLOCK_RANGE
+                or any(
+                    (address, topic) in events and log_block_number > cached[0]
+                    for address, topic, log_block_number in emitted_events
+                )
+            ):
+                stale_tokens.append(token)
+        return stale_tokens
+
+    def _update_cache(
+        self,
+        tokens: list[dict],
+        block_number: int,
+        read_block_number: Optional[int],
+        read_rates: dict[str, int | Exception],
+        cached_rates: dict[tuple[str, str], tuple[int, int]],
+    ) -> dict[str, int | Exception]:
+        """
+        Caches the rates read at `read_block_number` and returns the rate of every token, from the snapshot of the
+        cache for the ones that were not read. Rates cached at a later block by another read are kept
+        """
+        exchange_rates: dict[str, int | Exception] = {}
+        with self._lock:
+            for token in tokens:
+                cache_key = self._get_cache_key(token)
+                cached = self._rates.get(cache_key)
+                if token["token_name"] not in read_rates:
+                    # Unchanged up to block_number, even if another read failed and dropped it in the meantime
+                    rate = cached_rates[cache_key][1]
+                    if cached is None or cached[0] < block_number:
+                        self._rates[cache_key] = (block_number, rate)
+                    exchange_rates[token["token_name"]] = rate
+                    continue
+
+                rate = read_rates[token["token_name"]]
+                rate_block_number = read_block_number or block_number
+                if isinstance(rate, Exception):
+                    if cached is not None and cached[0] <= rate_block_number:
+                        del self._rates[cache_key]
+                elif cached is None or cached[0] <= rate_block_number:
+                    self._rates[cache_key] = (rate_block_number, rate)
+                exchange_rates[token["token_name"]] = rate
+
+        logging.debug(f"Read {len(read_rates)} primary market rates, {len(tokens) - len(read_rates)} from cache")
+        return exchange_rates
+
+    def _get_unchecked_tokens(
+        self, tokens: list[dict], cached_rates: dict[tuple[str, str], tuple[int, int]]
+    ) -> list[dict]:
+        """
+        Returns the tokens whose rate is read at every call: without rate update events, or not cached yet
+        """
+        return [
+            token
+            for token in tokens
+            if not self._get_rate_update_events(token) or self._get_cache_key(token) not in cached_rates
+        ]
+
+    def get_exchange_rates(
+        self,
+        web3_provider: Web3,
+        tokens: list[dict],
+        block_identifier: BlockIdentifier = "latest",
+    ) -> tuple[int, dict[str, int | Exception]]:
+        if block_identifier != "latest":
+            return super().get_exchange_rates(web3_provider, tokens, block_identifier)
+
+        cached_rates = self._get_cached_rates(tokens)
+        unchecked_tokens = self._get_unchecked_tokens(tokens, cached_rates)
+        block_number, exchange_rates = None, {}
+        if unchecked_tokens:
+            block_number, read_rates = super().get_exchange_rates(web3_provider, unchecked_tokens)
+            if block_number is not None:
+                exchange_rates = self._update_cache(unchecked_tokens, block_number, block_number, read_rates, {})
+            else:
+                exchange_rates = read_rates
+        if block_number is None:
+            with rpc_call_latency_seconds.labels("eth_blockNumber").time():
+                block_number = web3_provider.eth.block_number
+
+        checked_tokens = [token for token in tokens if token["token_name"] not in exchange_rates]
+        if not checked_tokens:
+            return block_number, exchange_rates
+
+        logs = None
+        logs_filter = self._get_logs_filter(checked_tokens, block_number, cached_rates)
+        if logs_filter is not None:
+            try:
+                with rpc_call_latency_seconds.labels("eth_getLogs").time():
+                    logs = web3_provider.eth.get_logs(logs_filter)
+            except Exception as e:
+                logging.warning(f"Failed to get rate update events, reading every rate: {str(e)}")
+                record_error(e)
+
+        stale_tokens = self._get_stale_tokens(checked_tokens, block_number, logs, cached_rates)
+        read_block_number, read_rates = None, {}
+        if stale_tokens:
+            read_block_number, read_rates = super().get_exchange_rates(web3_provider, stale_tokens)
+        exchange_rates.update(
+            self._update_cache(checked_tokens, block_number, read_block_number, read_rates, cached_rates)
+        )
+        return block_number, exchange_rates
+
+    async def get_exchange_rates_async(
+        self,
+        web3_provider: AsyncWeb3,
+        tokens: list[dict],
+        block_identifier: BlockIdentifier = "latest",
+    ) -> tuple[int, dict[str, int | Exception]]:
+        if block_identifier != "latest":
+            return await super().get_exchange_rates_async(web3_provider, tokens, block_identifier)
+
+        cached_rates = self._get_cached_rates(tokens)
+        unchecked_tokens = self._get_unchecked_tokens(tokens, cached_rates)
+        block_number, exchange_rates = None, {}
+        if unchecked_tokens:
+            block_number, read_rates = await super().get_exchange_rates_async(web3_provider, unchecked_tokens)
+            if block_number is not None:
+                exchange_rates = self._update_cache(unchecked_tokens, block_number, block_number, read_rates, {})
+            else:
+                exchange_rates = read_rates
+        if block_number is None:
+            with rpc_call_latency_seconds.labels("eth_blockNumber").time():
+                block_number = await web3_provider.eth.block_number
+
+        checked_tokens = [token for token in tokens if token["token_name"] not in exchange_rates]
+        if not checked_tokens:
+            return block_number, exchange_rates
+
+        logs = None
+        logs_filter = self._get_logs_filter(checked_tokens, block_number, cached_rates)
+        if logs_filter is not None:
+            try:
+                with rpc_call_latency_seconds.labels("eth_getLogs").time():
+                    logs = await web3_provider.eth.get_logs(logs_filter)
+            except Exception as e:
+                logging.warning(f"Failed to get rate update events, reading every rate: {str(e)}")
+                record_error(e)
+
+        stale_tokens = self._get_stale_tokens(checked_tokens, block_number, logs, cached_rates)
+        read_block_number, read_rates = None, {}
+        if stale_tokens:
+            read_block_number, read_rates = await super().get_exchange_rates_async(web3_provider, stale_tokens)
+        exchange_rates.update(
+            self._update_cache(checked_tokens, block_number, read_block_number, read_rates, cached_rates)
+        )
+        return block_number, exchange_rates
@@ -0,0 +1,151 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from metrics import get_chain_label
+from price_fetcher.SecondaryMarketPriceFetcher import CircuitOpenException
+
+PAIR_KEY_PREFIX = "pair"
+PROVIDER_KEY_PREFIX = "provider"
+
+
+class CircuitBreaker:
+    """
+    Circuit breakers of the secondary market pairs (provider, chain and tokens) and providers, kept in a JSON state file
+    so that they survive restarts.
+
+    The circuit of a pair opens after `failure_threshold` consecutive failed quotes, the circuit of a provider after
+    `provider_failure_threshold` consecutive failures of the provider itself (network errors, 429 and 5xx responses).
+    Requests are not sent while a circuit is open. Once its re-probe interval elapsed, requests are let through again:
+    the first success closes the circuit, a failure opens it again for twice the interval, up to `max_interval`.
+    """
+
+    def __init__(
+        self,
+        state_file: Optional[str] = None,
+        failure_threshold: int = 3,
+        provider_failure_threshold: int = 10,
+        base_interval: float = 600,
+        max_interval: float = 86400,
+    ):
+        self.state_file = state_file
+        self.failure_threshold = failure_threshold
+        self.provider_failure_threshold = provider_failure_threshold
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+
+        # State of the circuits that failed since they were last closed, by key
+        self._circuits: dict[str, dict] = self._load()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_pair_key(provider: str, chain_id: int, src_token_address: str, dst_token_address: str) -> str:
+        return ":".join(
+            (
+                PAIR_KEY_PREFIX,
+                provider,
+                get_chain_label(chain_id),
+                src_token_address.lower(),
+                dst_token_address.lower(),
+            )
+        )
+
+    @staticmethod
+    def get_provider_key(provider: str) -> str:
+        return f"{PROVIDER_KEY_PREFIX}:{provider}"
+
+    def _load(self) -> dict[str, dict]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable circuit breaker state file {self.state_file}: {str(e)}")
+            return {}
+
+    def _save(self):
+        """
+        Writes the state file, must be called with the lock held
+        """
+        if not self.state_file:
+            return
+        temporary_file = f"{self.state_file}.tmp"
+        try:
+            with open(temporary_file, "w") as f:
+                json.dump(self._circuits, f, indent=2, sort_keys=True)
+            os.replace(temporary_file, self.state_file)
+        except OSError as e:
+            logging.warning(f"Failed to write circuit breaker state file {self.state_file}: {str(e)}")
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def get_circuits(self) -> dict[str, dict]:
+        """
+        Returns a copy of the state of the circuits that failed since they were last closed, by key
+        """
+        with self._lock:
+            return {key: dict(circuit) for key, circuit in self._circuits.items()}
+
+    def check(self, key: str):
+        """
+        Raises:
+            CircuitOpenException: if the circuit is open and its re-probe interval did not elapse yet
+        """
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit["open_until"] is None or time.time() >= circuit["open_until"]:
+            return
+        open_until = datetime.datetime.fromtimestamp(circuit["open_until"]).isoformat(timespec="seconds")
+        raise CircuitOpenException(f"Circuit of {key} is open until {open_until}: {circuit['last_error']}")
+
+    def record_success(self, key: str):
+        if key not in self._circuits:
+            return
+        with self._lock:
+            circuit = self._circuits.pop(key, None)
+            if circuit is not None and circuit["open_until"] is not None:
+                logging.info(f"Closing circuit of {key}")
+                self._save()
+
+    def record_failure(self, key: str, error: Exception):
+        threshold = (
+            self.provider_failure_threshold if key.startswith(f"{PROVIDER_KEY_PREFIX}:") else self.failure_threshold
+        )
+        now = time.time()
+        with self._lock:
+            circuit = self._circuits.setdefault(key, {"failures": 0, "open_until": None, "interval": None})
+            circuit["failures"] += 1
+            circuit["last_error"] = str(error)[:200]
+            if circuit["open_until"] is not None:
+                if now < circuit["open_until"]:
+                    # Request sent before the circuit opened again
+                    return
+                circuit["interval"] = min(self.max_interval, circuit["interval"] * 2)
+            elif circuit["failures"] >= threshold:
+                circuit["interval"] = self.base_interval
+            else:
+                return
+
+            circuit["open_until"] = now + circuit["interval"]
+            logging.warning(
+                f"Opening circuit of {key} for {circuit['interval']:.0f}s after {circuit['failures']} failures: "
+                f"{circuit['last_error']}"
+            )
+            self._save()
+
+    def reset(self, key: Optional[str] = None):
+        """
+        Closes the circuit of the given key, or every circuit
+        """
+        with self._lock:
+            if key is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(key, None)
+            self._save()
@@ -0,0 +1,58 @@
+from metrics import circuit_breaker_skipped_requests_total
+from price_fetcher.CircuitBreaker import CircuitBreaker
+from price_fetcher.SecondaryMarketPriceFetcher import (
+    CannotGetPriceException,
+    CircuitOpenException,
+    ProviderUnavailableException,
+    SecondaryMarketPriceFetcher,
+    UnsupportedTokenException,
+)
+
+
+class CircuitBreakerPriceFetcher(SecondaryMarketPriceFetcher):
+    """
+    Secondary market price fetcher skipping the requests of a provider and of its pairs while their circuit is open.
+
+    Only the quotes of one token update the circuit of a pair, other amounts (e.g. depth ladder rungs) are skipped while
+    it is open but do not count as successes or failures of the pair.
+    """
+
+    def __init__(self, price_fetcher: SecondaryMarketPriceFetcher, circuit_breaker: CircuitBreaker):
+        self.price_fetcher = price_fetcher
+        self.circuit_breaker = circuit_breaker
+        self.name = price_fetcher.name
+        self.rate_limiter = price_fetcher.rate_limiter
+        self.latency_tracker = price_fetcher.latency_tracker
+        self._skipped_counter = circuit_breaker_skipped_requests_total.labels(self.name)
+
+    def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        provider_key = self.circuit_breaker.get_provider_key(self.name)
+        pair_key = self.circuit_breaker.get_pair_key(self.name, chain_id, src_token_address, dst_token_address)
+        try:
+            self.circuit_breaker.check(provider_key)
+            self.circuit_breaker.check(pair_key)
+        except CircuitOpenException:
+            self._skipped_counter.inc()
+            raise
+
+        is_pair_quote = amount == self.one_ether
+        try:
+            amount_out = self.price_fetcher.get_amount_out(chain_id, src_token_address, dst_token_address, amount)
+        except ProviderUnavailableException as e:
+            self.circuit_breaker.record_failure(provider_key, e)
+            raise
+        except (UnsupportedTokenException, CannotGetPriceException) as e:
+            # The provider answered, the pair failed
+            self.circuit_breaker.record_success(provider_key)
+            if is_pair_quote:
+                self.circuit_breaker.record_failure(pair_key, e)
+            raise
+
+        self.circuit_breaker.record_success(provider_key)
+        if is_pair_quote:
+            self.circuit_breaker.record_success(pair_key)
+        return amount_out
+
+    def close(self):
+        self.price_fetcher.close()
+        self.circuit_breaker.save()
@@ -0,0 +1,176 @@
+import contextvars
+import logging
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional
+
+from price_fetcher.SecondaryMarketPriceFetcher import (
+    CannotGetPriceException,
+    CircuitOpenException,
+    SecondaryMarketPriceFetcher,
+    SecondaryMarketQuote,
+    UnsupportedChainException,
+    UnsupportedTokenException,
+)
+from utils import QuotePolicy
+
+
+class CompositePriceFetcher(SecondaryMarketPriceFetcher):
+    """
+    Quotes several secondary markets concurrently and picks one of their prices according to a policy:
+    - best: highest price (largest amount received)
+    - median: median price (the lower one when an even number of providers answered)
+    - first-good: first price received
+
+    A request still in flight after the `hedge_percentile` percentile of its provider's recent latencies is hedged: an
+    identical request is sent to the same provider and the first of the two responses is used. Latencies are the HTTP
+    round trips recorded by the providers' price fetchers, without the wait for their rate limiter. Hedged requests go
+    through the provider's rate limiter like any other request, so a request is not hedged when the rate limiter has
+    no spare token.
+    """
+
+    name = "composite"
+
+    def __init__(
+        self,
+        price_fetchers: list[SecondaryMarketPriceFetcher],
+        policy: QuotePolicy = QuotePolicy.BEST,
+        hedge_percentile: Optional[float] = 95,
+        max_workers: int = 32,
+    ):
+        if not price_fetchers:
+            raise ValueError("At least one price fetcher is required")
+        if len({price_fetcher.name for price_fetcher in price_fetchers}) != len(price_fetchers):
+            raise ValueError("Price fetchers must quote different providers")
+
+        self.price_fetchers = price_fetchers
+        self.policy = policy
+        self.hedge_percentile = hedge_percentile
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider-quote")
+
+    def get_hedge_delay(self, price_fetcher: SecondaryMarketPriceFetcher) -> Optional[float]:
+        """
+        Returns the number of seconds after which a request to the given provider is hedged, None if it is not
+        """
+        if not self.hedge_percentile or price_fetcher.latency_tracker is None:
+            return None
+        return price_fetcher.latency_tracker.percentile(self.hedge_percentile)
+
+    @staticmethod
+    def can_hedge(price_fetcher: SecondaryMarketPriceFetcher) -> bool:
+        """
+        Returns whether a hedged request can be sent to the given provider right away, a hedged request waiting for
+        the rate limiter would only arrive after the request it hedges
+        """
+        return price_fetcher.rate_limiter is None or price_fetcher.rate_limiter.has_spare_token()
+
+    def _submit(self, price_fetcher: SecondaryMarketPriceFetcher, args: tuple) -> Future:
+        # Requests run in the context of the caller, e.g. with the retry deadline of its fetching cycle
+        return self.executor.submit(contextvars.copy_context().run, price_fetcher.get_amount_out, *args)
+
+    def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        return self.get_amount_out_quote(chain_id, src_token_address, dst_token_address, amount).price
+
+    def get_quote(self, chain_id: int, token_address: str, eth_token_address: str) -> SecondaryMarketQuote:
+        return self.get_amount_out_quote(chain_id, token_address, eth_token_address, self.one_ether)
+
+    def get_amount_out_quote(
+        self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int
+    ) -> SecondaryMarketQuote:
+        args = (chain_id, src_token_address, dst_token_address, amount)
+        started_at = time.monotonic()
+        attempts: dict[Future, SecondaryMarketPriceFetcher] = {}
+        hedge_deadlines: dict[str, float] = {}
+        for price_fetcher in self.price_fetchers:
+            attempts[self._submit(price_fetcher, args)] = price_fetcher
+            hedge_delay = self.get_hedge_delay(price_fetcher)
+            if hedge_delay is not None:
+                hedge_deadlines[price_fetcher.name] = started_at + hedge_delay
+
+        prices: dict[str, int] = {}
+        errors: dict[str, Exception] = {}
+        pending = set(attempts)
+        while pending and not (self.policy == QuotePolicy.FIRST_GOOD and prices):
+            timeout = max(0.0, min(hedge_deadlines.values()) - time.monotonic()) if hedge_deadlines else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider_name = attempts[future].name
+                if provider_name in prices:
+                    continue
+                try:
+                    prices[provider_name] = future.result()
+                except Exception as e:
+                    errors[provider_name] = e
+                    if any(attempts[other].name == provider_name for other in pending):
+                        # The hedged request can still succeed
+                        continue
+                hedge_deadlines.pop(provider_name, None)
+
+            # The other request to a provider that already answered lost the race
+            for future in pending:
+                if attempts[future].name in prices:
+                    future.cancel()
+            pending = {future for future in pending if attempts[future].name not in prices}
+
+            now = time.monotonic()
+            for provider_name, deadline in list(hedge_deadlines.items()):
+                if deadline > now:
+                    continue
+                del hedge_deadlines[provider_name]
+                price_fetcher = next(fetcher for fetcher in self.price_fetchers if fetcher.name == provider_name)
+                if not self.can_hedge(price_fetcher):
+                    logging.debug(f"Not hedging {provider_name} quote, its rate limiter has no spare token")
+                    continue
+                logging.debug(f"Hedging {provider_name} quote for {src_token_address} on chain {chain_id}")
+                hedged_future = self._submit(price_fetcher, args)
+                attempts[hedged_future] = price_fetcher
+                pending.add(hedged_future)
+
+        # Requests that did not start yet are not needed anymore
+        for future in pending:
+            future.cancel()
+
+        return self.select_quote(self.policy, prices, errors)
+
+    @staticmethod
+    def select_quote(policy: QuotePolicy, prices: dict[str, int], errors: dict[str, Exception]) -> SecondaryMarketQuote:
+        """
+        Picks a price among the prices quoted by several providers
+
+        Args:
+            policy (QuotePolicy): how to pick the price
+            prices (dict[str, int]): price in wei per provider name, in the order in which they were received
+            errors (dict[str, Exception]): exception raised per provider name
+
+        Returns:
+            SecondaryMarketQuote: picked price and the provider that quoted it
+
+        Raises:
+            UnsupportedChainException: if no provider supports the chain
+            UnsupportedTokenException: if no provider supports the token
+            CircuitOpenException: if the circuits of every provider are open for the pair
+            CannotGetPriceException: if no price could be fetched
+        """
+        if not prices:
+            message = "; ".join(f"{provider_name}: {str(e)}" for provider_name, e in errors.items())
+            for exception_class in (UnsupportedChainException, UnsupportedTokenException, CircuitOpenException):
+                if errors and all(isinstance(e, exception_class) for e in errors.values()):
+                    raise exception_class(message)
+            raise CannotGetPriceException(message)
+
+        if policy == QuotePolicy.FIRST_GOOD:
+            provider_name = next(iter(prices))
+        elif policy == QuotePolicy.MEDIAN:
+            median_price = statistics.median_low(prices.values())
+            provider_name = next(name for name, price in prices.items() if price == median_price)
+        else:
+            provider_name = max(prices, key=prices.get)
+
+        return SecondaryMarketQuote(prices[provider_name], provider_name)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for price_fetcher in self.price_fetchers:
+            price_fetcher.close()
@@ -0,0 +1,45 @@
+import logging
+import threading
+
+import httpx
+
+
+class ConnectionReuseTracker:
+    """
+    Counts the requests sent by a price fetcher and the connections it had to open for them, using the httpx
+    `trace` request extension. A low number of connections compared to the number of requests means keep-alive
+    connections are being reused.
+    """
+
+    def __init__(self, provider_name: str):
+        self.provider_name = provider_name
+        self.requests_sent = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def trace(self, event_name: str, info: dict):
+        """
+        httpx trace callback for sync clients
+        """
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+    async def async_trace(self, event_name: str, info: dict):
+        """
+        httpx trace callback for asyncio clients
+        """
+        self.trace(event_name, info)
+
+    def record_response(self, response: httpx.Response):
+        """
+        Records a response received from the provider and logs the current connection reuse
+        """
+        with self._lock:
+            self.requests_sent += 1
+            requests_sent, connections_opened = self.requests_sent, self.connections_opened
+
+        logging.debug(
+            f"{self.provider_name} responded over {response.http_version}: {connections_opened} connection(s) opened "
+            f"for {requests_sent} request(s)"
+        )
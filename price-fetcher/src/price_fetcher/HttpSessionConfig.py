@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+
+@dataclass(frozen=True)
+class HttpSessionConfig:
+    """
+    Connection pool and timeout settings of the HTTP sessions owned by the secondary market price fetchers
+    """
+
+    pool_size: int = 10
+    connect_timeout: float = 5
+    read_timeout: float = 10
+
+    def _client_kwargs(self, http_proxy: Optional[str], http2: bool, headers: Optional[dict]) -> dict:
+        return {
+            "http2": http2,
+            "proxy": http_proxy or None,
+            "headers": headers,
+            "limits": httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            "timeout": httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        }
+
+    def create_client(
+        self,
+        http_proxy: Optional[str],
+        http2: bool = True,
+        headers: Optional[dict] = None,
+    ) -> httpx.Client:
+        """
+        Creates a pooled keep-alive HTTP client
+
+        Args:
+            http_proxy (str): optional HTTP proxy URL
+            http2 (bool): whether HTTP/2 should be negotiated with the server
+            headers (dict): headers sent with every request
+
+        Returns:
+            httpx.Client: HTTP client
+        """
+        return httpx.Client(**self._client_kwargs(http_proxy, http2, headers))
+
+    def create_async_client(
+        self,
+        http_proxy: Optional[str],
+        http2: bool = True,
+        headers: Optional[dict] = None,
+    ) -> httpx.AsyncClient:
+        """
+        Creates a pooled keep-alive asyncio HTTP client
+
+        Args:
+            http_proxy (str): optional HTTP proxy URL
+            http2 (bool): whether HTTP/2 should be negotiated with the server
+            headers (dict): headers sent with every request
+
+        Returns:
+            httpx.AsyncClient: asyncio HTTP client
+        """
+        return httpx.AsyncClient(**self._client_kwargs(http_proxy, http2, headers))
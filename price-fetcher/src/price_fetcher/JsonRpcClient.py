@@ -0,0 +1,100 @@
+import itertools
+import logging
+import time
+from typing import Any, Optional
+
+from metrics import rpc_endpoint_requests_total
+from price_fetcher.HttpSessionConfig import HttpSessionConfig
+from price_fetcher.RpcEndpointHealth import RpcEndpointException, RpcEndpointHealth, is_rate_limited
+
+
+class JsonRpcException(Exception):
+    # The JSON-RPC call returned an error, e.g. a reverted eth_call
+    pass
+
+
+class JsonRpcClient:
+    """
+    Minimal JSON-RPC client of the one-off mode, sending `eth_call` requests over a pooled HTTP client without
+    importing web3, whose import alone takes seconds.
+
+    A request that fails on an endpoint (network error, HTTP error or throttled JSON-RPC response) is sent again to the
+    next endpoint, in the order of `RpcEndpointHealth.get_routing_key`. Requests are not hedged: a one-off run sends a
+    single request.
+    """
+
+    def __init__(self, endpoint_uris: list[str], http_session_config: Optional[HttpSessionConfig] = None):
+        self.endpoints = [(uri, RpcEndpointHealth(uri)) for uri in endpoint_uris]
+        # Most JSON-RPC nodes only speak HTTP/1.1
+        self.session = (http_session_config or HttpSessionConfig()).create_client(None, http2=False)
+        self._request_ids = itertools.count()
+
+    def __str__(self) -> str:
+        return f"JSON-RPC client of {', '.join(health.name for _, health in self.endpoints)}"
+
+    def _call(self, uri: str, health: RpcEndpointHealth, payload: dict) -> Any:
+        started_at = time.monotonic()
+        try:
+            response = self.session.post(uri, json=payload)
+            response.raise_for_status()
+            result = response.json()
+            if is_rate_limited(result):
+                raise RpcEndpointException(f"Rate limited: {result['error'].get('message')}")
+        except Exception:
+            health.record_failure(time.monotonic() - started_at)
+            rpc_endpoint_requests_total.labels(health.name, "failure").inc()
+            raise
+        health.record_success(time.monotonic() - started_at)
+        rpc_endpoint_requests_total.labels(health.name, "success").inc()
+        return result
+
+    def make_request(self, method: str, params: list) -> Any:
+        """
+        Sends a JSON-RPC request to the routed endpoints, failing over as described in the class docstring
+
+        Args:
+            method (str): JSON-RPC method
+            params (list): JSON-RPC params
+
+        Returns:
+            Any: result of the call
+
+        Raises:
+            JsonRpcException: if the call returned an error
+            Exception: the error of the last endpoint, if the request failed on every endpoint
+        """
+        payload = {"jsonrpc": "2.0", "id": next(self._request_ids), "method": method, "params": params}
+        last_error: Optional[Exception] = None
+        for uri, health in sorted(self.endpoints, key=lambda endpoint: endpoint[1].get_routing_key()):
+            try:
+                response = self._call(uri, health, payload)
+            except Exception as e:
+                logging.info(f"{method} failed on {health.name}: {type(e).__name__}")
+                last_error = e
+                continue
+
+            if "error" in response:
+                raise JsonRpcException(f"{method} failed: {response['error'].get('message')}")
+            return response["result"]
+
+        raise last_error
+
+    def eth_call(self, transaction: dict, block_identifier: int | str = "latest") -> bytes:
+        """
+        Executes a call without creating a transaction
+
+        Args:
+            transaction (dict): `to` address and `data` bytes of the call
+            block_identifier (int | str): block number or tag at which the call is executed
+
+        Returns:
+            bytes: return data of the call
+        """
+        params = [
+            {"to": transaction["to"], "data": "0x" + transaction["data"].hex()},
+            hex(block_identifier) if isinstance(block_identifier, int) else block_identifier,
+        ]
+        return bytes.fromhex(self.make_request("eth_call", params).removeprefix("0x"))
+
+    def close(self):
+        self.session.close()
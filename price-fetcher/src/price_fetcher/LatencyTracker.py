@@ -0,0 +1,42 @@
+import math
+import threading
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+    """
+    Thread-safe rolling window of the latencies of the last requests sent to a provider
+    """
+
+    def __init__(self, window_size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        """
+        Record the latency of a successful request
+
+        Args:
+            latency (float): latency in seconds
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Returns the given percentile of the recorded latencies (nearest-rank)
+
+        Args:
+            percentile (float): percentile between 0 and 100
+
+        Returns:
+            Optional[float]: latency in seconds, None while fewer than `min_samples` latencies were recorded
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        rank = max(1, math.ceil(percentile / 100 * len(latencies)))
+        return latencies[rank - 1]
@@ -0,0 +1,167 @@
+from typing import TYPE_CHECKING
+
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from eth_utils.abi import function_abi_to_4byte_selector, get_abi_output_types
+
+from metrics import rpc_call_latency_seconds
+from price_fetcher.JsonRpcClient import JsonRpcClient
+from price_fetcher.SecondaryMarketPriceFetcher import CannotGetPriceException
+from utils import MULTICALL3_ADDRESS
+
+# web3 is only imported for type checking, so that the one-off mode can read the rates with a JsonRpcClient without
+# importing it
+if TYPE_CHECKING:
+    from web3 import AsyncWeb3, Web3
+    from web3.types import BlockIdentifier
+
+AGGREGATE3_SELECTOR = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+GET_BLOCK_NUMBER_SELECTOR = function_signature_to_4byte_selector("getBlockNumber()")
+
+
+class MulticallPrimaryMarketRateFetcher:
+    """
+    Reads the primary market exchange rate of several tokens with a single Multicall3 `aggregate3` eth_call.
+
+    All the rates are read at the same block, and a reverting token contract only fails its own rate. The number of
+    the block at which the rates were read is fetched in the same call with Multicall3 `getBlockNumber`.
+    """
+
+    def __init__(self, multicall_address: str = MULTICALL3_ADDRESS):
+        self.multicall_address = to_checksum_address(multicall_address)
+        self._encoded_calls: dict[tuple[str, str], tuple[bytes, list[str]]] = {}
+
+    def _get_encoded_call(self, token: dict) -> tuple[str, bytes, list[str]]:
+        """
+        Returns the target address, call data and output types of the exchange rate call of a token
+        """
+        token_address = to_checksum_address(token["token_addresses"]["ethereum"])
+        function_name = token["get_exchange_rate_function_name"]
+        cache_key = (token_address, function_name)
+
+        if cache_key not in self._encoded_calls:
+            function_abi = next(
+                abi
+                for abi in token["native_contract_abi"]
+                if abi.get("type") == "function" and abi.get("name") == function_name
+            )
+            self._encoded_calls[cache_key] = (
+                function_abi_to_4byte_selector(function_abi),
+                get_abi_output_types(function_abi),
+            )
+
+        call_data, output_types = self._encoded_calls[cache_key]
+        return token_address, call_data, output_types
+
+    def _build_transaction(self, tokens: list[dict]) -> dict:
+        calls = [(self.multicall_address, True, GET_BLOCK_NUMBER_SELECTOR)]
+        for token in tokens:
+            token_address, call_data, _ = self._get_encoded_call(token)
+            calls.append((token_address, True, call_data))
+
+        return {
+            "to": self.multicall_address,
+            "data": AGGREGATE3_SELECTOR + encode(["(address,bool,bytes)[]"], [calls]),
+        }
+
+    def _decode_results(self, tokens: list[dict], raw_result: bytes) -> tuple[int, dict[str, int | Exception]]:
+        (results,) = decode(["(bool,bytes)[]"], raw_result)
+        (block_success, block_data), token_results = results[0], results[1:]
+        block_number = decode(["uint256"], block_data)[0] if block_success else None
+
+        exchange_rates: dict[str, int | Exception] = {}
+        for token, (success, return_data) in zip(tokens, token_results):
+            _, _, output_types = self._get_encoded_call(token)
+            if not success:
+                exchange_rates[token["token_name"]] = CannotGetPriceException(
+                    f"{token['get_exchange_rate_function_name']} call reverted"
+                )
+                continue
+            try:
+                exchange_rates[token["token_name"]] = decode(output_types, return_data)[0]
+            except Exception as e:
+                exchange_rates[token["token_name"]] = CannotGetPriceException(
+                    f"Cannot decode {token['get_exchange_rate_function_name']} result: {str(e)}"
+                )
+
+        return block_number, exchange_rates
+
+    def get_exchange_rates(
+        self,
+        web3_provider: "Web3 | JsonRpcClient",
+        tokens: list[dict],
+        block_identifier: "BlockIdentifier" = "latest",
+    ) -> tuple[int, dict[str, int | Exception]]:
+        """
+        Reads the primary market exchange rate of the given tokens on Ethereum
+
+        Args:
+            web3_provider (Web3 | JsonRpcClient): web3 provider, or JSON-RPC client of the one-off mode
+            tokens (list[dict]): token configs
+            block_identifier (BlockIdentifier): block at which the rates are read
+
+        Returns:
+            tuple[int, dict[str, int | Exception]]: block number at which the rates were read, and the exchange rate
+            in wei, or the exception raised while reading it, per token name
+
+        Raises:
+            Exception: if the Multicall3 call itself fails
+        """
+        transaction = self._build_transaction(tokens)
+        with rpc_call_latency_seconds.labels("eth_call").time():
+            if isinstance(web3_provider, JsonRpcClient):
+                raw_result = web3_provider.eth_call(transaction, block_identifier)
+            else:
+                raw_result = web3_provider.eth.call(transaction, block_identifier)
+        return self._decode_results(tokens, raw_result)
+
+    async def get_exchange_rates_async(
+        self,
+        web3_provider: "AsyncWeb3",
+        tokens: list[dict],
+        block_identifier: "BlockIdentifier" = "latest",
+    ) -> tuple[int, dict[str, int | Exception]]:
+        """
+        Asyncio counterpart of get_exchange_rates
+        """
+        with rpc_call_latency_seconds.labels("eth_call").time():
+            raw_result = await web3_provider.eth.call(self._build_transaction(tokens), block_identifier)
+        return self._decode_results(tokens, raw_result)
+
+    async def get_exchange_rates_at_blocks_async(
+        self,
+        web3_provider: "AsyncWeb3",
+        tokens: list[dict],
+        block_numbers: list[int],
+    ) -> list[tuple[int, dict[str, int | Exception]] | Exception]:
+        """
+        Reads the primary market exchange rate of the given tokens at several blocks, with one Multicall3 eth_call per
+        block sent in a single batched JSON-RPC request
+
+        Args:
+            web3_provider (AsyncWeb3): web3 provider, of an archive node for old blocks
+            tokens (list[dict]): token configs
+            block_numbers (list[int]): blocks at which the rates are read
+
+        Returns:
+            list[tuple[int, dict[str, int | Exception]] | Exception]: for each block, the block number and the exchange
+            rates as returned by get_exchange_rates, or the exception raised while decoding them (e.g. before Multicall3
+            was deployed)
+
+        Raises:
+            Exception: if the batched request fails
+        """
+        transaction = self._build_transaction(tokens)
+        with rpc_call_latency_seconds.labels("eth_call_batch").time():
+            async with web3_provider.batch_requests() as batch:
+                for block_number in block_numbers:
+                    batch.add(web3_provider.eth.call(transaction, block_number))
+                raw_results = await batch.async_execute()
+
+        results = []
+        for raw_result in raw_results:
+            try:
+                results.append(self._decode_results(tokens, raw_result))
+            except Exception as e:
+                results.append(CannotGetPriceException(f"Cannot decode Multicall3 result: {str(e)}"))
+        return results
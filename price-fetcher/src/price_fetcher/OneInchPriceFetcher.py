@@ -1,56 +1,74 @@
-import time
+from typing import Optional
+from urllib.parse import urlencode
 
-import requests
-
-from price_fetcher.SecondaryMarketPriceFetcher import (
-    CannotGetPriceException,
-    SecondaryMarketPriceFetcher,
-    UnsupportedChainException,
-)
+from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+from price_fetcher.HttpSessionConfig import HttpSessionConfig
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.ProviderRequester import ProviderRequester
+from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketPriceFetcher, UnsupportedChainException
 
 
 class OneInchPriceFetcher(SecondaryMarketPriceFetcher):
-    def __init__(self, one_inch_api_key: str, http_proxy: str):
+    name = "1inch"
+    default_requests_per_second = 1
+    default_burst = 1
+    supports_http2 = True
+    supported_chain_ids = [
+        1,  # ethereum
+        42161,  # arbitrum
+        10,  # optimism
+        137,  # polygon
+        100,  # gnosis
+        8453,  # base
+        324,  # zksync
+    ]
+
+    def __init__(
+        self,
+        one_inch_api_key: str,
+        http_proxy: str,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        http_session_config: Optional[HttpSessionConfig] = None,
+    ):
         self.one_inch_api_key = one_inch_api_key
-        self.http_proxies = {
-            "http": http_proxy,
-            "https": http_proxy,
-        }
-        self.supported_chain_ids = [
-            1,  # ethereum
-            42161,  # arbitrum
-            10,  # optimism
-            137,  # polygon
-            100,  # gnosis
-            8453,  # base
-            324,  # zksync
-        ]
-
-    def get_price(self, chain_id: int, token_address: str, eth_token_address: str) -> int:
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            self.default_requests_per_second, self.default_burst, provider=self.name
+        )
+        self.session = (http_session_config or HttpSessionConfig()).create_client(
+            http_proxy, self.supports_http2, headers={"Authorization": one_inch_api_key or ""}
+        )
+        self.latency_tracker = LatencyTracker()
+        self.requester = ProviderRequester(self.name, "1inch", self.rate_limiter, self.latency_tracker)
+
+    def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
         if chain_id not in self.supported_chain_ids:
             raise UnsupportedChainException(f"Chain id {chain_id} is not supported by 1inch")
 
-        time.sleep(1)  # rate limit
+        return self.requester.get(
+            self.session,
+            self.get_quote_url(chain_id, src_token_address, dst_token_address, amount),
+            chain_id,
+            src_token_address,
+            self.parse_quote,
+        )
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def get_quote_url(
+        chain_id: int,
+        src_token_address: str,
+        dst_token_address: str,
+        amount: int = SecondaryMarketPriceFetcher.one_ether,
+    ) -> str:
         quote_params = {
-            "src": token_address,
-            "dst": eth_token_address,
-            "amount": str(SecondaryMarketPriceFetcher.one_ether),
+            "src": src_token_address,
+            "dst": dst_token_address,
+            "amount": str(amount),
         }
-        url = f"https://api.1inch.dev/swap/v5.2/{chain_id}/quote?{requests.compat.urlencode(quote_params)}"
-
-        try:
-            response = requests.get(
-                url,
-                proxies=self.http_proxies,
-                headers={"Authorization": self.one_inch_api_key},
-            )
-        except Exception as e:
-            raise CannotGetPriceException(
-                f"Failed to get secondary market rate for {token_address} on chain {chain_id} with 1inch: {str(e)}"
-            )
-
-        if response.status_code != 200:
-            raise CannotGetPriceException(f"{response.status_code} error from 1inch: {response.reason}")
-
-        data = response.json()
+        return f"https://api.1inch.dev/swap/v5.2/{chain_id}/quote?{urlencode(quote_params)}"
+
+    @staticmethod
+    def parse_quote(data: dict) -> int:
         return int(data["toAmount"])
@@ -1,58 +1,76 @@
-import random
-import time
+from typing import Optional
+from urllib.parse import urlencode
 
-import requests
-
-from price_fetcher.SecondaryMarketPriceFetcher import (
-    CannotGetPriceException,
-    SecondaryMarketPriceFetcher,
-    UnsupportedChainException,
-)
+from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+from price_fetcher.HttpSessionConfig import HttpSessionConfig
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.ProviderRequester import ProviderRequester
+from price_fetcher.SecondaryMarketPriceFetcher import SecondaryMarketPriceFetcher, UnsupportedChainException
 
 
 class ParaswapPriceFetcher(SecondaryMarketPriceFetcher):
-    def __init__(self, http_proxy: str):
-        self.http_proxies = {
-            "http": http_proxy,
-            "https": http_proxy,
-        }
-        self.supported_chain_ids = [
-            1,  # ethereum
-            42161,  # arbitrum
-            10,  # optimism
-            137,  # polygon
-            43114,  # avalanche
-            56,  # bsc
-            250,  # fantom
-            8453,  # base
-            100,  # gnosis
-        ]
-
-    def get_price(self, chain_id: int, token_address: str, eth_token_address: str) -> int:
+    name = "paraswap"
+    default_requests_per_second = 2
+    default_burst = 4
+    supports_http2 = True
+    supported_chain_ids = [
+        1,  # ethereum
+        42161,  # arbitrum
+        10,  # optimism
+        137,  # polygon
+        43114,  # avalanche
+        56,  # bsc
+        250,  # fantom
+        8453,  # base
+        100,  # gnosis
+    ]
+
+    def __init__(
+        self,
+        http_proxy: str,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        http_session_config: Optional[HttpSessionConfig] = None,
+    ):
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            self.default_requests_per_second, self.default_burst, provider=self.name
+        )
+        self.session = (http_session_config or HttpSessionConfig()).create_client(http_proxy, self.supports_http2)
+        self.latency_tracker = LatencyTracker()
+        self.requester = ProviderRequester(self.name, "Paraswap", self.rate_limiter, self.latency_tracker)
+
+    def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
         if chain_id not in self.supported_chain_ids:
             raise UnsupportedChainException(f"Chain id {chain_id} is not supported by Paraswap")
 
-        time.sleep(random.uniform(1, 3))  # rate limit
+        return self.requester.get(
+            self.session,
+            self.get_quote_url(chain_id, src_token_address, dst_token_address, amount),
+            chain_id,
+            src_token_address,
+            self.parse_quote,
+        )
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def get_quote_url(
+        chain_id: int,
+        src_token_address: str,
+        dst_token_address: str,
+        amount: int = SecondaryMarketPriceFetcher.one_ether,
+    ) -> str:
         quote_params = {
-            "srcToken": token_address,
-            "destToken": eth_token_address,
-            "amount": str(SecondaryMarketPriceFetcher.one_ether),
+            "srcToken": src_token_address,
+            "destToken": dst_token_address,
+            "amount": str(amount),
             "srcDecimals": "18",
             "destDecimals": "18",
             "side": "SELL",
             "network": chain_id,
         }
-        url = f"https://apiv5.paraswap.io/prices/?{requests.compat.urlencode(quote_params)}"
-
-        try:
-            response = requests.get(url, proxies=self.http_proxies)
-        except Exception as e:
-            raise CannotGetPriceException(
-                f"Failed to get secondary market rate for {token_address} on chain {chain_id} with Paraswap: {str(e)}"
-            )
-
-        if response.status_code != 200:
-            raise CannotGetPriceException(f"{response.status_code} error from Paraswap: {response.reason}")
+        return f"https://apiv5.paraswap.io/prices/?{urlencode(quote_params)}"
 
-        data = response.json()
+    @staticmethod
+    def parse_quote(data: dict) -> int:
         return int(data["priceRoute"]["destAmount"])
@@ -0,0 +1,122 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Callable, Optional
+
+import httpx
+
+from metrics import get_chain_label, quote_latency_seconds
+from price_fetcher.AdaptiveRateLimiter import AdaptiveRateLimiter
+from price_fetcher.ConnectionReuseTracker import ConnectionReuseTracker
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.SecondaryMarketPriceFetcher import CannotGetPriceException, ProviderUnavailableException
+
+
+class ProviderRequester:
+    """
+    Sends the quote requests of the sync and asyncio price fetchers of a secondary market provider:
+    - waits for the provider's rate limiter, adapts it to the responses and retries the responses it allows to retry
+    - records the latency metric, the connection reuse and the round trip of successful requests (excluding the wait for
+      the rate limiter) in `latency_tracker`
+    - turns network errors, error responses and responses that cannot be parsed into price fetcher exceptions
+    """
+
+    def __init__(
+        self,
+        provider_name: str,
+        display_name: str,
+        rate_limiter: AdaptiveRateLimiter,
+        latency_tracker: LatencyTracker,
+    ):
+        self.provider_name = provider_name
+        self.display_name = display_name
+        self.rate_limiter = rate_limiter
+        self.latency_tracker = latency_tracker
+        self.connection_tracker = ConnectionReuseTracker(display_name)
+
+    def get(
+        self, session: httpx.Client, url: str, chain_id: int, src_token_address: str, parse: Callable[[Any], int]
+    ) -> int:
+        """
+        Sends a GET request to the provider and parses its JSON response
+
+        Args:
+            session (httpx.Client): HTTP client of the price fetcher
+            url (str): quote URL
+            chain_id (int): chain id of the quote, for metrics and errors
+            src_token_address (str): address of the sold token, for errors
+            parse (Callable[[Any], int]): returns the bought amount in wei from the JSON response
+
+        Returns:
+            int: bought amount in wei
+
+        Raises:
+            ProviderUnavailableException: on network errors, 429 and 5xx responses
+            CannotGetPriceException: on other error responses and responses that cannot be parsed
+        """
+        for attempt in itertools.count():
+            self.rate_limiter.acquire()
+            started_at = time.monotonic()
+            try:
+                with quote_latency_seconds.labels(self.provider_name, get_chain_label(chain_id)).time():
+                    response = session.get(url, extensions={"trace": self.connection_tracker.trace})
+            except Exception as e:
+                raise self._get_network_exception(e, chain_id, src_token_address)
+
+            retry_delay = self._record_response(response, started_at, attempt)
+            if retry_delay is None:
+                return self._parse_response(response, parse)
+            time.sleep(retry_delay)
+
+    async def get_async(
+        self, session: httpx.AsyncClient, url: str, chain_id: int, src_token_address: str, parse: Callable[[Any], int]
+    ) -> int:
+        """
+        Asyncio counterpart of `get`
+        """
+        for attempt in itertools.count():
+            await self.rate_limiter.acquire_async()
+            started_at = time.monotonic()
+            try:
+                with quote_latency_seconds.labels(self.provider_name, get_chain_label(chain_id)).time():
+                    response = await session.get(url, extensions={"trace": self.connection_tracker.async_trace})
+            except Exception as e:
+                raise self._get_network_exception(e, chain_id, src_token_address)
+
+            retry_delay = self._record_response(response, started_at, attempt)
+            if retry_delay is None:
+                return self._parse_response(response, parse)
+            await asyncio.sleep(retry_delay)
+
+    def _get_network_exception(
+        self, error: Exception, chain_id: int, src_token_address: str
+    ) -> ProviderUnavailableException:
+        return ProviderUnavailableException(
+            f"Failed to get secondary market rate for {src_token_address} on chain {chain_id} with "
+            f"{self.display_name}: {str(error)}"
+        )
+
+    def _record_response(self, response: httpx.Response, started_at: float, attempt: int) -> Optional[float]:
+        """
+        Records a response and returns the number of seconds to wait before retrying it, None if it must not be
+        """
+        if response.status_code == 200:
+            self.latency_tracker.record(time.monotonic() - started_at)
+        self.connection_tracker.record_response(response)
+        self.rate_limiter.record_response(response.status_code, response.headers)
+        return self.rate_limiter.get_retry_delay(response.status_code, attempt)
+
+    def _parse_response(self, response: httpx.Response, parse: Callable[[Any], int]) -> int:
+        if response.status_code != 200:
+            exception_class = (
+                ProviderUnavailableException
+                if response.status_code == 429 or response.status_code >= 500
+                else CannotGetPriceException
+            )
+            raise exception_class(f"{response.status_code} error from {self.display_name}: {response.reason_phrase}")
+
+        try:
+            return parse(response.json())
+        except (ValueError, KeyError, TypeError) as e:
+            # Invalid JSON (json.JSONDecodeError is a ValueError) or unexpected response body
+            raise CannotGetPriceException(f"Invalid response from {self.display_name}: {type(e).__name__}: {str(e)}")
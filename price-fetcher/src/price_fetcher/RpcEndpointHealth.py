@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from price_fetcher.LatencyTracker import LatencyTracker
+
+# JSON-RPC error codes of throttled requests (EIP-1474 "Limit exceeded", and the HTTP status some providers reuse)
+RATE_LIMIT_ERROR_CODES = {-32005, 429}
+
+
+class RpcEndpointException(Exception):
+    # The endpoint is throttling requests
+    pass
+
+
+def is_rate_limited(response: Any) -> bool:
+    """
+    Returns whether a JSON-RPC response (or the error response of a whole batch) tells that the request was throttled
+    """
+    return isinstance(response, dict) and (response.get("error") or {}).get("code") in RATE_LIMIT_ERROR_CODES
+
+
+class RpcEndpointHealth:
+    """
+    Thread-safe health of a JSON-RPC endpoint: exponentially weighted moving averages (EWMA) of its latency and error
+    rate, and the recent latencies its slow calls are hedged after.
+
+    The error rate decays by half every `error_half_life` seconds without requests, so that an endpoint marked as
+    unhealthy (error rate over `max_error_rate`) is routed to again once it had time to recover.
+    """
+
+    def __init__(self, uri: str, alpha: float = 0.2, max_error_rate: float = 0.5, error_half_life: float = 60):
+        # Only the host is used in logs and metric labels, paths and query strings can contain API keys
+        self.name = urlsplit(uri).hostname or uri
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.error_half_life = error_half_life
+        self.latency_tracker = LatencyTracker()
+
+        self._latency: Optional[float] = None
+        self._error_rate = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _get_error_rate(self, now: float) -> float:
+        return self._error_rate * 0.5 ** ((now - self._updated_at) / self.error_half_life)
+
+    def _record(self, latency: float, error: float):
+        now = time.monotonic()
+        with self._lock:
+            if error:
+                # Fast failures (e.g. refused connections) must not make the endpoint look faster
+                latency = max(latency, self._latency or 0.0)
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = (1 - self.alpha) * self._latency + self.alpha * latency
+            self._error_rate = (1 - self.alpha) * self._get_error_rate(now) + self.alpha * error
+            self._updated_at = now
+
+    def record_success(self, latency: float):
+        """
+        Args:
+            latency (float): latency of the call in seconds
+        """
+        self._record(latency, 0)
+        self.latency_tracker.record(latency)
+
+    def record_failure(self, latency: float):
+        """
+        Args:
+            latency (float): time in seconds until the call failed, slow failures (e.g. timeouts) also raise the latency
+        """
+        self._record(latency, 1)
+
+    @property
+    def latency(self) -> float:
+        """
+        EWMA of the latency in seconds, 0 until the first call so that new endpoints are tried first
+        """
+        return self._latency or 0.0
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._get_error_rate(time.monotonic())
+
+    def is_healthy(self) -> bool:
+        return self.error_rate <= self.max_error_rate
+
+    def get_routing_key(self) -> tuple[bool, float]:
+        """
+        Returns the sorting key of the endpoint: healthy endpoints first by expected time to a successful call (latency
+        divided by success rate), then unhealthy ones by error rate
+        """
+        error_rate = self.error_rate
+        if error_rate <= self.max_error_rate:
+            return False, self.latency / (1 - error_rate)
+        return True, error_rate
@@ -0,0 +1,150 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+from web3 import HTTPProvider
+from web3._utils.caching import handle_request_caching
+from web3.providers import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from metrics import rpc_endpoint_requests_total, rpc_hedged_requests_total
+from price_fetcher.RpcEndpointHealth import RpcEndpointException, RpcEndpointHealth, is_rate_limited
+
+# Methods with side effects, whose requests must never be retried nor hedged to another endpoint: sending them twice
+# could broadcast the same transaction twice
+NON_IDEMPOTENT_METHODS = {"eth_sendTransaction", "eth_sendRawTransaction"}
+
+
+class RpcProviderPool(JSONBaseProvider):
+    """
+    Web3 provider sending each JSON-RPC request (or batch of requests) to one of several HTTP endpoints serving the same
+    chain.
+
+    Requests are routed to the fastest healthy endpoint, by EWMA of the latency. Endpoints whose EWMA error rate is over
+    `max_error_rate` are only used once every healthy endpoint failed. A request that fails on an endpoint (network
+    error, HTTP error or throttled JSON-RPC response) is sent again to the next endpoint, and a request still in flight
+    after the `hedge_percentile` percentile of the recent latencies of its endpoint is hedged: an identical request is
+    sent to the next endpoint and the first of the two responses is used. Requests with side effects are neither sent
+    again nor hedged.
+    """
+
+    def __init__(
+        self,
+        endpoint_uris: list[str],
+        hedge_percentile: Optional[float] = 95,
+        max_error_rate: float = 0.5,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        # Endpoints fail over to each other instead of retrying on their own
+        self.endpoints = [
+            (
+                HTTPProvider(uri, exception_retry_configuration=None),
+                RpcEndpointHealth(uri, max_error_rate=max_error_rate),
+            )
+            for uri in endpoint_uris
+        ]
+        self.hedge_percentile = hedge_percentile
+        # Hedged requests and the requests they race with are sent from these threads
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(endpoint_uris), thread_name_prefix="rpc-pool")
+
+    def __str__(self) -> str:
+        return f"RPC provider pool of {', '.join(health.name for _, health in self.endpoints)}"
+
+    def get_routed_endpoints(self) -> list[tuple[HTTPProvider, RpcEndpointHealth]]:
+        """
+        Returns the endpoints in the order requests are routed to them
+        """
+        return sorted(self.endpoints, key=lambda endpoint: endpoint[1].get_routing_key())
+
+    def get_hedge_delay(self, health: RpcEndpointHealth) -> Optional[float]:
+        """
+        Returns the number of seconds after which a request to the given endpoint is hedged, None if it is not
+        """
+        if not self.hedge_percentile:
+            return None
+        return health.latency_tracker.percentile(self.hedge_percentile)
+
+    @staticmethod
+    def _call(
+        provider: HTTPProvider, health: RpcEndpointHealth, send: Callable[[HTTPProvider], Any]
+    ) -> RPCResponse | list[RPCResponse]:
+        started_at = time.monotonic()
+        try:
+            response = send(provider)
+            if is_rate_limited(response):
+                raise RpcEndpointException(f"Rate limited: {response['error'].get('message')}")
+        except Exception:
+            health.record_failure(time.monotonic() - started_at)
+            rpc_endpoint_requests_total.labels(health.name, "failure").inc()
+            raise
+        health.record_success(time.monotonic() - started_at)
+        rpc_endpoint_requests_total.labels(health.name, "success").inc()
+        return response
+
+    def _send(
+        self, description: str, idempotent: bool, send: Callable[[HTTPProvider], Any]
+    ) -> RPCResponse | list[RPCResponse]:
+        """
+        Sends a request to the routed endpoints, failing over and hedging as described in the class docstring
+
+        Raises:
+            Exception: the error of the last endpoint, if the request failed on every endpoint it was sent to
+        """
+        endpoints = self.get_routed_endpoints()
+        if not idempotent:
+            endpoints = endpoints[:1]
+
+        last_error: Optional[Exception] = None
+        pending: dict[Future, RpcEndpointHealth] = {}
+        hedge_deadline: Optional[float] = None
+
+        while endpoints or pending:
+            if not pending:
+                # Send to the next endpoint, from the caller's thread unless the request can be hedged
+                provider, health = endpoints.pop(0)
+                hedge_delay = self.get_hedge_delay(health) if endpoints else None
+                if hedge_delay is None:
+                    try:
+                        return self._call(provider, health, send)
+                    except Exception as e:
+                        logging.info(f"{description} failed on {health.name}: {type(e).__name__}")
+                        last_error = e
+                        continue
+                pending[self._executor.submit(self._call, provider, health, send)] = health
+                hedge_deadline = time.monotonic() + hedge_delay
+
+            timeout = max(0.0, hedge_deadline - time.monotonic()) if hedge_deadline is not None and endpoints else None
+            done, _ = wait(pending, timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                provider, health = endpoints.pop(0)
+                logging.debug(f"Hedging {description} to {health.name}")
+                rpc_hedged_requests_total.labels(health.name).inc()
+                pending[self._executor.submit(self._call, provider, health, send)] = health
+                hedge_deadline = None
+                continue
+
+            for future in done:
+                health = pending.pop(future)
+                try:
+                    # The other request, if any, completes in the background and still updates its endpoint health
+                    return future.result()
+                except Exception as e:
+                    logging.info(f"{description} failed on {health.name}: {type(e).__name__}")
+                    last_error = e
+
+        raise last_error
+
+    @handle_request_caching
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self._send(
+            method, method not in NON_IDEMPOTENT_METHODS, lambda provider: provider.make_request(method, params)
+        )
+
+    def make_batch_request(self, batch_requests: list[tuple[RPCEndpoint, Any]]) -> list[RPCResponse] | RPCResponse:
+        return self._send(
+            f"Batch of {len(batch_requests)} requests",
+            all(method not in NON_IDEMPOTENT_METHODS for method, _ in batch_requests),
+            lambda provider: provider.make_batch_request(batch_requests),
+        )
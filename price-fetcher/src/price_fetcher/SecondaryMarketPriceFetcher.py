@@ -1,4 +1,8 @@
 from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+from price_fetcher.LatencyTracker import LatencyTracker
+from price_fetcher.TokenBucketRateLimiter import TokenBucketRateLimiter
 
 
 class UnsupportedChainException(Exception):
@@ -13,11 +17,61 @@ class CannotGetPriceException(Exception):
     pass
 
 
+# Raised when the provider itself fails (network errors, 429 and 5xx responses) rather than the quoted pair
+class ProviderUnavailableException(CannotGetPriceException):
+    pass
+
+
+# Raised without sending a request while the circuit breaker of a pair or provider is open
+class CircuitOpenException(CannotGetPriceException):
+    pass
+
+
+class SecondaryMarketQuote(NamedTuple):
+    """
+    Secondary market price in wei (or amount received for a trade) along with the name of the provider it comes from
+    """
+
+    price: int
+    source: str
+
+
 class SecondaryMarketPriceFetcher(ABC):
     one_ether = 10**18
 
+    # Name of the provider, recorded along with the prices it quoted
+    name: str = ""
+
+    # Provider quota used when no explicit rate limit is configured
+    default_requests_per_second: float = 1
+    default_burst: int = 1
+
+    # Rate limiter and round-trip latencies of the requests sent to the provider, used to hedge slow requests
+    rate_limiter: Optional[TokenBucketRateLimiter] = None
+    latency_tracker: Optional[LatencyTracker] = None
+
     @abstractmethod
-    def get_price(self, network: str, token_address: str, eth_token_address: str) -> int:
+    def get_amount_out(self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int) -> int:
+        """
+        Get the amount of destination token received when selling the given amount of source token on given network
+
+        Args:
+            chain_id (int): chain id
+            src_token_address (str): address of the sold token on network with given chain id
+            dst_token_address (str): address of the bought token on network with given chain id
+            amount (int): sold amount in wei
+
+        Returns:
+            int: bought amount in wei
+
+        Raises:
+            UnsupportedChainException: if chain id is not supported
+            UnsupportedTokenException: if token is not supported
+            CannotGetPriceException: if price cannot be fetched
+        """
+        pass
+
+    def get_price(self, chain_id: int, token_address: str, eth_token_address: str) -> int:
         """
         Get price in ETH from secondary market for given token on given network
 
@@ -34,4 +88,31 @@ class SecondaryMarketPriceFetcher(ABC):
             UnsupportedTokenException: if token is not supported
             CannotGetPriceException: if price cannot be fetched
         """
+        return self.get_amount_out(chain_id, token_address, eth_token_address, self.one_ether)
+
+    def get_quote(self, chain_id: int, token_address: str, eth_token_address: str) -> SecondaryMarketQuote:
+        """
+        Get price in ETH from secondary market for given token on given network, along with the provider it comes from
+
+        Raises the same exceptions as get_price
+        """
+        return SecondaryMarketQuote(self.get_price(chain_id, token_address, eth_token_address), self.name)
+
+    def get_amount_out_quote(
+        self, chain_id: int, src_token_address: str, dst_token_address: str, amount: int
+    ) -> SecondaryMarketQuote:
+        """
+        Get the amount of destination token received when selling the given amount of source token on given network,
+        along with the provider it comes from
+
+        Raises the same exceptions as get_amount_out
+        """
+        return SecondaryMarketQuote(
+            self.get_amount_out(chain_id, src_token_address, dst_token_address, amount), self.name
+        )
+
+    def close(self):
+        """
+        Release the resources (HTTP sessions...) held by the price fetcher
+        """
         pass
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket shared by all the requests sent to a secondary market provider.
+
+    Tokens are refilled continuously at `requests_per_second` up to `burst` tokens. Each request consumes one token,
+    callers going over the quota are delayed in the order in which they asked for a token.
+    """
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be strictly positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Consume a token
+
+        Returns:
+            float: number of seconds the caller has to wait before sending its request
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.requests_per_second)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.requests_per_second
+
+    def has_spare_token(self) -> bool:
+        """
+        Returns whether a request could be sent right away, without consuming a token
+        """
+        with self._lock:
+            tokens = self._tokens + (time.monotonic() - self._updated_at) * self.requests_per_second
+            return tokens >= 1
+
+    def acquire(self):
+        """
+        Block until a token is available
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """
+        Wait until a token is available without blocking the event loop
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
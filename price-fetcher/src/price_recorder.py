@@ -0,0 +1,134 @@
+import datetime
+import logging
+import time
+from typing import Optional
+
+from data_storage.DataSaver import DataPoint, DataSaver, DepthPoint, FailedToSaveDataPointException
+from metrics import cycle_data_points, cycle_duration_seconds, record_error
+from utils import eth_price_to_string, from_wei, get_premium
+
+
+def get_primary_market_data_point(
+    timestamp: datetime.datetime,
+    token_name: str,
+    chain: str,
+    primary_market_price: int,
+) -> Optional[DataPoint]:
+    """
+    Logs a primary market price and returns the data point to save for it
+
+    Args:
+        timestamp (datetime): timestamp of the fetching cycle
+        token_name (str): token name
+        chain (str): network / chain name
+        primary_market_price (int): primary market price in wei
+
+    Returns:
+        Optional[DataPoint]: data point to save, None if the price is invalid
+    """
+    if primary_market_price < 0:
+        return None
+
+    logging.info(f"Primary market price for {token_name} on {chain} is {eth_price_to_string(primary_market_price)} ETH")
+    return DataPoint(
+        timestamp=timestamp,
+        token_name=token_name,
+        price_eth=from_wei(primary_market_price),
+        price_usd=None,
+        network=chain,
+        is_primary_market=True,
+        premium=0,
+    )
+
+
+def get_secondary_market_data_point(
+    timestamp: datetime.datetime,
+    token_name: str,
+    chain: str,
+    price: int,
+    primary_market_price: int,
+    source: Optional[str] = None,
+) -> Optional[DataPoint]:
+    """
+    Logs a secondary market price along with its premium over the primary market price and returns the data point to
+    save for it
+
+    Args:
+        timestamp (datetime): timestamp of the fetching cycle
+        token_name (str): token name
+        chain (str): network / chain name
+        price (int): secondary market price in wei
+        primary_market_price (int): primary market price in wei
+        source (str): secondary market the price comes from
+
+    Returns:
+        Optional[DataPoint]: data point to save, None if the price is invalid
+    """
+    premium = get_premium(primary_market_price, price)
+
+    if price < 0:
+        return None
+
+    logging.info(
+        f"{token_name} on {chain} is {eth_price_to_string(price)} ETH -> "
+        f"{abs(premium * 100):.3f}% {'premium' if premium >= 0 else 'discount'}" + (f" ({source})" if source else "")
+    )
+    return DataPoint(
+        timestamp=timestamp,
+        token_name=token_name,
+        price_eth=from_wei(price),
+        price_usd=None,
+        network=chain,
+        is_primary_market=False,
+        premium=premium,
+        source=source,
+    )
+
+
+def save_data_points(data_saver: DataSaver, data_points: list[Optional[DataPoint]]):
+    """
+    Saves the data points of a fetching cycle in a single batch
+
+    Args:
+        data_saver (DataSaver): data saver used to store the data points
+        data_points (list[Optional[DataPoint]]): data points to save, None values are skipped
+    """
+    try:
+        data_saver.save_data_points([data_point for data_point in data_points if data_point is not None])
+    except FailedToSaveDataPointException as e:
+        logging.error(f"Failed to save data points: {str(e)}")
+        record_error(e)
+
+
+def save_depth_points(data_saver: DataSaver, depth_points: list[DepthPoint]):
+    """
+    Saves the depth points of a fetching cycle in a single batch
+
+    Args:
+        data_saver (DataSaver): data saver used to store the depth points
+        depth_points (list[DepthPoint]): depth points to save
+    """
+    try:
+        data_saver.save_depth_points(depth_points)
+    except FailedToSaveDataPointException as e:
+        logging.error(f"Failed to save depth points: {str(e)}")
+        record_error(e)
+
+
+def log_cycle_duration(timestamp: datetime.datetime, started_at: float, data_points: list[Optional[DataPoint]]):
+    """
+    Reports the duration of a fetching cycle
+
+    Args:
+        timestamp (datetime): timestamp of the fetching cycle
+        started_at (float): time.monotonic() value when the fetching cycle started
+        data_points (list[Optional[DataPoint]]): data points of the fetching cycle
+    """
+    duration = time.monotonic() - started_at
+    saved_data_points = sum(1 for data_point in data_points if data_point is not None)
+    cycle_duration_seconds.observe(duration)
+    cycle_data_points.observe(saved_data_points)
+    logging.info(
+        f"Fetching cycle of {timestamp.isoformat(timespec='seconds')} took {duration:.2f}s "
+        f"({saved_data_points} data points)"
+    )
@@ -0,0 +1,153 @@
+import logging
+import math
+import os
+import socket
+import zlib
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+
+
+class ShardLeaseManager:
+    """
+    Splits the token / chain pairs between several price fetcher instances with leases held in Postgres.
+
+    Pairs are hashed into `shard_count` shards. At the start of each cycle, a worker renews the leases of its shards,
+    releases the ones above its fair share of the live workers (workers with a heartbeat younger than `lease_ttl`) and
+    claims expired leases up to its fair share. Shards of a dead worker are claimed by the others once its leases
+    expire. A shard is only fetched by the worker holding its lease, so as long as a cycle is shorter than `lease_ttl`
+    no pair is fetched twice.
+    """
+
+    def __init__(
+        self,
+        db_connection_string: str,
+        shard_count: int,
+        lease_ttl: float,
+        worker_id: Optional[str] = None,
+    ):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+
+        self.engine = create_engine(db_connection_string)
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    def get_shard(self, token_name: str, chain: str) -> int:
+        """
+        Returns the shard of a token / chain pair, stable across processes
+        """
+        return zlib.crc32(f"{token_name}:{chain}".encode()) % self.shard_count
+
+    def acquire_shards(self) -> frozenset[int]:
+        """
+        Renews, rebalances and claims the leases of this worker
+
+        Returns:
+            frozenset[int]: shards leased to this worker for the cycle
+        """
+        params = {"worker_id": self.worker_id, "ttl": self.lease_ttl, "shard_count": self.shard_count}
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    """
+                    INSERT INTO fetcher_workers (worker_id, heartbeat_at)
+                    VALUES (:worker_id, now())
+                    ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+                    """
+                ),
+                params,
+            )
+            live_workers = connection.execute(
+                text(
+                    """
+                    SELECT count(*) FROM fetcher_workers
+                    WHERE heartbeat_at > now() - make_interval(secs => :ttl)
+                    """
+                ),
+                params,
+            ).scalar_one()
+            fair_share = math.ceil(self.shard_count / max(1, live_workers))
+
+            connection.execute(
+                text(
+                    """
+                    INSERT INTO fetcher_leases (shard, worker_id, expires_at)
+                    SELECT shard, :worker_id, '-infinity' FROM generate_series(0, :shard_count - 1) AS shard
+                    ON CONFLICT (shard) DO NOTHING
+                    """
+                ),
+                params,
+            )
+            owned_shards = sorted(
+                connection.execute(
+                    text(
+                        """
+                        UPDATE fetcher_leases SET expires_at = now() + make_interval(secs => :ttl)
+                        WHERE worker_id = :worker_id AND expires_at > now() AND shard < :shard_count
+                        RETURNING shard
+                        """
+                    ),
+                    params,
+                ).scalars()
+            )
+
+            if len(owned_shards) > fair_share:
+                released_shards = owned_shards[fair_share:]
+                connection.execute(
+                    text(
+                        """
+                        UPDATE fetcher_leases SET expires_at = '-infinity'
+                        WHERE worker_id = :worker_id AND shard = ANY(:shards)
+                        """
+                    ),
+                    {**params, "shards": released_shards},
+                )
+                owned_shards = owned_shards[:fair_share]
+                logging.info(f"Released {len(released_shards)} shard(s) for {live_workers} live worker(s)")
+            elif len(owned_shards) < fair_share:
+                claimed_shards = list(
+                    connection.execute(
+                        text(
+                            """
+                            UPDATE fetcher_leases
+                            SET worker_id = :worker_id, expires_at = now() + make_interval(secs => :ttl)
+                            WHERE shard IN (
+                                SELECT shard FROM fetcher_leases
+                                WHERE expires_at <= now() AND shard < :shard_count
+                                ORDER BY shard
+                                LIMIT :limit
+                                FOR UPDATE SKIP LOCKED
+                            )
+                            RETURNING shard
+                            """
+                        ),
+                        {**params, "limit": fair_share - len(owned_shards)},
+                    ).scalars()
+                )
+                if claimed_shards:
+                    logging.info(f"Claimed {len(claimed_shards)} shard(s) for {live_workers} live worker(s)")
+                owned_shards += claimed_shards
+
+        logging.debug(f"Worker {self.worker_id} holds {len(owned_shards)}/{self.shard_count} shards")
+        return frozenset(owned_shards)
+
+    def close(self):
+        """
+        Releases the leases of this worker so that the other workers can claim them right away
+        """
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text("UPDATE fetcher_leases SET expires_at = '-infinity' WHERE worker_id = :worker_id"),
+                    {"worker_id": self.worker_id},
+                )
+                connection.execute(
+                    text("DELETE FROM fetcher_workers WHERE worker_id = :worker_id"),
+                    {"worker_id": self.worker_id},
+                )
+        except Exception as e:
+            logging.error(f"Failed to release the leases of worker {self.worker_id}: {str(e)}")
+        finally:
+            self.engine.dispose()
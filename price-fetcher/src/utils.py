@@ -1,6 +1,9 @@
+from decimal import Decimal, localcontext
 from enum import StrEnum
+from typing import Callable, Optional
 
-from web3 import Web3
+# Multicall3 is deployed at the same address on Ethereum and most EVM networks
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
 
 chains = {
     "ethereum": {
@@ -47,6 +50,101 @@ class SecondaryMarket(StrEnum):
     PARASWAP = "paraswap"
 
 
+class QuotePolicy(StrEnum):
+    """
+    Enum for the ways of picking a price when several secondary markets are quoted
+    """
+
+    BEST = "best"
+    MEDIAN = "median"
+    FIRST_GOOD = "first-good"
+
+
+class OverlapPolicy(StrEnum):
+    """
+    Enum for what to do when a fetching cycle is due while previous ones are still in progress
+    """
+
+    SKIP = "skip"
+    COALESCE = "coalesce"
+    ALLOW = "allow"
+
+
+class FileFormat(StrEnum):
+    """
+    Enum for the formats of the files data points are written to
+    """
+
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+
+def has_primary_market(token: dict) -> bool:
+    """
+    Returns whether the primary market exchange rate of a token can be read from its native contract on Ethereum
+
+    Args:
+        token (dict): token config
+    """
+    return (
+        "ethereum" in token["token_addresses"]
+        and "native_contract_abi" in token
+        and "get_exchange_rate_function_name" in token
+    )
+
+
+def filter_config(
+    config: dict,
+    pair_filter: Optional[Callable[[str, str], bool]],
+    primary_market_filter: Optional[Callable[[str], bool]] = None,
+) -> dict:
+    """
+    Restricts a config to the token / chain pairs accepted by a filter: tokens list the chains quoted for them in
+    `quoted_chains`, and their primary market price is only recorded if their Ethereum pair is accepted (it is still
+    read to compute the premium of their other pairs)
+
+    Args:
+        config (dict): config
+        pair_filter (Optional[Callable[[str, str], bool]]): returns whether a token name / chain pair is fetched, every
+            pair is fetched when None
+        primary_market_filter (Optional[Callable[[str], bool]]): returns whether the primary market price of a token is
+            recorded, instead of the filter of its Ethereum pair
+    """
+    if pair_filter is None and primary_market_filter is None:
+        return config
+
+    tokens = []
+    for token in config["tokens"]:
+        quoted_chains = [
+            chain
+            for chain in token["token_addresses"]
+            if pair_filter is None or pair_filter(token["token_name"], chain)
+        ]
+        if primary_market_filter is None:
+            record_primary_market = "ethereum" in quoted_chains
+        else:
+            record_primary_market = primary_market_filter(token["token_name"])
+        if quoted_chains or record_primary_market:
+            tokens.append(
+                {
+                    **token,
+                    "quoted_chains": quoted_chains,
+                    "record_primary_market": record_primary_market,
+                }
+            )
+    return {**config, "tokens": tokens}
+
+
+def get_quoted_chains(token: dict) -> list[str]:
+    """
+    Returns the chains on which the secondary market price of a token is fetched
+
+    Args:
+        token (dict): token config
+    """
+    return token.get("quoted_chains", list(token["token_addresses"]))
+
+
 def eth_price_to_string(eth_amount: int) -> str:
     """
     Converts an ETH amount in wei to a string
@@ -58,7 +156,21 @@ def eth_price_to_string(eth_amount: int) -> str:
         str: The amount of ETH in ether
     """
     rem: int = eth_amount % 10**12
-    return Web3.from_wei(eth_amount - rem, "ether")
+    return from_wei(eth_amount - rem)
+
+
+def from_wei(amount: int) -> int | Decimal:
+    """
+    Converts an amount in wei to ether like Web3.from_wei(amount, "ether"), without loading web3
+
+    Args:
+        amount (int): amount in wei
+    """
+    if amount == 0:
+        return 0
+    with localcontext() as context:
+        context.prec = 999
+        return Decimal(amount, context) / Decimal(10**18)
 
 
 def get_premium(primary_market_price, secondary_market_price) -> float: